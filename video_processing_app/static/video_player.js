@@ -1,21 +1,86 @@
+// Size of the chunks a video is uploaded in
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+// Consecutive failed attempts tolerated for a chunk before giving up
+const UPLOAD_MAX_RETRIES = 5;
+
+// Hex-encoded SHA-256 digest of a Blob
+async function sha256Hex(blob) {
+  const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, "0"))
+    .join("");
+}
+
+// Upload a video in chunks, resuming from the last acknowledged offset
+// after a failed chunk
+async function uploadVideoInChunks(title, file) {
+  const initResponse = await fetch("/api/uploads/", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ title: title, filename: file.name, size: file.size }),
+  });
+  if (!initResponse.ok) {
+    throw new Error("Error starting upload: " + initResponse.statusText);
+  }
+  const session = await initResponse.json();
+  const uploadUrl = `/api/uploads/${session.id}/`;
+
+  let offset = session.offset;
+  let retries = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + UPLOAD_CHUNK_SIZE);
+    let response = null;
+    try {
+      response = await fetch(uploadUrl, {
+        method: "PUT",
+        headers: {
+          "Content-Type": "application/octet-stream",
+          "Upload-Offset": String(offset),
+          "Chunk-SHA256": await sha256Hex(chunk),
+        },
+        body: chunk,
+      });
+    } catch (error) {
+      console.error("Error uploading chunk:", error);
+    }
+
+    if (response && (response.ok || response.status === 409)) {
+      // On 409 the server tells us where to continue from
+      offset = (await response.json()).offset;
+      retries = 0;
+      continue;
+    }
+
+    if (++retries > UPLOAD_MAX_RETRIES) {
+      throw new Error("Error uploading video chunk at offset " + offset);
+    }
+    // Ask the server how much it has acknowledged before retrying
+    const statusResponse = await fetch(uploadUrl).catch(() => null);
+    if (statusResponse && statusResponse.ok) {
+      offset = (await statusResponse.json()).offset;
+    }
+  }
+
+  const finalizeResponse = await fetch(`${uploadUrl}finalize/`, {
+    method: "POST",
+  });
+  if (!finalizeResponse.ok) {
+    throw new Error("Error finishing upload: " + finalizeResponse.statusText);
+  }
+  return finalizeResponse.json();
+}
+
 // Handle video upload
 document.getElementById("upload-form").addEventListener("submit", function (e) {
   e.preventDefault();
 
-  const formData = new FormData(this);
-  fetch("/api/upload/", {
-    method: "POST",
-    body: formData,
-  })
-    .then((response) => {
-      if (!response.ok) {
-        throw new Error("Error uploading video: " + response.statusText);
-      }
-      return response.json();
-    })
-    .then((data) => {
+  const title = this.elements["title"].value;
+  const file = this.elements["video_file"].files[0];
+  uploadVideoInChunks(title, file)
+    .then((video) => {
       alert("Video uploaded successfully!");
       loadVideoList(); // Refresh video list after upload
+      watchProcessing(video.id);
     })
     .catch((error) => {
       console.error("Error uploading video:", error);
@@ -23,37 +88,88 @@ document.getElementById("upload-form").addEventListener("submit", function (e) {
     });
 });
 
-// Fetch and display the list of videos
-function loadVideoList() {
-  fetch("/api/videos/")
+// Follow the subtitle extraction of a video and refresh the video list
+// once it finishes
+function watchProcessing(videoId) {
+  const events = new EventSource(`/api/videos/${videoId}/status/stream/`);
+  events.addEventListener("status", (event) => {
+    const job = JSON.parse(event.data);
+    if (job.state === "succeeded" || job.state === "failed") {
+      events.close();
+      loadVideoList();
+    }
+  });
+  events.onerror = () => events.close();
+}
+
+// Fetch and display the list of videos, one page at a time
+function loadVideoList(url = "/api/videos/", append = false) {
+  fetch(url)
     .then((response) => {
       if (!response.ok) {
         throw new Error("Error fetching video list: " + response.statusText);
       }
       return response.json();
     })
-    .then((videos) => {
+    .then((page) => {
       const videoListDiv = document.getElementById("video-list");
-      videoListDiv.innerHTML = ""; // Clear the existing list
+      if (!append) {
+        videoListDiv.innerHTML = ""; // Clear the existing list
+      }
+      document.getElementById("load-more-videos")?.remove();
 
-      videos.forEach((video) => {
+      page.results.forEach((video) => {
         const videoItem = document.createElement("div");
-        videoItem.innerHTML = `<p><a href="#" onclick="playVideo('${video.video_file}', ${video.id}); return false;">${video.title}</a></p>`;
+        videoItem.innerHTML = `<p><a href="#" onclick="playVideo('${video.video_file}', ${video.id}, '${video.stream_url || ""}'); return false;">${video.title}</a> (${video.status})</p>`;
         videoListDiv.appendChild(videoItem);
       });
+
+      if (page.next) {
+        const loadMoreButton = document.createElement("button");
+        loadMoreButton.id = "load-more-videos";
+        loadMoreButton.textContent = "Load more";
+        loadMoreButton.addEventListener("click", () =>
+          loadVideoList(page.next, true)
+        );
+        videoListDiv.appendChild(loadMoreButton);
+      }
     })
     .catch((error) => {
       console.error("Error fetching video list:", error);
     });
 }
 
-// Play the selected video and load subtitles
-function playVideo(videoSrc, videoId) {
+// hls.js instance playing the current video, when the browser has no
+// native HLS support
+let hlsPlayer = null;
+
+// Play an HLS stream, natively (Safari) or through hls.js. Returns false
+// when the browser can play neither, so the file has to be played instead
+function playStream(videoPlayer, streamUrl) {
+  if (videoPlayer.canPlayType("application/vnd.apple.mpegurl")) {
+    videoPlayer.src = streamUrl;
+    return true;
+  }
+  if (window.Hls && Hls.isSupported()) {
+    hlsPlayer = new Hls();
+    hlsPlayer.loadSource(streamUrl);
+    hlsPlayer.attachMedia(videoPlayer);
+    return true;
+  }
+  return false;
+}
+
+// Play the selected video and load subtitles. Packaged videos are
+// streamed over HLS, subtitles included; others are played from their file
+function playVideo(videoSrc, videoId, streamUrl) {
   const videoPlayer = document.getElementById("video-player");
   const videoSource = document.getElementById("video-source");
 
-  videoSource.src = videoSrc;
-  videoPlayer.load(); // Reload video with the new source
+  if (hlsPlayer) {
+    hlsPlayer.destroy();
+    hlsPlayer = null;
+  }
+  videoPlayer.removeAttribute("src");
 
   // Clear previous search results when a new video is selected
   document.getElementById("search-results").innerHTML = "";
@@ -65,6 +181,14 @@ function playVideo(videoSrc, videoId) {
   const tracks = videoPlayer.querySelectorAll("track");
   tracks.forEach((track) => track.remove());
 
+  // The master playlist lists the subtitle renditions
+  if (streamUrl && playStream(videoPlayer, streamUrl)) {
+    return;
+  }
+
+  videoSource.src = videoSrc;
+  videoPlayer.load(); // Reload video with the new source
+
   // Load subtitles from the backend
   fetch(`/api/videos/${videoId}/languages/`)
     .then((response) => {
@@ -74,21 +198,22 @@ function playVideo(videoSrc, videoId) {
       return response.json();
     })
     .then((languages) => {
-      const videoBaseName = videoSrc.split("/").pop().split("_stream")[0];
-
-      // Create and append a <track> element for each subtitle
-      languages.forEach((language) => {
-        const trackElement = document.createElement("track");
-        trackElement.kind = "subtitles";
-        trackElement.label = language.name;
-        trackElement.srclang = language.code;
-        trackElement.src = `/media/videos/${videoBaseName}_stream_${language.code}.vtt`; // Correct subtitle file path
-        console.log("Subtitle file:", trackElement.src);
-        if (language.is_default) {
-          trackElement.default = true;
-        }
-        videoPlayer.appendChild(trackElement);
-      });
+      // Create and append a <track> element for each extracted subtitle
+      languages
+        .filter((language) => language.available !== false)
+        .forEach((language) => {
+          const trackElement = document.createElement("track");
+          trackElement.kind = "subtitles";
+          trackElement.label = language.title || language.name || language.code;
+          trackElement.srclang = language.code;
+          trackElement.src = `/api/videos/${videoId}/tracks/${encodeURIComponent(
+            language.code
+          )}.vtt`;
+          if (language.default) {
+            trackElement.default = true;
+          }
+          videoPlayer.appendChild(trackElement);
+        });
 
       videoPlayer.load(); // Reload the video to apply new tracks
     })
@@ -124,7 +249,7 @@ document.getElementById("search-button").addEventListener("click", function () {
 
       results.forEach((result) => {
         const resultItem = document.createElement("div");
-        resultItem.innerHTML = `<p><a href="#" onclick="playFromTimestamp('${result.timestamp_start}'); return false;">${result.content} - ${result.timestamp_start}</a></p>`;
+        resultItem.innerHTML = `<p><a href="#" onclick="playFromTimestamp('${result.timestamp_start}'); return false;">${result.snippet || result.content} - ${result.timestamp_start}</a></p>`;
         searchResultsDiv.appendChild(resultItem);
       });
     })
@@ -186,4 +311,4 @@ function playFromTimestamp(timestamp) {
 }
 
 // Load video list when page loads
-document.addEventListener("DOMContentLoaded", loadVideoList);
+document.addEventListener("DOMContentLoaded", () => loadVideoList());
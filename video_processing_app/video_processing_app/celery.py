@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE',
@@ -12,3 +13,104 @@ app = Celery('video_processing_app')
 # Load task modules from all registered Django app configs.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+# Subtitle extraction runs ffmpeg for minutes at a time, so it gets its own
+# queue and workers; everything else stays on the default queue.
+EXTRACTION_QUEUE = 'extraction'
+
+app.conf.task_default_queue = 'celery'
+app.conf.task_routes = {
+    'videos.tasks.extract_subtitles_task': {'queue': EXTRACTION_QUEUE},
+    'videos.tasks.extract_stream_group_task': {'queue': EXTRACTION_QUEUE},
+    'videos.tasks.store_extracted_subtitles_task': {'queue': EXTRACTION_QUEUE},
+    'videos.tasks.generate_preview_task': {'queue': EXTRACTION_QUEUE},
+    'videos.tasks.package_hls_task': {'queue': EXTRACTION_QUEUE},
+    'videos.tasks.import_sidecar_task': {'queue': EXTRACTION_QUEUE},
+    'videos.tasks.register_upload_task': {'queue': EXTRACTION_QUEUE},
+}
+
+app.conf.task_annotations = {
+    # Probing, then either dispatching the stream groups or, for videos
+    # with a single group and in 'pipe' mode, the whole extraction
+    'videos.tasks.extract_subtitles_task': {
+        'soft_time_limit': 30 * 60,
+        'time_limit': 32 * 60,
+    },
+    # One group of subtitle streams; failed streams are retried on their own
+    'videos.tasks.extract_stream_group_task': {
+        'soft_time_limit': 20 * 60,
+        'time_limit': 22 * 60,
+        'max_retries': 2,
+        'default_retry_delay': 30,
+        'acks_late': True,
+    },
+    # Parsing and inserting every extracted stream
+    'videos.tasks.store_extracted_subtitles_task': {
+        'soft_time_limit': 30 * 60,
+        'time_limit': 32 * 60,
+    },
+    # One pass over the keyframes of the video
+    'videos.tasks.generate_preview_task': {
+        'soft_time_limit': 30 * 60,
+        'time_limit': 32 * 60,
+    },
+    # A remux, or a full re-encode for codecs browsers cannot play
+    'videos.tasks.package_hls_task': {
+        'soft_time_limit': 3 * 60 * 60,
+        'time_limit': 3 * 60 * 60 + 120,
+    },
+    # Parsing an uploaded subtitle file, no ffmpeg involved
+    'videos.tasks.import_sidecar_task': {
+        'soft_time_limit': 10 * 60,
+        'time_limit': 11 * 60,
+    },
+    # Hashing an uploaded file, and copying subtitles for duplicates
+    'videos.tasks.register_upload_task': {
+        'soft_time_limit': 30 * 60,
+        'time_limit': 32 * 60,
+    },
+}
+
+# Jobs whose worker died are failed by a periodic sweep, so they do not
+# block reprocessing or ingestion; run `celery -A video_processing_app beat`
+app.conf.beat_schedule = {
+    'fail-stale-jobs': {
+        'task': 'videos.tasks.fail_stale_jobs_task',
+        'schedule': 10 * 60,
+    },
+}
+
+# Long tasks should not be reserved by a worker that is busy with another one
+app.conf.worker_prefetch_multiplier = 1
+
+
+@worker_init.connect
+def close_database_pools(**kwargs):
+    """
+    Close the connection pools of the main worker process before it forks
+    its pool processes. Each child then opens a pool of its own instead of
+    inheriting connections (and a pool whose threads did not survive the
+    fork) from the parent.
+    """
+    from django.db import connections
+
+    for connection in connections.all():
+        close_pool = getattr(connection, 'close_pool', None)
+        if close_pool is not None:
+            close_pool()
+
+
+@worker_init.connect
+def serve_worker_metrics(**kwargs):
+    """
+    Serve the metrics of the worker on METRICS_WORKER_PORT, if set. Pool
+    processes only report there when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    from django.conf import settings
+    from prometheus_client import start_http_server
+
+    from videos.metrics import metrics_registry
+
+    if settings.METRICS_WORKER_PORT:
+        start_http_server(settings.METRICS_WORKER_PORT,
+                          registry=metrics_registry())
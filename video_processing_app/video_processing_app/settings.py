@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,12 +39,15 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     'django_extensions',
     'videos',
     'rest_framework',
 ]
 
 MIDDLEWARE = [
+    # First, so the time of every other middleware is included
+    "videos.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -84,9 +89,45 @@ DATABASES = {
         'PASSWORD': 'admin123',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Check connections before handing them out, so a restarted database
+        # or a connection dropped by a proxy does not fail the next request
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Under eventlet (gunicorn -k eventlet, celery -P eventlet) every request or
+# task runs in its own green thread, whose connection would outlive it if
+# kept; the psycopg pool's threads and blocking calls do not cooperate with
+# eventlet either. Detected when eventlet patched threads before the settings
+# were loaded, which is the case unless gunicorn runs with --preload.
+EVENTLET = ('eventlet' in sys.modules
+            and sys.modules['eventlet'].patcher.is_monkey_patched('thread'))
+
+# Connection handling, tunable per process through the environment:
+# - DB_POOL=1 (default): a psycopg 3 pool per process, shared by request
+#   threads, Celery tasks and the threads the async ORM queries from.
+#   Celery prefork children each open their own pool (see celery.py).
+# - DB_POOL=0: one persistent connection per thread, reused for
+#   DB_CONN_MAX_AGE seconds.
+# Under eventlet, connections are closed after each request or task; put
+# PgBouncer in front of Postgres there instead.
+if EVENTLET:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+elif os.environ.get('DB_POOL', '1') == '1':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Seconds to wait for a free connection before failing
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            # Idle connections above min_size are closed after this long
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.environ.get('DB_CONN_MAX_AGE', 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -142,3 +183,99 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+
+# Redis used to publish processing progress to the status stream
+PROGRESS_REDIS_URL = CELERY_BROKER_URL
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+}
+
+# Seconds a page of the video list stays cached (it is also invalidated
+# whenever a video or its subtitles change)
+VIDEO_LIST_CACHE_TIMEOUT = 300
+
+# Seconds the results of subtitle searches and language lookups of a video
+# stay cached (they are also invalidated whenever its subtitles change), and
+# the largest result cached, in bytes. The app does not bound the total
+# size of the cache: Redis must, with a `maxmemory` and the `volatile-lru`
+# policy, which only evicts expiring keys and never the broker's queues.
+# videos/checks.py warns at startup when it is not configured so.
+QUERY_CACHE_TIMEOUT = 600
+QUERY_CACHE_MAX_ENTRY_SIZE = 256 * 1024
+
+# Hash uploaded files while they are received, to detect duplicate uploads
+FILE_UPLOAD_HANDLERS = [
+    'videos.uploads.HashingMemoryFileUploadHandler',
+    'videos.uploads.HashingTemporaryFileUploadHandler',
+]
+
+# Chunked uploads: largest chunk accepted in a single request
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Subtitle extraction
+# 'single_pass' maps every subtitle stream to its own output in one ffmpeg
+# run; 'per_stream' runs ffmpeg once per subtitle stream; 'pipe' parses each
+# stream from ffmpeg's stdout without writing VTT files.
+SUBTITLE_EXTRACTION_MODE = 'single_pass'
+# In 'pipe' mode, also keep the extracted VTT files next to the video and
+# reuse them on later runs
+SUBTITLE_VTT_CACHE = False
+# Number of subtitles written per bulk insert
+SUBTITLE_INSERT_BATCH_SIZE = 2000
+# Seconds the metadata of a WebVTT subtitle track stays cached; tracks are
+# also invalidated as soon as their subtitles change
+SUBTITLE_TRACK_CACHE_TIMEOUT = 24 * 60 * 60
+# Outside 'pipe' mode, extract groups of streams in parallel Celery tasks
+# and store them from a chord callback (see video_processing_app/celery.py)
+SUBTITLE_FANOUT = True
+# Number of subtitle streams extracted by each of those tasks
+SUBTITLE_STREAMS_PER_TASK = 2
+# Seconds after which a job still pending or running is failed as stale;
+# longer than the time limits of the extraction tasks and their retries
+PROCESSING_JOB_TIMEOUT = int(os.environ.get('PROCESSING_JOB_TIMEOUT', 3 * 60 * 60))
+
+# Uploaded subtitle files (see videos/sidecars.py): largest file accepted,
+# and the encoding of files that are not valid UTF-8
+SIDECAR_MAX_SIZE = 50 * 1024 * 1024
+SIDECAR_FALLBACK_ENCODING = 'cp1252'
+
+# Metrics and profiling (see videos/metrics.py and videos/profiling.py)
+# Addresses allowed to scrape /metrics
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Port Celery workers serve their metrics on; None to rely on a
+# PROMETHEUS_MULTIPROC_DIR shared with the web processes instead
+METRICS_WORKER_PORT = None
+# Fraction of the runs of each task profiled with cProfile, e.g.
+# {'videos.tasks.extract_subtitles_task': 0.1}, and where profiles go
+TASK_PROFILE_RATES = {}
+TASK_PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Thumbnail previews (see videos/previews.py): generated next to the subtitle
+# extraction, with a thumbnail every PREVIEW_INTERVAL seconds, each of
+# PREVIEW_TILE_SIZE (width, height) pixels, packed into sprite sheets of
+# PREVIEW_SPRITE_GRID (columns, rows) thumbnails
+VIDEO_PREVIEWS = True
+PREVIEW_INTERVAL = 10
+PREVIEW_TILE_SIZE = (160, 90)
+PREVIEW_SPRITE_GRID = (10, 10)
+
+# HLS packaging (see videos/hls.py), off unless HLS_PACKAGING=1: every new
+# video is also remuxed into HLS_SEGMENT_DURATION-second fMP4 segments.
+# Codecs browsers cannot decode are re-encoded to H.264/AAC only when
+# HLS_TRANSCODE=1, since that takes far longer than the extraction; else
+# the video is left unpackaged (and played from its file).
+HLS_PACKAGING = os.environ.get('HLS_PACKAGING', '0') == '1'
+HLS_TRANSCODE = os.environ.get('HLS_TRANSCODE', '0') == '1'
+HLS_SEGMENT_DURATION = int(os.environ.get('HLS_SEGMENT_DURATION', 6))
+
+# Subtitle search
+# One of 'auto', 'fulltext', 'trigram' or 'icontains' (see videos/search.py)
+SUBTITLE_SEARCH_MODE = 'auto'
+# Matches counted by the library-wide search; beyond that, its hit counts
+# are lower bounds (see videos/search.py)
+LIBRARY_SEARCH_MAX_MATCHES = int(os.environ.get('LIBRARY_SEARCH_MAX_MATCHES', 10000))
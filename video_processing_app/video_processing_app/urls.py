@@ -2,11 +2,13 @@ from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
+from videos.metrics import metrics_view
 from videos.views import Home
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', view=Home.as_view(), name='home'),
     path('api/', include('videos.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class VideosConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "videos"
+
+    def ready(self):
+        # The middleware module wraps database connections as they open,
+        # so it is loaded before any of them
+        from . import checks, middleware, profiling, signals  # noqa: F401
@@ -0,0 +1,138 @@
+"""
+Async versions of the read endpoints, served under /api/async/.
+
+They answer exactly like their synchronous counterparts in views.py, but
+query through Django's async ORM and cache, so under an ASGI server a
+request waiting on Postgres or Redis does not hold a worker. Under WSGI
+they still work, one request per worker thread.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+
+from .cache import acached_video_query, avideo_list_cache_key
+from .models import Subtitle, Video
+from .pagination import (SubtitleKeysetPagination, SubtitleSearchPagination,
+                         VideoListPagination)
+from .previews import get_previews
+from .serializers import (SubtitleSearchSerializer, SubtitleSerializer,
+                          VideoSummarySerializer)
+from .views import (describe_languages, get_search_params, get_subtitle_counts,
+                    search_cache_params, search_video_subtitles,
+                    subtitle_list_queryset, video_list_queryset)
+
+
+def async_api_view(view):
+    """
+    Serve the data returned by an async view as JSON, and its API errors
+    as DRF would. The view gets a DRF request, for the paginators and
+    serializers. Only GET and HEAD are allowed.
+    """
+    @require_safe
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            data = await view(Request(request), *args, **kwargs)
+        except APIException as exc:
+            data = exc.detail
+            if not isinstance(data, (list, dict)):
+                data = {'detail': data}
+            return JsonResponse(data, status=exc.status_code, safe=False)
+        return JsonResponse(data, safe=False)
+    return wrapper
+
+
+async def get_video(video_id):
+    if not await Video.objects.filter(id=video_id).aexists():
+        raise NotFound("Video not found.")
+
+
+@async_api_view
+async def video_list(request):
+    """Async version of VideoListView."""
+    cache_key = await avideo_list_cache_key(request.build_absolute_uri())
+    data = await cache.aget(cache_key)
+    if data is None:
+        paginator = VideoListPagination()
+        page = await paginator.apaginate_queryset(video_list_queryset(), request)
+        context = {
+            'request': request,
+            'subtitle_counts': await sync_to_async(get_subtitle_counts)(
+                [video.id for video in page]),
+        }
+        serializer = VideoSummarySerializer(page, many=True, context=context)
+        data = paginator.get_paginated_response(serializer.data).data
+        await cache.aset(cache_key, data, settings.VIDEO_LIST_CACHE_TIMEOUT)
+    return data
+
+
+@async_api_view
+async def subtitle_list(request, video_id):
+    """Async version of SubtitleListView."""
+    await get_video(video_id)
+    paginator = SubtitleKeysetPagination()
+    page = await paginator.apaginate_queryset(
+        subtitle_list_queryset(video_id, request.GET.get('language')), request)
+
+    kwargs = {}
+    fields = request.GET.get('fields')
+    if fields:
+        kwargs['fields'] = [field.strip() for field in fields.split(',')]
+    serializer = SubtitleSerializer(
+        page, many=True, context={'request': request}, **kwargs)
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@async_api_view
+async def search_subtitles(request, video_id):
+    """Async version of SearchSubtitleView."""
+    params = search_cache_params(request)
+
+    async def search():
+        await get_video(video_id)
+        _, mode = get_search_params(request)
+        # Building the query looks up the search configurations in use
+        subtitles = await sync_to_async(search_video_subtitles)(
+            Subtitle.objects.filter(video_id=video_id).select_related('language'),
+            params['query'], mode, request.GET.get('language'))
+
+        paginator = SubtitleSearchPagination()
+        page = await paginator.apaginate_queryset(subtitles, request)
+        if page is None:
+            page = [subtitle async for subtitle in subtitles]
+        previews = await sync_to_async(get_previews)([video_id])
+        serializer = SubtitleSearchSerializer(
+            page, many=True, context={'request': request, 'previews': previews})
+        if paginator.get_page_size(request):
+            return paginator.get_paginated_response(serializer.data).data
+        return serializer.data
+
+    return await acached_video_query('search', video_id, params, search)
+
+
+@async_api_view
+async def video_languages(request, video_id):
+    """Async version of VideoLanguagesView."""
+
+    async def languages():
+        try:
+            video = await Video.objects.select_related(
+                'duplicate_of').aget(id=video_id)
+        except Video.DoesNotExist:
+            raise NotFound("Video not found.")
+        # Duplicates share the media file of their original
+        probe_data = video.probe_data or (
+            video.duplicate_of.probe_data if video.duplicate_of else None)
+
+        subtitles = Subtitle.objects.filter(
+            video_id=video_id).select_related('language').distinct('language')
+        return describe_languages(
+            probe_data, [subtitle.language async for subtitle in subtitles])
+
+    return await acached_video_query('languages', video_id, {}, languages)
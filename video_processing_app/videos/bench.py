@@ -0,0 +1,211 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Fixtures are generated locally with ffmpeg so benchmarks can be reproduced
+without shipping large media files.
+"""
+import http.client
+import itertools
+import os
+import statistics
+import subprocess
+import threading
+import time
+import urllib.parse
+
+# Subtitle languages used for generated fixtures, in track order
+FIXTURE_LANGUAGES = [
+    'eng', 'rus', 'jpn', 'spa', 'fre', 'ger', 'ita', 'por',
+    'chi', 'kor', 'ara', 'hin', 'pol', 'tur', 'dut', 'swe',
+]
+
+FIXTURE_WORDS = [
+    'alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf',
+    'hotel', 'india', 'juliet', 'kilo', 'lima', 'mike', 'november',
+    'oscar', 'papa', 'quebec', 'romeo', 'sierra', 'tango', 'uniform',
+    'victor', 'whiskey', 'xray', 'yankee', 'zulu',
+]
+
+
+def format_timestamp(milliseconds, separator='.'):
+    """Format milliseconds as HH:MM:SS.mmm (SRT uses ',' as separator)."""
+    hours, remainder = divmod(milliseconds, 3_600_000)
+    minutes, remainder = divmod(remainder, 60_000)
+    seconds, millis = divmod(remainder, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{millis:03d}"
+
+
+def fixture_cue_text(track, cue):
+    """Return deterministic pseudo-random text for a fixture cue."""
+    words = [FIXTURE_WORDS[(track * 7 + cue * 5 + i * 11 + cue // 26) % len(FIXTURE_WORDS)]
+             for i in range(6)]
+    return f"{' '.join(words[:3])}\n{' '.join(words[3:])} {cue}"
+
+
+def write_srt_fixture(path, track, duration, cues_per_minute):
+    """Write an SRT file with evenly spaced cues covering `duration` seconds."""
+    cue_count = max(1, int(duration * cues_per_minute / 60))
+    spacing = duration * 1000 // cue_count
+    with open(path, 'w', encoding='utf-8') as file:
+        for cue in range(cue_count):
+            start = cue * spacing
+            end = start + max(1, spacing - 100)
+            file.write(f"{cue + 1}\n")
+            file.write(
+                f"{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n")
+            file.write(f"{fixture_cue_text(track, cue)}\n\n")
+    return cue_count
+
+
+def generate_fixture(path, duration=60, tracks=4, cues_per_minute=20,
+                     size='640x360'):
+    """
+    Generate a video at `path` with `tracks` subtitle streams.
+
+    The container format follows the file extension (MKV or MP4). Returns the
+    list of (stream_index, language_code) pairs for the subtitle streams.
+    """
+    if tracks > len(FIXTURE_LANGUAGES):
+        raise ValueError(
+            f"At most {len(FIXTURE_LANGUAGES)} subtitle tracks are supported.")
+
+    srt_paths = []
+    for track in range(tracks):
+        srt_path = f"{path}.{track}.srt"
+        write_srt_fixture(srt_path, track, duration, cues_per_minute)
+        srt_paths.append(srt_path)
+
+    subtitle_codec = 'mov_text' if path.endswith('.mp4') else 'srt'
+    ffmpeg_cmd = [
+        'ffmpeg', '-v', 'error', '-y', '-f', 'lavfi',
+        '-i', f'testsrc2=size={size}:rate=25:duration={duration}',
+    ]
+    for srt_path in srt_paths:
+        ffmpeg_cmd += ['-i', srt_path]
+    ffmpeg_cmd += ['-map', '0:v']
+    for track in range(tracks):
+        ffmpeg_cmd += ['-map', f'{track + 1}:s']
+    ffmpeg_cmd += ['-c:v', 'mpeg4', '-q:v', '2', '-c:s', subtitle_codec]
+    for track in range(tracks):
+        ffmpeg_cmd += [f'-metadata:s:s:{track}',
+                       f'language={FIXTURE_LANGUAGES[track]}']
+    ffmpeg_cmd.append(path)
+
+    try:
+        subprocess.run(ffmpeg_cmd, check=True)
+    finally:
+        for srt_path in srt_paths:
+            os.remove(srt_path)
+
+    return [(track + 1, FIXTURE_LANGUAGES[track]) for track in range(tracks)]
+
+
+def time_call(function, *args, runs=1, setup=None, **kwargs):
+    """Call `function` `runs` times and return the wall-clock durations."""
+    durations = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function(*args, **kwargs)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of `values` (fraction in 0..1)."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(durations):
+    """Summarize a list of durations (seconds) as a dictionary."""
+    return {
+        'runs': len(durations),
+        'min': min(durations),
+        'mean': statistics.fmean(durations),
+        'p50': percentile(durations, 0.50),
+        'p99': percentile(durations, 0.99),
+        'max': max(durations),
+    }
+
+
+def run_load(url, requests, concurrency, timeout=30):
+    """
+    Send `requests` GET requests to `url` from `concurrency` threads, each
+    over its own keep-alive connection.
+
+    Returns a dict with the request 'durations' (seconds), the number of
+    'errors' (failed requests and non-2xx responses) and the 'elapsed'
+    wall-clock time.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else '')
+    counter = itertools.count()
+    lock = threading.Lock()
+    durations, errors = [], []
+
+    def worker():
+        connection = http.client.HTTPConnection(parts.netloc, timeout=timeout)
+        while next(counter) < requests:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                ok = 200 <= response.status < 300
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            with lock:
+                (durations if ok else errors).append(time.perf_counter() - started)
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'durations': durations, 'errors': len(errors),
+            'elapsed': time.perf_counter() - started}
+
+
+def iter_summaries(results, path=()):
+    """
+    Yield (path, summary) for every duration summary nested in `results`,
+    where `path` is the tuple of keys leading to it.
+    """
+    if not isinstance(results, dict):
+        return
+    if 'runs' in results and 'p50' in results:
+        yield path, results
+        return
+    for key, value in results.items():
+        yield from iter_summaries(value, path + (key,))
+
+
+def find_regressions(baseline, results, threshold=0.2, statistic='p50',
+                     min_delta=0.001):
+    """
+    Compare the duration summaries of two benchmark runs.
+
+    A summary regresses when its `statistic` grew by more than `threshold`
+    (a fraction of the baseline) and by more than `min_delta` seconds, so
+    sub-millisecond jitter is not reported. Summaries present in only one
+    of the runs are ignored. Returns a list of (path, baseline, current)
+    tuples, slowest relative change first.
+    """
+    baseline_summaries = dict(iter_summaries(baseline))
+    regressions = []
+    for path, summary in iter_summaries(results):
+        previous = baseline_summaries.get(path)
+        if previous is None:
+            continue
+        before, after = previous[statistic], summary[statistic]
+        if after - before > max(before * threshold, min_delta):
+            regressions.append((path, before, after))
+    regressions.sort(key=lambda regression: regression[2] / (regression[1] or 1e-9),
+                     reverse=True)
+    return regressions
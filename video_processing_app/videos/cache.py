@@ -0,0 +1,152 @@
+"""
+Application caching helpers.
+
+Cached responses are namespaced by a version stored in the cache itself;
+bumping the version invalidates every entry of the namespace at once and
+lets the stale entries expire on their own.
+"""
+import hashlib
+import json
+import pickle
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+VIDEO_LIST_VERSION_KEY = 'videos:list:version'
+
+
+def get_video_list_version():
+    """Return the current version of the cached video list."""
+    return cache.get_or_set(VIDEO_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_video_list():
+    """Invalidate every cached page of the video list."""
+    cache.set(VIDEO_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def video_list_cache_key(url, version=None):
+    """Return the cache key of a video list page, identified by its URL."""
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return f"videos:list:{version or get_video_list_version()}:{digest}"
+
+
+async def avideo_list_cache_key(url):
+    """Async version of `video_list_cache_key`."""
+    version = await cache.aget_or_set(
+        VIDEO_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+    return video_list_cache_key(url, version)
+
+
+def subtitle_track_cache_key(video_id, language_code):
+    """Return the cache key of the metadata of a subtitle track."""
+    return f"videos:track:{video_id}:{language_code}"
+
+
+# Results of per-video queries (subtitle search, language lookups) cached
+# by kind, e.g. 'search' or 'languages'
+QUERY_CACHE_KINDS = ('search', 'languages')
+
+
+def get_video_version(video_id):
+    """Return the current version of the cached queries of a video."""
+    return cache.get_or_set(f"videos:{video_id}:version", uuid.uuid4().hex, None)
+
+
+def invalidate_video_queries(video_id):
+    """Invalidate every cached query result of a video."""
+    cache.set(f"videos:{video_id}:version", uuid.uuid4().hex, None)
+
+
+def normalize_query(term):
+    """Return a search term lowercased, with its whitespace collapsed."""
+    return ' '.join(term.lower().split())
+
+
+def video_query_cache_key(kind, video_id, params, version=None):
+    """
+    Return the cache key of a query result of a video, identified by its
+    kind and its parameters.
+    """
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+    version = version or get_video_version(video_id)
+    return f"videos:query:{kind}:{video_id}:{version}:{digest}"
+
+
+def count_query_cache(kind, outcome):
+    """Count a cache 'hits' or 'misses' of a kind of query."""
+    key = f"videos:query:stats:{kind}:{outcome}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, 1, None)
+
+
+def cached_video_query(kind, video_id, params, compute):
+    """
+    Return the cached result of a query of a video, calling `compute` to
+    produce and cache it on a miss.
+
+    Results larger than QUERY_CACHE_MAX_ENTRY_SIZE bytes once pickled are
+    not cached, so a handful of broad queries cannot crowd out the others.
+    The total size of the cache is left to the Redis eviction policy (see
+    videos/checks.py).
+    """
+    key = video_query_cache_key(kind, video_id, params)
+    result = cache.get(key)
+    if result is not None:
+        count_query_cache(kind, 'hits')
+        return result
+    count_query_cache(kind, 'misses')
+    result = compute()
+    if len(pickle.dumps(result)) <= settings.QUERY_CACHE_MAX_ENTRY_SIZE:
+        cache.set(key, result, settings.QUERY_CACHE_TIMEOUT)
+    return result
+
+
+async def acached_video_query(kind, video_id, params, compute):
+    """
+    Async version of `cached_video_query`; `compute` is a coroutine
+    function. Shares its entries and counters.
+    """
+    version = await cache.aget_or_set(
+        f"videos:{video_id}:version", uuid.uuid4().hex, None)
+    key = video_query_cache_key(kind, video_id, params, version)
+    result = await cache.aget(key)
+    stats_key = f"videos:query:stats:{kind}:{'misses' if result is None else 'hits'}"
+    await cache.aadd(stats_key, 0, None)
+    try:
+        await cache.aincr(stats_key)
+    except ValueError:
+        await cache.aset(stats_key, 1, None)
+    if result is not None:
+        return result
+    result = await compute()
+    if len(pickle.dumps(result)) <= settings.QUERY_CACHE_MAX_ENTRY_SIZE:
+        await cache.aset(key, result, settings.QUERY_CACHE_TIMEOUT)
+    return result
+
+
+def query_cache_stats():
+    """Return the hit and miss counters of every kind of cached query."""
+    keys = {f"videos:query:stats:{kind}:{outcome}": (kind, outcome)
+            for kind in QUERY_CACHE_KINDS for outcome in ('hits', 'misses')}
+    counters = cache.get_many(keys)
+    stats = {}
+    for key, (kind, outcome) in keys.items():
+        stats.setdefault(kind, {})[outcome] = counters.get(key, 0)
+    for counts in stats.values():
+        total = counts['hits'] + counts['misses']
+        counts['hit_rate'] = round(counts['hits'] / total, 4) if total else None
+    return stats
+
+
+def reset_query_cache_stats():
+    """Reset the hit and miss counters of every kind of cached query."""
+    cache.delete_many([f"videos:query:stats:{kind}:{outcome}"
+                       for kind in QUERY_CACHE_KINDS
+                       for outcome in ('hits', 'misses')])
@@ -0,0 +1,86 @@
+"""
+System checks of the deployment this app depends on.
+
+The query cache (see videos/cache.py) bounds the size of each entry, not
+the total: its total size is left to Redis. Without a `maxmemory`, or with
+a policy that may evict keys without an expiry, the cache either grows
+without bound or can evict the Celery queues sharing the instance.
+
+The check connects to Redis, so it only runs with `manage.py check
+--deploy`, not before every management command.
+"""
+import re
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.checks import Tags, Warning, register
+
+# Policies only evicting keys that expire: every cached result does, the
+# Celery queues and the cache versions do not
+EVICTION_POLICIES = ('volatile-lru', 'volatile-lfu', 'volatile-ttl', 'volatile-random')
+
+
+def get_cache_config(location):
+    """Return the maxmemory settings of the Redis server at `location`."""
+    # Like RedisCache, read from the first server of a list
+    if isinstance(location, str):
+        location = re.split('[;,]', location)
+    client = redis.Redis.from_url(location[0], socket_timeout=5,
+                                  decode_responses=True)
+    try:
+        return client.config_get('maxmemory*')
+    finally:
+        client.close()
+
+
+def could_not_read(error):
+    return Warning(
+        f"Could not read the maxmemory settings of the Redis cache: {error}",
+        hint="The query cache relies on a Redis maxmemory and a volatile-* "
+             "eviction policy to bound its size.",
+        id='videos.W001',
+    )
+
+
+@register(Tags.caches, deploy=True)
+def check_cache_eviction(app_configs, **kwargs):
+    """Warn unless the Redis cache has a maxmemory and an expiry-only policy."""
+    if not isinstance(caches['default'], RedisCache):
+        return []
+    try:
+        config = get_cache_config(settings.CACHES['default']['LOCATION'])
+    except redis.ResponseError as e:
+        # Managed services often rename or disable CONFIG
+        if 'unknown command' in str(e).lower():
+            return [Warning(
+                "CONFIG is disabled on the Redis cache, so its maxmemory "
+                "settings could not be checked.",
+                hint="Make sure the server has a maxmemory and a volatile-* "
+                     "eviction policy.",
+                id='videos.W004',
+            )]
+        return [could_not_read(e)]
+    except Exception as e:
+        return [could_not_read(e)]
+
+    warnings = []
+    if int(config.get('maxmemory', 0)) == 0:
+        warnings.append(Warning(
+            "The Redis cache has no maxmemory, so the query cache can grow "
+            "without bound.",
+            hint="Set maxmemory in redis.conf (or with CONFIG SET).",
+            id='videos.W002',
+        ))
+    policy = config.get('maxmemory-policy')
+    if policy not in EVICTION_POLICIES:
+        warnings.append(Warning(
+            f"The Redis cache uses the {policy!r} eviction policy.",
+            hint=f"Use one of {', '.join(EVICTION_POLICIES)} so only cached "
+                 f"results expiring after QUERY_CACHE_TIMEOUT "
+                 f"({settings.QUERY_CACHE_TIMEOUT} s) are evicted, never the "
+                 f"Celery queues.",
+            id='videos.W003',
+        ))
+    return warnings
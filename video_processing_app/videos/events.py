@@ -0,0 +1,111 @@
+"""
+Processing progress notifications.
+
+Workers publish a snapshot of a ProcessingJob on a Redis pub/sub channel
+every time it changes; the status stream view relays those messages to
+clients as Server-Sent Events, so clients never have to poll. Under ASGI
+the stream is an async generator; under WSGI, an async generator would be
+consumed whole before anything is sent, so a blocking one is used instead.
+"""
+import json
+import logging
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from .models import ProcessingJob
+
+logger = logging.getLogger(__name__)
+
+# Seconds without an update after which a keep-alive comment is sent
+KEEPALIVE_INTERVAL = 15
+
+_redis_client = None
+
+
+def job_channel(video_id):
+    """Return the pub/sub channel carrying the job updates of a video."""
+    return f"videos:{video_id}:status"
+
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.PROGRESS_REDIS_URL)
+    return _redis_client
+
+
+def publish_job(job):
+    """Publish a snapshot of the job. Failures are logged, never raised."""
+    try:
+        get_redis_client().publish(
+            job_channel(job.video_id), json.dumps(job.as_dict()))
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish progress of job {job.id}: {e}")
+
+
+def format_event(data, event='status'):
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def job_events(video_id):
+    """
+    Yield Server-Sent Events for the processing jobs of a video: the latest
+    job first, then every update, until the job finishes. Blocks between
+    updates, for WSGI servers; see `ajob_events` for ASGI.
+    """
+    pubsub = get_redis_client().pubsub()
+    # Subscribe before reading the snapshot so no update is missed
+    pubsub.subscribe(job_channel(video_id))
+    try:
+        job = ProcessingJob.objects.filter(
+            video_id=video_id).order_by('-created_at').first()
+        if job is not None:
+            yield format_event(job.as_dict())
+            if job.state in ProcessingJob.FINISHED_STATES:
+                return
+
+        while True:
+            message = pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.loads(message['data'])
+            yield format_event(data)
+            if data['state'] in ProcessingJob.FINISHED_STATES:
+                return
+    finally:
+        pubsub.close()
+
+
+async def ajob_events(video_id):
+    """Async version of `job_events`, for ASGI servers."""
+    client = redis.asyncio.Redis.from_url(settings.PROGRESS_REDIS_URL)
+    pubsub = client.pubsub()
+    # Subscribe before reading the snapshot so no update is missed
+    await pubsub.subscribe(job_channel(video_id))
+    try:
+        job = await ProcessingJob.objects.filter(
+            video_id=video_id).order_by('-created_at').afirst()
+        if job is not None:
+            yield format_event(job.as_dict())
+            if job.state in ProcessingJob.FINISHED_STATES:
+                return
+
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.loads(message['data'])
+            yield format_event(data)
+            if data['state'] in ProcessingJob.FINISHED_STATES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
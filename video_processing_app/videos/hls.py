@@ -0,0 +1,230 @@
+"""
+HLS packaging of videos.
+
+Videos are remuxed by ffmpeg into an HLS media playlist with fMP4
+segments, copying the video and audio streams when browsers can decode
+them and re-encoding them to H.264/AAC otherwise. Players then fetch a few
+seconds at a time, so playback starts and seeks without downloading the
+file, whatever its size or container.
+
+The master playlist is rendered per request: it points at the stored media
+playlist and attaches the subtitles of the video as WebVTT renditions,
+each served from its subtitle track (see videos/tracks.py), so subtitles
+extracted or edited after packaging show up without repackaging.
+"""
+import math
+import os
+import re
+import subprocess
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.urls import reverse
+
+from .cache import invalidate_video_list
+from .languages import language_tag
+from .metrics import span
+from .models import HlsPackage
+from .probe import file_probe_key, get_probe_data
+
+PLAYLIST_NAME = 'video.m3u8'
+
+# Codecs remuxed as they are: browsers decode them from fMP4 segments
+COPYABLE_VIDEO_CODECS = {'h264', 'hevc'}
+COPYABLE_AUDIO_CODECS = {'aac', 'mp3'}
+
+# Content type of each kind of file of a package
+CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.mp4': 'video/mp4',
+    '.m4s': 'video/iso.segment',
+}
+
+# Names of the files of a package, as they appear in URLs
+FILE_NAME_RE = re.compile(r'^[\w-]+\.(m3u8|mp4|m4s)$')
+
+
+def codec_arguments(probe_data, segment_duration):
+    """
+    Return the ffmpeg codec arguments of the first video and audio streams
+    and whether anything has to be re-encoded.
+    """
+    streams = probe_data['streams']
+    video = next((stream for stream in streams
+                  if stream['codec_type'] == 'video'), None)
+    audio = next((stream for stream in streams
+                  if stream['codec_type'] == 'audio'), None)
+
+    arguments, transcoded = [], False
+    if video is not None:
+        if video['codec_name'] in COPYABLE_VIDEO_CODECS:
+            arguments += ['-c:v', 'copy']
+            if video['codec_name'] == 'hevc':
+                # The sample entry Safari expects for HEVC
+                arguments += ['-tag:v', 'hvc1']
+        else:
+            # Force a keyframe at every segment boundary, so segments are
+            # cut where requested
+            arguments += [
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23',
+                '-pix_fmt', 'yuv420p',
+                '-force_key_frames', f'expr:gte(t,n_forced*{segment_duration})',
+            ]
+            transcoded = True
+    if audio is not None:
+        if audio['codec_name'] in COPYABLE_AUDIO_CODECS:
+            arguments += ['-c:a', 'copy']
+        else:
+            arguments += ['-c:a', 'aac', '-b:a', '128k', '-ac', '2']
+            transcoded = True
+    return arguments, transcoded
+
+
+def read_media_playlist(path):
+    """Return the (duration, segment name) pairs listed in a media playlist."""
+    segments, duration = [], None
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+            elif line and not line.startswith('#') and duration is not None:
+                segments.append((duration, line))
+                duration = None
+    return segments
+
+
+def remux(video_path, output_dir, codec_args, segment_duration):
+    """
+    Package a video as an HLS media playlist with fMP4 segments in
+    `output_dir`. Raises CalledProcessError if ffmpeg fails.
+    """
+    ffmpeg_cmd = [
+        'ffmpeg', '-v', 'error', '-y', '-i', video_path,
+        '-map', '0:v:0?', '-map', '0:a:0?', '-sn', '-dn',
+        *codec_args,
+        '-f', 'hls', '-hls_time', str(segment_duration),
+        '-hls_playlist_type', 'vod', '-hls_segment_type', 'fmp4',
+        '-hls_fmp4_init_filename', 'init.mp4',
+        '-hls_segment_filename', os.path.join(output_dir, 'segment_%05d.m4s'),
+        os.path.join(output_dir, PLAYLIST_NAME),
+    ]
+    subprocess.run(ffmpeg_cmd, check=True, capture_output=True, text=True)
+
+
+def package_video(video, force=False):
+    """
+    Package a video for HLS, unless it was already packaged from the file
+    as it is now and `force` is not set. Returns the package, or None when
+    the video would need re-encoding and HLS_TRANSCODE is off.
+    """
+    video_path = video.video_file.path
+    probe_key = file_probe_key(video_path, video.content_hash)
+    package = HlsPackage.objects.filter(video=video).first()
+    if package is not None and not force and package.probe_key == probe_key:
+        return package
+
+    segment_duration = settings.HLS_SEGMENT_DURATION
+    codec_args, transcoded = codec_arguments(get_probe_data(video), segment_duration)
+    if transcoded and not settings.HLS_TRANSCODE:
+        return None
+
+    directory = f'hls/{video.id}/{uuid.uuid4().hex[:12]}'
+    with tempfile.TemporaryDirectory() as output_dir, span('package', video_id=video.id):
+        remux(video_path, output_dir, codec_args, segment_duration)
+        segments = read_media_playlist(os.path.join(output_dir, PLAYLIST_NAME))
+        sizes = {name: os.path.getsize(os.path.join(output_dir, name))
+                 for name in os.listdir(output_dir)}
+        for name in sorted(sizes):
+            with open(os.path.join(output_dir, name), 'rb') as file:
+                saved = default_storage.save(f'{directory}/{name}', File(file))
+            if saved != f'{directory}/{name}':
+                raise RuntimeError(f"Storage renamed {name} to {saved}.")
+
+    duration = sum(seconds for seconds, _ in segments)
+    segment_bytes = sum(sizes[name] for _, name in segments)
+    old_directory = package.directory if package is not None else None
+    package = package or HlsPackage(video=video)
+    package.probe_key = probe_key
+    package.directory = directory
+    package.transcoded = transcoded
+    package.duration = duration
+    package.segment_count = len(segments)
+    package.size = sum(sizes.values())
+    package.bandwidth = max(
+        (round(sizes[name] * 8 / seconds) for seconds, name in segments if seconds),
+        default=0)
+    package.average_bandwidth = round(segment_bytes * 8 / duration) if duration else 0
+    package.save()
+    if old_directory:
+        delete_package_files(old_directory)
+    # The video list links to the stream
+    invalidate_video_list()
+    return package
+
+
+def delete_package_files(directory):
+    """Remove the stored files of a package."""
+    try:
+        _, names = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        default_storage.delete(f'{directory}/{name}')
+
+
+def get_package(video_id):
+    """
+    Return the HLS package a video is played from, its own or that of the
+    video it duplicates, or None.
+    """
+    return HlsPackage.objects.filter(
+        Q(video_id=video_id) | Q(video__duplicates=video_id)).first()
+
+
+def attribute(value):
+    """Quote a string attribute of a playlist tag."""
+    return '"' + str(value).replace('"', "'").replace('\n', ' ') + '"'
+
+
+def render_master_playlist(video_id, package, languages, default_code=None):
+    """
+    Render the master playlist of a video: its media playlist, with the
+    subtitles of each of `languages` attached as a WebVTT rendition.
+    """
+    lines = ['#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-INDEPENDENT-SEGMENTS']
+    for language in languages:
+        lines.append(
+            '#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",'
+            f'NAME={attribute(language.name or language.code)},'
+            f'LANGUAGE={attribute(language_tag(language.code))},'
+            f'DEFAULT={"YES" if language.code == default_code else "NO"},'
+            'AUTOSELECT=YES,'
+            f'URI={attribute(reverse("hls-subtitles", args=[video_id, language.code]))}')
+    stream_info = (f'#EXT-X-STREAM-INF:BANDWIDTH={package.bandwidth},'
+                   f'AVERAGE-BANDWIDTH={package.average_bandwidth}')
+    if languages:
+        stream_info += ',SUBTITLES="subs"'
+    lines += [stream_info,
+              reverse('hls-file', args=[video_id, package.version, PLAYLIST_NAME])]
+    return '\n'.join(lines) + '\n'
+
+
+def render_subtitle_playlist(video_id, package, language_code):
+    """
+    Render the media playlist of a subtitle rendition: the whole WebVTT
+    track of the language as a single segment.
+    """
+    return '\n'.join([
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{max(1, math.ceil(package.duration))}',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        f'#EXTINF:{package.duration:.3f},',
+        reverse('subtitle-track', args=[video_id, language_code]),
+        '#EXT-X-ENDLIST',
+    ]) + '\n'
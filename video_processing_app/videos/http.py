@@ -0,0 +1,126 @@
+"""
+HTTP helpers for serving files.
+
+Files are served whole or, for requests with a single byte range, as a
+206 Partial Content response; both are streamed from the file. Multiple
+ranges and invalid Range headers are ignored and the whole file is served,
+as RFC 9110 allows.
+"""
+import re
+
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a requested byte range lies outside the file."""
+
+
+def parse_range(header, size):
+    """
+    Parse a Range header against a file of `size` bytes.
+
+    Returns the inclusive (start, end) byte positions of the range, or None
+    when the whole file should be served, as for headers that are not a
+    single valid range (e.g. `bytes=5-2`). Raises RangeNotSatisfiable when
+    a valid range starts past the end of the file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last `last` bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+class RangeFile:
+    """
+    Read-only view of the bytes `start` to `end` (inclusive) of an open
+    binary file, so FileResponse streams them and closes the file.
+    """
+
+    def __init__(self, file, start, end):
+        file.seek(start)
+        self.file = file
+        self.remaining = end - start + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def serve_file(request, file, size, content_type, etag=None, last_modified=None):
+    """
+    Serve an open binary `file` of `size` bytes, honouring Range and If-Range
+    headers. The file is closed once the response is sent.
+
+    `etag` (a quoted entity tag) and `last_modified` (a Unix timestamp) are
+    sent with the response; conditional requests should be answered with
+    `conditional_response` before opening the file.
+    """
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    # A range only applies to the representation the client already has
+    if if_range is None or (etag is not None and if_range == etag):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end), status=206,
+                                content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """Set the ETag and Last-Modified headers of a response."""
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def conditional_response(request, etag=None, last_modified=None):
+    """
+    Return a 304 Not Modified (or 412 Precondition Failed) response when
+    the request's conditional headers match the given validators, else None.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,167 @@
+"""
+Bulk ingestion of existing video libraries.
+
+Files already under MEDIA_ROOT are probed in a process pool, registered in
+batches with bulk_create, and their subtitle extraction is queued batch by
+batch. Before each batch the ingestion waits while too many jobs are still
+in flight, so the broker is never flooded.
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_video_list
+from .languages import canonical_language_code
+from .models import ProcessingJob, Video
+from .probe import file_probe_key, probe_video, subtitle_streams
+from .tasks import (copy_subtitles, extract_subtitles_task, fail_stale_jobs,
+                    queue_media_tasks)
+from .uploads import hash_file, is_supported_video
+
+
+def scan_library(directory):
+    """Yield the paths of the supported video files under `directory`, in order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if is_supported_video(name):
+                yield os.path.join(root, name)
+
+
+def storage_name(path):
+    """Return the storage name of a file under MEDIA_ROOT."""
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def probe_file(path, with_hash=False):
+    """
+    Probe the streams of a file. Runs in a pool worker.
+
+    Returns a dict with the 'path', the 'languages' of its subtitle streams,
+    its 'content_hash' when `with_hash` is set, the stream metadata and file
+    key to store on the video as 'probe_data' and 'probe_key', and the
+    'error' if the file could not be probed.
+    """
+    result = {'path': path, 'languages': [], 'content_hash': None,
+              'probe_data': None, 'probe_key': '', 'error': ''}
+    try:
+        result['probe_data'] = probe_video(path)
+        for stream in subtitle_streams(result['probe_data']):
+            result['languages'].append(canonical_language_code(stream['language']))
+        if with_hash:
+            result['content_hash'] = hash_file(path)
+        result['probe_key'] = file_probe_key(path, result['content_hash'])
+    except Exception as e:
+        result['error'] = str(getattr(e, 'stderr', None) or e).strip()
+    return result
+
+
+def wait_for_capacity(max_in_flight, poll_interval=2):
+    """
+    Block until fewer than `max_in_flight` jobs are pending or running.
+    Stale jobs are failed along the way, so they cannot hold a slot.
+    """
+    while True:
+        fail_stale_jobs()
+        if ProcessingJob.objects.exclude(
+                state__in=ProcessingJob.FINISHED_STATES).count() < max_in_flight:
+            return
+        time.sleep(poll_interval)
+
+
+def register_batch(probes):
+    """
+    Register a batch of probed files as videos in a single transaction and
+    queue their extraction once it commits.
+
+    Files whose content is already stored, or appears earlier in the batch,
+    become duplicates of that video. Files without subtitle streams get a
+    finished job straight away. Returns a tuple (videos, duplicates, queued).
+    """
+    hashes = [probe['content_hash'] for probe in probes if probe['content_hash']]
+    originals = {
+        video.content_hash: video
+        for video in Video.objects.filter(
+            content_hash__in=hashes, duplicate_of__isnull=True)
+    }
+    existing_originals = set(originals)
+
+    videos, duplicates = [], []
+    for probe in probes:
+        title = os.path.splitext(os.path.basename(probe['path']))[0]
+        video = Video(title=title, video_file=storage_name(probe['path']),
+                      content_hash=probe['content_hash'],
+                      probe_data=probe['probe_data'], probe_key=probe['probe_key'])
+        original = originals.get(video.content_hash) if video.content_hash else None
+        if original is None:
+            if video.content_hash:
+                originals[video.content_hash] = video
+            videos.append((video, probe))
+        else:
+            video.duplicate_of = original
+            video.video_file = original.video_file.name
+            video.probe_data, video.probe_key = original.probe_data, original.probe_key
+            duplicates.append(video)
+
+    now = timezone.now()
+    with transaction.atomic():
+        Video.objects.bulk_create([video for video, _ in videos])
+        # Duplicates of the originals just created pick up their primary keys
+        Video.objects.bulk_create(duplicates)
+
+        jobs = ProcessingJob.objects.bulk_create([
+            ProcessingJob(video=video) if probe['languages'] else
+            ProcessingJob(video=video, state=ProcessingJob.SUCCEEDED,
+                          started_at=now, finished_at=now)
+            for video, probe in videos
+        ])
+        queued = [(job.video_id, job.id) for job in jobs
+                  if job.state == ProcessingJob.PENDING]
+
+        # Originals registered in this batch share their subtitles once
+        # their own extraction finishes
+        for video in duplicates:
+            if video.content_hash in existing_originals:
+                copy_subtitles(video.duplicate_of, video)
+
+        transaction.on_commit(lambda: [
+            extract_subtitles_task.delay(video_id, job_id)
+            for video_id, job_id in queued
+        ])
+        # Every original gets its preview and HLS package, subtitles or not
+        transaction.on_commit(
+            lambda: queue_media_tasks([video.id for video, _ in videos]))
+    # bulk_create sends no signals, so drop the cached video list here
+    invalidate_video_list()
+    return [video for video, _ in videos], duplicates, queued
+
+
+class Checkpoint:
+    """
+    Record of the files an ingestion already handled, kept in a JSON file
+    so an interrupted run can resume where it stopped.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.registered, self.failed = set(), {}
+        if path and resume and os.path.isfile(path):
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+            self.registered = set(data['registered'])
+            self.failed = data['failed']
+
+    def __contains__(self, path):
+        return path in self.registered or path in self.failed
+
+    def save(self):
+        if not self.path:
+            return
+        with open(f"{self.path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump({'registered': sorted(self.registered),
+                       'failed': self.failed}, file)
+        os.replace(f"{self.path}.tmp", self.path)
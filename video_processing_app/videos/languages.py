@@ -0,0 +1,321 @@
+"""
+Registry of subtitle languages.
+
+Language tags come in several forms: ISO 639-1 (`en`), ISO 639-2
+bibliographic (`ger`) or terminologic (`deu`) codes, and BCP-47 tags with
+a region or script (`pt-BR`, `zh-Hans`). They are all normalized to one
+canonical code, the ISO 639-2/B code that ffprobe reports for Matroska and
+MP4 streams, so a language is stored once whatever tag a file uses.
+
+The Language rows are cached in each process by the registry, which is
+loaded once per worker; languages it has not seen are upserted in bulk.
+"""
+from django.db import transaction
+
+from .models import Language
+from .search import search_config_for
+
+# Code of the language of subtitle streams without a (known) language tag
+UNKNOWN = 'x-unknown'
+
+# ISO 639-1 code, ISO 639-2/B code, ISO 639-2/T code when it differs, name
+ISO_639 = """
+aa aar - Afar
+ab abk - Abkhazian
+ae ave - Avestan
+af afr - Afrikaans
+ak aka - Akan
+am amh - Amharic
+an arg - Aragonese
+ar ara - Arabic
+as asm - Assamese
+av ava - Avaric
+ay aym - Aymara
+az aze - Azerbaijani
+ba bak - Bashkir
+be bel - Belarusian
+bg bul - Bulgarian
+bh bih - Bihari
+bi bis - Bislama
+bm bam - Bambara
+bn ben - Bengali
+bo tib bod Tibetan
+br bre - Breton
+bs bos - Bosnian
+ca cat - Catalan
+ce che - Chechen
+ch cha - Chamorro
+co cos - Corsican
+cr cre - Cree
+cs cze ces Czech
+cu chu - Church Slavic
+cv chv - Chuvash
+cy wel cym Welsh
+da dan - Danish
+de ger deu German
+dv div - Divehi
+dz dzo - Dzongkha
+ee ewe - Ewe
+el gre ell Greek
+en eng - English
+eo epo - Esperanto
+es spa - Spanish
+et est - Estonian
+eu baq eus Basque
+fa per fas Persian
+ff ful - Fulah
+fi fin - Finnish
+fj fij - Fijian
+fo fao - Faroese
+fr fre fra French
+fy fry - Western Frisian
+ga gle - Irish
+gd gla - Scottish Gaelic
+gl glg - Galician
+gn grn - Guarani
+gu guj - Gujarati
+gv glv - Manx
+ha hau - Hausa
+he heb - Hebrew
+hi hin - Hindi
+ho hmo - Hiri Motu
+hr hrv - Croatian
+ht hat - Haitian
+hu hun - Hungarian
+hy arm hye Armenian
+hz her - Herero
+ia ina - Interlingua
+id ind - Indonesian
+ie ile - Interlingue
+ig ibo - Igbo
+ii iii - Sichuan Yi
+ik ipk - Inupiaq
+io ido - Ido
+is ice isl Icelandic
+it ita - Italian
+iu iku - Inuktitut
+ja jpn - Japanese
+jv jav - Javanese
+ka geo kat Georgian
+kg kon - Kongo
+ki kik - Kikuyu
+kj kua - Kuanyama
+kk kaz - Kazakh
+kl kal - Kalaallisut
+km khm - Khmer
+kn kan - Kannada
+ko kor - Korean
+kr kau - Kanuri
+ks kas - Kashmiri
+ku kur - Kurdish
+kv kom - Komi
+kw cor - Cornish
+ky kir - Kyrgyz
+la lat - Latin
+lb ltz - Luxembourgish
+lg lug - Ganda
+li lim - Limburgish
+ln lin - Lingala
+lo lao - Lao
+lt lit - Lithuanian
+lu lub - Luba-Katanga
+lv lav - Latvian
+mg mlg - Malagasy
+mh mah - Marshallese
+mi mao mri Maori
+mk mac mkd Macedonian
+ml mal - Malayalam
+mn mon - Mongolian
+mr mar - Marathi
+ms may msa Malay
+mt mlt - Maltese
+my bur mya Burmese
+na nau - Nauru
+nb nob - Norwegian Bokmål
+nd nde - North Ndebele
+ne nep - Nepali
+ng ndo - Ndonga
+nl dut nld Dutch
+nn nno - Norwegian Nynorsk
+no nor - Norwegian
+nr nbl - South Ndebele
+nv nav - Navajo
+ny nya - Chichewa
+oc oci - Occitan
+oj oji - Ojibwa
+om orm - Oromo
+or ori - Odia
+os oss - Ossetian
+pa pan - Punjabi
+pi pli - Pali
+pl pol - Polish
+ps pus - Pashto
+pt por - Portuguese
+qu que - Quechua
+rm roh - Romansh
+rn run - Rundi
+ro rum ron Romanian
+ru rus - Russian
+rw kin - Kinyarwanda
+sa san - Sanskrit
+sc srd - Sardinian
+sd snd - Sindhi
+se sme - Northern Sami
+sg sag - Sango
+si sin - Sinhala
+sk slo slk Slovak
+sl slv - Slovenian
+sm smo - Samoan
+sn sna - Shona
+so som - Somali
+sq alb sqi Albanian
+sr srp - Serbian
+ss ssw - Swati
+st sot - Southern Sotho
+su sun - Sundanese
+sv swe - Swedish
+sw swa - Swahili
+ta tam - Tamil
+te tel - Telugu
+tg tgk - Tajik
+th tha - Thai
+ti tir - Tigrinya
+tk tuk - Turkmen
+tl tgl - Tagalog
+tn tsn - Tswana
+to ton - Tongan
+tr tur - Turkish
+ts tso - Tsonga
+tt tat - Tatar
+tw twi - Twi
+ty tah - Tahitian
+ug uig - Uyghur
+uk ukr - Ukrainian
+ur urd - Urdu
+uz uzb - Uzbek
+ve ven - Venda
+vi vie - Vietnamese
+vo vol - Volapük
+wa wln - Walloon
+wo wol - Wolof
+xh xho - Xhosa
+yi yid - Yiddish
+yo yor - Yoruba
+za zha - Zhuang
+zh chi zho Chinese
+zu zul - Zulu
+- fil - Filipino
+- haw - Hawaiian
+- yue - Cantonese
+- mul - Multiple languages
+- zxx - No linguistic content
+"""
+
+LANGUAGE_NAMES = {UNKNOWN: 'Unknown'}
+# BCP-47 tag of each canonical code, as HTML and HLS expect: the ISO 639-1
+# code when there is one
+LANGUAGE_TAGS = {UNKNOWN: 'und'}
+LANGUAGE_ALIASES = {
+    # Undetermined, and withdrawn ISO 639-1 codes
+    'und': UNKNOWN, 'iw': 'heb', 'in': 'ind', 'ji': 'yid', 'mo': 'rum',
+    # ISO 639-3 codes still seen in BCP-47 tags
+    'cmn': 'chi',
+}
+for line in ISO_639.strip().splitlines():
+    part1, part2b, part2t, name = line.split(maxsplit=3)
+    LANGUAGE_NAMES[part2b] = name
+    LANGUAGE_TAGS[part2b] = part1 if part1 != '-' else part2b
+    for alias in (part1, part2b, part2t):
+        if alias != '-':
+            LANGUAGE_ALIASES[alias] = part2b
+
+
+def canonical_language_code(tag):
+    """
+    Return the canonical code of a language tag. Region, script and other
+    BCP-47 subtags are dropped; tags that are not known are kept lowercased.
+    """
+    tag = (tag or '').strip().lower().replace('_', '-')
+    if not tag or tag == UNKNOWN:
+        return UNKNOWN
+    primary = tag.split('-')[0]
+    return LANGUAGE_ALIASES.get(primary, primary or tag)[:10]
+
+
+def language_name(code):
+    """Return the English name of a canonical language code, or ''."""
+    return LANGUAGE_NAMES.get(code, '')
+
+
+def language_tag(code):
+    """Return the BCP-47 tag of a canonical language code."""
+    return LANGUAGE_TAGS.get(code, code)
+
+
+class LanguageRegistry:
+    """
+    Cache of the Language rows of a process, by canonical code.
+
+    The rows are loaded on first use (or by `warm`); languages not stored
+    yet are created with a single upsert.
+    """
+
+    def __init__(self):
+        self.languages = None
+
+    def warm(self):
+        """Load every stored language."""
+        self.languages = {language.code: language
+                          for language in Language.objects.all()}
+
+    def clear(self):
+        self.languages = None
+
+    def discard(self, code):
+        if self.languages is not None:
+            self.languages.pop(code, None)
+
+    def add(self, languages):
+        if self.languages is not None:
+            self.languages.update(
+                (language.code, language) for language in languages)
+
+    def get_many(self, tags):
+        """Return {tag: Language} for the given language tags."""
+        if self.languages is None:
+            self.warm()
+        codes = {tag: canonical_language_code(tag) for tag in tags}
+        found = {code: self.languages[code] for code in set(codes.values())
+                 if code in self.languages}
+        missing = sorted(set(codes.values()) - set(found))
+        if missing:
+            # Another worker may have created some of them meanwhile; the
+            # no-op update still returns their primary keys
+            created = Language.objects.bulk_create(
+                [Language(code=code, name=language_name(code),
+                          search_config=search_config_for(code))
+                 for code in missing],
+                update_conflicts=True, unique_fields=['code'],
+                update_fields=['code'])
+            created = {language.code: language for language in created}
+            found.update(created)
+            # Rows created in a transaction that rolls back are not cached
+            transaction.on_commit(lambda: self.add(created.values()))
+        return {tag: found[code] for tag, code in codes.items()}
+
+    def get(self, tag):
+        """Return the Language of a language tag."""
+        return self.get_many([tag])[tag]
+
+
+registry = LanguageRegistry()
+
+
+def get_language(tag):
+    """Return the Language of a language tag, creating it if needed."""
+    return registry.get(tag)
+
+
+def get_languages(tags):
+    """Return {tag: Language} for language tags, creating the missing ones."""
+    return registry.get_many(tags)
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+
+from videos.bench import summarize
+from videos.models import ProcessingJob, Subtitle
+
+# Connection handling compared, as applied to DATABASES['default']
+MODES = {
+    # A new connection per request or task: Django's default
+    'none': {'CONN_MAX_AGE': 0, 'pool': None},
+    # One connection per thread, kept across requests
+    'persistent': {'CONN_MAX_AGE': 600, 'pool': None},
+    # A psycopg 3 pool shared by the threads
+    'pool': {'CONN_MAX_AGE': 0, 'pool': {'min_size': 2, 'max_size': 10}},
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare request and task latency and throughput without "
+            "connection reuse, with persistent connections and with a "
+            "connection pool.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', default=list(MODES),
+                            choices=MODES)
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[1, 8],
+                            help='Threads making requests; each level is run in turn.')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests (or tasks) per mode and level.')
+        parser.add_argument('--video', type=int,
+                            help='Video to request; defaults to the first '
+                                 'video with subtitles.')
+        parser.add_argument('--json', dest='json_path',
+                            help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        video_id = options['video'] or Subtitle.objects.values_list(
+            'video_id', flat=True).order_by('video_id').first()
+        if video_id is None:
+            raise CommandError("No video with subtitles to request.")
+
+        workloads = {
+            # A short endpoint: one or two queries per request
+            'languages': self.request_workload(f'/api/videos/{video_id}/languages/'),
+            # A short task: connections are released after each task, as
+            # Celery's Django integration does
+            'task': self.task_workload(video_id),
+        }
+        results = {'video': video_id, 'requests': options['requests'], 'modes': {}}
+        # Serve the database, not the caches
+        with override_settings(QUERY_CACHE_TIMEOUT=0, VIDEO_LIST_CACHE_TIMEOUT=0):
+            for mode in options['modes']:
+                self.configure(MODES[mode])
+                results['modes'][mode] = {}
+                for name, workload in workloads.items():
+                    for concurrency in options['concurrency']:
+                        result = self.run(workload, options['requests'], concurrency)
+                        results['modes'][mode].setdefault(name, {})[concurrency] = result
+                        self.stdout.write(
+                            f"{mode:>10} {name:>9} x{concurrency:<3} "
+                            f"{result['throughput']:8.1f}/s  "
+                            f"p50 {result['p50'] * 1000:7.2f} ms  "
+                            f"p99 {result['p99'] * 1000:7.2f} ms  "
+                            f"{result['connections']} connections opened")
+        self.configure({'CONN_MAX_AGE': 0, 'pool': None})
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def configure(self, mode):
+        """Apply a connection mode to the default database."""
+        for connection in connections.all():
+            connection.close()
+            if getattr(connection, 'close_pool', None):
+                connection.close_pool()
+        # Shared by the connection of every thread
+        settings_dict = connections.settings['default']
+        settings_dict['CONN_MAX_AGE'] = mode['CONN_MAX_AGE']
+        settings_dict['OPTIONS'] = {
+            key: value for key, value in settings_dict['OPTIONS'].items()
+            if key != 'pool'
+        }
+        if mode['pool']:
+            settings_dict['OPTIONS']['pool'] = mode['pool']
+
+    def request_workload(self, path):
+        def workload(state):
+            client = state.setdefault('client', Client(HTTP_HOST='localhost'))
+            # The test client does not release connections around requests
+            # the way the request handler does
+            close_old_connections()
+            response = client.get(path)
+            close_old_connections()
+            if response.status_code != 200:
+                raise CommandError(f"{path} answered {response.status_code}.")
+        return workload
+
+    def task_workload(self, video_id):
+        def workload(state):
+            close_old_connections()
+            ProcessingJob.objects.filter(video_id=video_id).order_by(
+                '-created_at').first()
+            close_old_connections()
+        return workload
+
+    def run(self, workload, requests, concurrency):
+        opened = []
+        counter = iter(range(requests))
+        lock = threading.Lock()
+        durations = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection)
+
+        def worker():
+            state = {}
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        break
+                started = time.perf_counter()
+                workload(state)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    durations.append(elapsed)
+            # Persistent connections of finished threads are not reused
+            connections.close_all()
+
+        connection_created.connect(count_connection)
+        pool = connections['default'].pool
+        pool_opened = pool.get_stats().get('connections_num', 0) if pool else 0
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        connection_created.disconnect(count_connection)
+
+        result = summarize(durations)
+        result['throughput'] = len(durations) / elapsed
+        # With a pool, every checkout counts as a connection being created
+        result['connections'] = (
+            pool.get_stats().get('connections_num', 0) - pool_opened if pool
+            else len(opened))
+        return result
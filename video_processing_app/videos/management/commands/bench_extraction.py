@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.bench import generate_fixture, summarize, time_call
+from videos.tasks import (extract_pending_streams, get_subtitle_info,
+                          subtitle_output_path)
+
+EXTRACTION_MODES = ('per_stream', 'single_pass')
+
+
+class Command(BaseCommand):
+    help = ("Compare single-pass and per-stream subtitle extraction on a "
+            "generated multi-track fixture or an existing video.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--video', help='Benchmark an existing video instead of a generated fixture.')
+        parser.add_argument('--duration', type=int, default=300,
+                            help='Fixture duration in seconds.')
+        parser.add_argument('--tracks', type=int, default=10,
+                            help='Number of subtitle tracks in the fixture.')
+        parser.add_argument('--cues-per-minute', type=int, default=20)
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--json', dest='json_path',
+                            help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as workdir:
+            if options['video']:
+                video_path = options['video']
+                if not os.path.isfile(video_path):
+                    raise CommandError(f"Video not found: {video_path}")
+                streams = [
+                    (stream['index'], stream.get('tags', {}).get('language', 'x-unknown'))
+                    for stream in get_subtitle_info(video_path)
+                ]
+                # Write the VTT outputs next to a link in the scratch directory
+                link_path = os.path.join(workdir, os.path.basename(video_path))
+                os.symlink(os.path.abspath(video_path), link_path)
+                video_path = link_path
+            else:
+                video_path = os.path.join(workdir, 'fixture.mkv')
+                self.stdout.write(
+                    f"Generating {options['duration']}s fixture with {options['tracks']} subtitle tracks...")
+                streams = generate_fixture(
+                    video_path, options['duration'], options['tracks'],
+                    options['cues_per_minute'])
+
+            # Keep the first stream of each language, as the task does
+            unique_streams = {}
+            for index, language in streams:
+                unique_streams.setdefault(language, (index, language))
+            streams = list(unique_streams.values())
+
+            def remove_outputs():
+                for _, language in streams:
+                    path = subtitle_output_path(video_path, language)
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            results = {
+                'video_size': os.path.getsize(video_path),
+                'streams': len(streams),
+                'modes': {},
+            }
+            for mode in EXTRACTION_MODES:
+                durations = time_call(
+                    extract_pending_streams, video_path, streams, mode,
+                    runs=options['runs'], setup=remove_outputs)
+                results['modes'][mode] = summarize(durations)
+                self.stdout.write(
+                    f"{mode:>12}: mean {results['modes'][mode]['mean']:.3f}s "
+                    f"(min {results['modes'][mode]['min']:.3f}s, max {results['modes'][mode]['max']:.3f}s)")
+
+        speedup = (results['modes']['per_stream']['mean']
+                   / results['modes']['single_pass']['mean'])
+        results['speedup'] = speedup
+        self.stdout.write(self.style.SUCCESS(
+            f"single_pass is {speedup:.2f}x faster than per_stream for {len(streams)} streams"))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as file:
+                json.dump(results, file, indent=2)
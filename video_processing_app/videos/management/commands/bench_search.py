@@ -0,0 +1,137 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from videos.bench import (FIXTURE_LANGUAGES, FIXTURE_WORDS, fixture_cue_text,
+                          format_timestamp, summarize, time_call)
+from videos.models import Subtitle, Video
+from videos.parsers import Cue
+from videos.search import (SEARCH_MODES, match_subtitles, search_library,
+                           search_subtitles, top_hits)
+from videos.languages import get_language
+from videos.tasks import build_subtitles, insert_subtitles
+
+FIXTURE_TITLE = 'bench_search fixture'
+
+# Whole words, word prefixes/substrings and a misspelling
+SEARCH_TERMS = [
+    FIXTURE_WORDS[0], FIXTURE_WORDS[7], FIXTURE_WORDS[13], FIXTURE_WORDS[21],
+    'ango', 'whisk', 'nov', 'charly',
+]
+
+
+class Command(BaseCommand):
+    help = ("Seed synthetic subtitle rows and compare p50/p99 search latency "
+            "across the search modes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Total number of subtitle rows to seed.')
+        parser.add_argument('--videos', type=int, default=20,
+                            help='Number of videos the rows are spread over.')
+        parser.add_argument('--languages', type=int, default=3)
+        parser.add_argument('--runs', type=int, default=20,
+                            help='Queries per search term and mode.')
+        parser.add_argument('--modes', nargs='+', default=list(SEARCH_MODES),
+                            choices=SEARCH_MODES)
+        parser.add_argument('--reuse', action='store_true',
+                            help='Reuse fixture rows seeded by an earlier run.')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the fixture rows after the benchmark.')
+        parser.add_argument('--library', action='store_true',
+                            help='Also time the library-wide search: a page '
+                                 'of videos grouped by hits plus their top matches.')
+        parser.add_argument('--explain', action='store_true',
+                            help='Print the query plans of the library-wide search.')
+        parser.add_argument('--json', dest='json_path',
+                            help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        videos = list(Video.objects.filter(title=FIXTURE_TITLE))
+        if not (options['reuse'] and videos):
+            Video.objects.filter(title=FIXTURE_TITLE).delete()
+            videos = self.seed(options['rows'], options['videos'],
+                               options['languages'])
+
+        results = {'rows': options['rows'], 'modes': {}}
+        try:
+            for mode in options['modes']:
+                durations = []
+                for term in SEARCH_TERMS:
+                    for run in range(options['runs']):
+                        video = videos[run % len(videos)]
+                        durations += time_call(
+                            lambda: list(search_subtitles(
+                                video.subtitles.all(), term, mode)))
+                results['modes'][mode] = summary = summarize(durations)
+                self.stdout.write(
+                    f"{mode:>10}: p50 {summary['p50'] * 1000:8.2f} ms  "
+                    f"p99 {summary['p99'] * 1000:8.2f} ms  ({summary['runs']} queries)")
+
+            if options['library']:
+                results['library'] = {}
+                self.stdout.write("Library-wide search (20 videos, top 3 each):")
+                for mode in options['modes']:
+                    durations = []
+                    for term in SEARCH_TERMS:
+                        durations += time_call(
+                            lambda: self.search_library(term, mode),
+                            runs=options['runs'])
+                    results['library'][mode] = summary = summarize(durations)
+                    self.stdout.write(
+                        f"{mode:>10}: p50 {summary['p50'] * 1000:8.2f} ms  "
+                        f"p99 {summary['p99'] * 1000:8.2f} ms  ({summary['runs']} queries)")
+                    if options['explain']:
+                        self.explain(SEARCH_TERMS[0], mode)
+        finally:
+            if not options['keep']:
+                Video.objects.filter(title=FIXTURE_TITLE).delete()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def search_library(self, term, mode, page_size=20, top=3):
+        """Run the queries of one page of the library-wide search endpoint."""
+        subtitles = Subtitle.objects.all()
+        groups = search_library(subtitles, term, mode)[0][:page_size]
+        return top_hits(subtitles, [group['video_id'] for group in groups],
+                        term, mode, per_video=top)
+
+    def explain(self, term, mode):
+        subtitles = Subtitle.objects.all()
+        matches = match_subtitles(subtitles, term, mode).order_by().values(
+            'video_id')[:settings.LIBRARY_SEARCH_MAX_MATCHES]
+        self.stdout.write(matches.explain(analyze=True))
+        video_id = search_library(subtitles, term, mode)[0][0]['video_id']
+        ranked = search_subtitles(subtitles.filter(video_id=video_id),
+                                  term, mode, highlight=False)
+        self.stdout.write(ranked[:3].explain(analyze=True))
+
+    def seed(self, rows, video_count, language_count):
+        """Create fixture videos and spread `rows` subtitles over them."""
+        languages = [get_language(code)
+                     for code in FIXTURE_LANGUAGES[:language_count]]
+        cues_per_track = max(1, rows // (video_count * len(languages)))
+        self.stdout.write(
+            f"Seeding {cues_per_track * video_count * len(languages)} subtitle rows...")
+
+        videos = []
+        for number in range(video_count):
+            video = Video.objects.create(
+                title=FIXTURE_TITLE, video_file=f'videos/bench_{number}.mkv')
+            for track, language in enumerate(languages):
+                cues = (
+                    Cue(format_timestamp(cue * 2000),
+                        format_timestamp(cue * 2000 + 1900),
+                        fixture_cue_text(track + number, cue).replace('\n', ' '))
+                    for cue in range(cues_per_track)
+                )
+                insert_subtitles(build_subtitles(cues, video, language))
+            videos.append(video)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE videos_subtitle')
+        return videos
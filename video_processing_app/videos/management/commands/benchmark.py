@@ -0,0 +1,248 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from videos.bench import (FIXTURE_LANGUAGES, FIXTURE_WORDS, find_regressions,
+                          generate_fixture, summarize, time_call)
+from videos.languages import get_languages
+from videos.models import Subtitle, Video
+from videos.probe import probe_video
+from videos.tasks import (extract_pending_streams, insert_subtitles,
+                          parse_subtitles, subtitle_output_path)
+
+FIXTURE_TITLE = 'benchmark fixture'
+
+# Generated fixtures: duration in seconds, subtitle tracks, cues per minute
+# of each track and container
+SCENARIOS = {
+    'short': {'duration': 60, 'tracks': 2, 'cues_per_minute': 20, 'container': 'mkv'},
+    'long': {'duration': 900, 'tracks': 2, 'cues_per_minute': 20, 'container': 'mkv'},
+    'many_tracks': {'duration': 120, 'tracks': 12, 'cues_per_minute': 20, 'container': 'mkv'},
+    'dense': {'duration': 300, 'tracks': 4, 'cues_per_minute': 120, 'container': 'mkv'},
+    'mp4': {'duration': 300, 'tracks': 4, 'cues_per_minute': 20, 'container': 'mp4'},
+}
+
+STAGES = ('probe', 'extract', 'parse', 'insert')
+
+# Read endpoints, relative to /api/
+ENDPOINTS = {
+    'list': 'videos/',
+    'subtitles': 'videos/{video_id}/subtitles/',
+    'search': 'videos/{video_id}/subtitles/search/?{query}',
+    'languages': 'videos/{video_id}/languages/',
+}
+
+STATISTICS = ('min', 'mean', 'p50', 'p99')
+
+
+class Command(BaseCommand):
+    help = ("Time the stages of subtitle extraction (probe, extract, parse, "
+            "insert) and the read endpoints on generated MKV/MP4 fixtures, "
+            "write the results as JSON and compare them with a baseline run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS),
+                            choices=SCENARIOS)
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Runs of each extraction stage.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Requests to each endpoint.')
+        parser.add_argument('--fixture-dir',
+                            help='Keep the generated fixtures in this directory '
+                                 'and reuse them on later runs.')
+        parser.add_argument('--json', dest='json_path',
+                            help='Write the results to this JSON file.')
+        parser.add_argument('--baseline',
+                            help='JSON file of an earlier run to compare with; '
+                                 'the command fails when a timing regressed.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative slowdown reported as a regression '
+                                 '(0.2 = 20%%).')
+        parser.add_argument('--statistic', default='p50', choices=STATISTICS,
+                            help='Statistic compared with the baseline.')
+        parser.add_argument('--min-delta', type=float, default=1.0,
+                            help='Ignore slowdowns smaller than this many milliseconds.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        mode = settings.SUBTITLE_EXTRACTION_MODE
+        results = {
+            'environment': self.environment(),
+            'extraction_mode': mode if mode in ('single_pass', 'per_stream') else 'single_pass',
+            'runs': options['runs'],
+            'requests': options['requests'],
+            'scenarios': {},
+        }
+
+        Video.objects.filter(title=FIXTURE_TITLE).delete()
+        with tempfile.TemporaryDirectory() as workdir:
+            fixture_dir = options['fixture_dir'] or workdir
+            os.makedirs(fixture_dir, exist_ok=True)
+            try:
+                for name in options['scenarios']:
+                    results['scenarios'][name] = self.run_scenario(
+                        name, SCENARIOS[name], fixture_dir, results['extraction_mode'],
+                        options['runs'], options['requests'])
+            finally:
+                Video.objects.filter(title=FIXTURE_TITLE).delete()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+        if baseline is not None:
+            self.check_regressions(baseline, results, options)
+
+    def environment(self):
+        """Describe what the timings depend on, to tell runs apart."""
+        try:
+            revision = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            revision = None
+        ffmpeg = subprocess.run(['ffmpeg', '-version'], capture_output=True,
+                                text=True).stdout.split('\n', 1)[0]
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW server_version')
+            postgres = cursor.fetchone()[0]
+        return {
+            'revision': revision,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'ffmpeg': ffmpeg,
+            'postgres': postgres,
+        }
+
+    def run_scenario(self, name, scenario, fixture_dir, mode, runs, requests):
+        video_path = os.path.join(
+            fixture_dir,
+            f"{name}_{scenario['duration']}s_{scenario['tracks']}t_"
+            f"{scenario['cues_per_minute']}cpm.{scenario['container']}")
+        if os.path.exists(video_path):
+            streams = [(track + 1, FIXTURE_LANGUAGES[track])
+                       for track in range(scenario['tracks'])]
+        else:
+            self.stdout.write(
+                f"Generating {name}: {scenario['duration']}s, "
+                f"{scenario['tracks']} tracks, {scenario['cues_per_minute']} "
+                f"cues/min, {scenario['container'].upper()}...")
+            streams = generate_fixture(
+                video_path, scenario['duration'], scenario['tracks'],
+                scenario['cues_per_minute'], size='320x180')
+
+        result = {
+            'fixture': dict(scenario, size=os.path.getsize(video_path)),
+            'stages': {},
+            'api': {},
+        }
+        stages = result['stages']
+
+        def remove_outputs():
+            for _, language in streams:
+                path = subtitle_output_path(video_path, language)
+                if os.path.exists(path):
+                    os.remove(path)
+
+        try:
+            stages['probe'] = summarize(time_call(probe_video, video_path, runs=runs))
+            stages['extract'] = summarize(time_call(
+                extract_pending_streams, video_path, streams, mode,
+                runs=runs, setup=remove_outputs))
+
+            paths, failures = extract_pending_streams(video_path, streams, mode)
+            if failures:
+                raise CommandError(
+                    f"Extraction of {', '.join(failures)} failed for {video_path}.")
+            video = Video.objects.create(
+                title=FIXTURE_TITLE, video_file=f'videos/{os.path.basename(video_path)}',
+                probe_data=probe_video(video_path))
+            languages = get_languages(paths)
+
+            def parse():
+                return {code: list(parse_subtitles(path, video, languages[code]))
+                        for code, path in paths.items()}
+
+            stages['parse'] = summarize(time_call(parse, runs=runs))
+
+            batches = {}
+
+            def prepare_insert():
+                Subtitle.objects.filter(video=video).delete()
+                batches.update(parse())
+
+            def insert():
+                for subtitles in batches.values():
+                    insert_subtitles(subtitles)
+
+            stages['insert'] = summarize(time_call(insert, runs=runs, setup=prepare_insert))
+            result['fixture']['cues'] = sum(len(batch) for batch in batches.values())
+        finally:
+            remove_outputs()
+
+        for stage in STAGES:
+            self.write_summary(name, stage, stages[stage])
+        result['api'] = self.time_endpoints(name, video, requests)
+        return result
+
+    def time_endpoints(self, name, video, requests):
+        """Time each read endpoint on the database path, bypassing the caches."""
+        client = Client(HTTP_HOST='localhost')
+        query = urlencode({'query': FIXTURE_WORDS[video.id % len(FIXTURE_WORDS)]})
+        results = {}
+        with override_settings(QUERY_CACHE_TIMEOUT=0, VIDEO_LIST_CACHE_TIMEOUT=0):
+            for endpoint, path in ENDPOINTS.items():
+                url = '/api/' + path.format(video_id=video.id, query=query)
+
+                def request():
+                    response = client.get(url)
+                    if response.status_code != 200:
+                        raise CommandError(f"{url} answered {response.status_code}.")
+
+                request()
+                results[endpoint] = summarize(time_call(request, runs=requests))
+                self.write_summary(name, endpoint, results[endpoint])
+        return results
+
+    def write_summary(self, scenario, name, summary):
+        self.stdout.write(
+            f"{scenario:>12} {name:>10}: p50 {summary['p50'] * 1000:9.2f} ms  "
+            f"p99 {summary['p99'] * 1000:9.2f} ms  mean {summary['mean'] * 1000:9.2f} ms")
+
+    def check_regressions(self, baseline, results, options):
+        regressions = find_regressions(
+            baseline, results, options['threshold'], options['statistic'],
+            options['min_delta'] / 1000)
+        environment = dict(results['environment'], revision=None)
+        if dict(baseline.get('environment', {}), revision=None) != environment:
+            self.stdout.write(self.style.WARNING(
+                "The baseline was recorded in another environment; differences "
+                "may not come from the code."))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(
+                f"No {options['statistic']} slower than the baseline by more "
+                f"than {options['threshold']:.0%}."))
+            return
+        for path, before, after in regressions:
+            self.stdout.write(self.style.ERROR(
+                f"{' / '.join(path)}: {options['statistic']} "
+                f"{before * 1000:.2f} ms -> {after * 1000:.2f} ms "
+                f"(+{(after - before) / before:.0%})"))
+        raise CommandError(f"{len(regressions)} timings regressed.")
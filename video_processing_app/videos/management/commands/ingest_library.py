@@ -0,0 +1,145 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from videos.ingest import (Checkpoint, probe_file, register_batch, scan_library,
+                           storage_name, wait_for_capacity)
+from videos.models import ProcessingJob, Subtitle, Video
+from videos.tasks import fail_stale_jobs
+
+
+class Command(BaseCommand):
+    help = ("Register every video file under a directory of MEDIA_ROOT, probing "
+            "them in parallel and queueing subtitle extraction in throttled "
+            "batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory',
+                            help='Directory to scan; must be inside MEDIA_ROOT.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes probing files in parallel.')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Videos registered and queued per batch.')
+        parser.add_argument('--max-in-flight', type=int, default=500,
+                            help='Wait before each batch while this many '
+                                 'jobs are pending or running.')
+        parser.add_argument('--hash', action='store_true',
+                            help='Hash each file so content that is already '
+                                 'stored is registered as a duplicate.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Probe and report without registering anything.')
+        parser.add_argument('--checkpoint',
+                            help='JSON file recording the files handled so far.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the files recorded in --checkpoint.')
+        parser.add_argument('--wait', action='store_true',
+                            help='Wait for the queued extractions to finish '
+                                 'and report the cues inserted per second.')
+
+    def handle(self, *args, **options):
+        directory = os.path.realpath(options['directory'])
+        media_root = os.path.realpath(settings.MEDIA_ROOT)
+        if not os.path.isdir(directory):
+            raise CommandError(f"Not a directory: {directory}")
+        if os.path.commonpath([directory, media_root]) != media_root:
+            raise CommandError(
+                f"{directory} is not inside MEDIA_ROOT ({media_root}); move or "
+                f"link the library there first.")
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError("--resume needs --checkpoint.")
+
+        checkpoint = Checkpoint(options['checkpoint'], options['resume'])
+        prefix = storage_name(directory)
+        registered_names = set(Video.objects.filter(
+            video_file__startswith='' if prefix == '.' else f"{prefix}/"
+        ).values_list('video_file', flat=True))
+
+        paths, skipped = [], 0
+        for path in scan_library(directory):
+            if path in checkpoint or storage_name(path) in registered_names:
+                skipped += 1
+            else:
+                paths.append(path)
+        self.stdout.write(
+            f"Found {len(paths) + skipped} video files, {skipped} already handled.")
+
+        stats = {'probed': 0, 'failed': 0, 'streams': 0, 'registered': 0,
+                 'duplicates': 0, 'queued': 0}
+        video_ids = []
+        started = time.perf_counter()
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            probes = executor.map(
+                partial(probe_file, with_hash=options['hash']), paths,
+                chunksize=8)
+            while True:
+                batch = list(islice(probes, options['batch_size']))
+                if not batch:
+                    break
+                ok = self.collect(batch, stats, checkpoint, options['dry_run'])
+                if options['dry_run'] or not ok:
+                    continue
+
+                wait_for_capacity(options['max_in_flight'])
+                videos, duplicates, queued = register_batch(ok)
+                checkpoint.registered.update(probe['path'] for probe in ok)
+                checkpoint.save()
+                video_ids += [video.id for video in videos]
+                stats['registered'] += len(videos) + len(duplicates)
+                stats['duplicates'] += len(duplicates)
+                stats['queued'] += len(queued)
+                self.stdout.write(
+                    f"Registered {stats['registered']} videos, queued {stats['queued']} extractions.")
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Probed {stats['probed']} files in {elapsed:.1f}s "
+            f"({stats['probed'] / elapsed if elapsed else 0:.1f} files/s, "
+            f"{stats['streams']} subtitle streams), {stats['failed']} failed."))
+        if options['dry_run']:
+            return
+        self.stdout.write(
+            f"Registered {stats['registered']} videos "
+            f"({stats['duplicates']} duplicates), queued {stats['queued']} extractions.")
+
+        if options['wait'] and video_ids:
+            self.wait_for_extraction(video_ids, started)
+
+    def collect(self, batch, stats, checkpoint, dry_run):
+        """Report a batch of probe results and return the successful ones."""
+        ok = []
+        for probe in batch:
+            stats['probed'] += 1
+            if probe['error']:
+                stats['failed'] += 1
+                checkpoint.failed[probe['path']] = probe['error']
+                self.stderr.write(f"Could not probe {probe['path']}: {probe['error']}")
+                continue
+            stats['streams'] += len(probe['languages'])
+            ok.append(probe)
+            if dry_run:
+                languages = ', '.join(probe['languages']) or 'no subtitles'
+                self.stdout.write(f"{storage_name(probe['path'])}: {languages}")
+        if not dry_run:
+            checkpoint.save()
+        return ok
+
+    def wait_for_extraction(self, video_ids, started):
+        self.stdout.write("Waiting for the extractions to finish...")
+        jobs = ProcessingJob.objects.filter(video_id__in=video_ids)
+        while jobs.exclude(state__in=ProcessingJob.FINISHED_STATES).exists():
+            time.sleep(2)
+            fail_stale_jobs(jobs)
+        elapsed = time.perf_counter() - started
+        cues = Subtitle.objects.filter(video_id__in=video_ids).count()
+        failed = jobs.filter(state=ProcessingJob.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {cues} cues in {elapsed:.1f}s ({cues / elapsed:.1f} cues/s), "
+            f"{failed} extractions failed."))
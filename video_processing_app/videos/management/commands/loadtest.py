@@ -0,0 +1,91 @@
+import json
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.bench import run_load, summarize
+from videos.models import Subtitle
+
+# Read endpoints with an async version under /api/async/
+ENDPOINTS = {
+    'list': 'videos/',
+    'subtitles': 'videos/{video_id}/subtitles/',
+    'search': 'videos/{video_id}/subtitles/search/?{query}',
+    'languages': 'videos/{video_id}/languages/',
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare the throughput and latency of the sync read endpoints "
+            "with their async versions under concurrent requests. Start the "
+            "servers first, e.g. `gunicorn -w 4 video_processing_app.wsgi` "
+            "and `gunicorn -w 4 -k uvicorn.workers.UvicornWorker "
+            "video_processing_app.asgi`.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync-url', default='http://127.0.0.1:8000',
+                            help='Server the sync endpoints are requested from.')
+        parser.add_argument('--async-url', default='http://127.0.0.1:8001',
+                            help='Server the async endpoints are requested from.')
+        parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS),
+                            choices=ENDPOINTS)
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[1, 8, 32, 64],
+                            help='Concurrent clients; each level is run in turn.')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per endpoint, stack and level.')
+        parser.add_argument('--video', type=int,
+                            help='Video to request; defaults to the first '
+                                 'video with subtitles.')
+        parser.add_argument('--query', default='the',
+                            help='Search term of the search endpoint.')
+        parser.add_argument('--json', dest='json_path',
+                            help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        video_id = options['video'] or Subtitle.objects.values_list(
+            'video_id', flat=True).order_by('video_id').first()
+        if video_id is None:
+            raise CommandError("No video with subtitles to request.")
+        self.stdout.write(
+            "Responses are cached by the servers; run them with "
+            "QUERY_CACHE_TIMEOUT and VIDEO_LIST_CACHE_TIMEOUT set to 0 to "
+            "load the database instead.")
+
+        stacks = {
+            'sync': f"{options['sync_url'].rstrip('/')}/api/",
+            'async': f"{options['async_url'].rstrip('/')}/api/async/",
+        }
+        results = {'video': video_id, 'requests': options['requests'],
+                   'endpoints': {}}
+        for endpoint in options['endpoints']:
+            path = ENDPOINTS[endpoint].format(
+                video_id=video_id, query=urlencode({'query': options['query']}))
+            results['endpoints'][endpoint] = {}
+            self.stdout.write(f"{endpoint}: {path}")
+            for concurrency in options['concurrency']:
+                for stack, base_url in stacks.items():
+                    load = run_load(base_url + path, options['requests'],
+                                    concurrency)
+                    result = {
+                        'throughput': len(load['durations']) / load['elapsed'],
+                        'errors': load['errors'],
+                    }
+                    if load['durations']:
+                        result.update(summarize(load['durations']))
+                    results['endpoints'][endpoint].setdefault(
+                        stack, {})[concurrency] = result
+                    self.stdout.write(self.format_result(stack, concurrency, result))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def format_result(self, stack, concurrency, result):
+        line = (f"{stack:>7} x{concurrency:<4} {result['throughput']:8.1f} req/s")
+        if 'p50' in result:
+            line += (f"  p50 {result['p50'] * 1000:8.2f} ms  "
+                     f"p99 {result['p99'] * 1000:8.2f} ms")
+        if result['errors']:
+            line += f"  {result['errors']} errors"
+        return line
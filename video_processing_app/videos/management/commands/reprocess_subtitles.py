@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from videos.ingest import wait_for_capacity
+from videos.models import ProcessingJob, Video
+from videos.tasks import extract_subtitles_task, fail_stale_jobs, queue_extraction
+
+
+class Command(BaseCommand):
+    help = ("Extract the subtitles of videos again and apply only the cues "
+            "that changed, e.g. after a parser fix.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int,
+                            help='Videos to reprocess.')
+        parser.add_argument('--all', action='store_true',
+                            help='Reprocess every video that is not a duplicate.')
+        parser.add_argument('--inline', action='store_true',
+                            help='Run the extraction in this process instead '
+                                 'of queueing Celery tasks.')
+        parser.add_argument('--max-in-flight', type=int, default=500,
+                            help='Wait before queueing each video while this '
+                                 'many jobs are pending or running.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            videos = Video.objects.filter(duplicate_of__isnull=True)
+        elif options['video_ids']:
+            videos = Video.objects.filter(id__in=options['video_ids'])
+            missing = set(options['video_ids']) - set(
+                videos.values_list('id', flat=True))
+            if missing:
+                raise CommandError(
+                    f"Videos not found: {', '.join(map(str, sorted(missing)))}")
+        else:
+            raise CommandError("Give video IDs or --all.")
+
+        for video in videos.order_by('id').iterator():
+            if video.duplicate_of_id is not None:
+                self.stdout.write(
+                    f"Skipping video {video.id}: duplicate of video {video.duplicate_of_id}.")
+                continue
+
+            # Stale jobs are failed first, so they do not block the video
+            fail_stale_jobs(video.jobs.all())
+            if video.jobs.exclude(state__in=ProcessingJob.FINISHED_STATES).exists():
+                self.stdout.write(
+                    f"Skipping video {video.id}: it is already being processed.")
+                continue
+
+            if not options['inline']:
+                wait_for_capacity(options['max_in_flight'])
+                job = queue_extraction(video, reprocess=True)
+                self.stdout.write(
+                    f"Queued video {video.id} (job {job.id}).")
+                continue
+
+            job = ProcessingJob.objects.create(video=video)
+            # Fanning out would hand the streams to Celery workers
+            with override_settings(SUBTITLE_FANOUT=False):
+                extract_subtitles_task(video.id, job.id, reprocess=True)
+            job.refresh_from_db()
+            self.report(video, job)
+
+    def report(self, video, job):
+        style = self.style.SUCCESS if job.state == ProcessingJob.SUCCEEDED else self.style.ERROR
+        self.stdout.write(style(f"Video {video.id}: {job.state}"))
+        if job.error:
+            self.stdout.write(f"  {job.error}")
+        for result in job.stream_results:
+            line = f"  {result['language']}: {result['status']}"
+            if 'changes' in result:
+                line += ': ' + ', '.join(
+                    f"{count} {change}" for change, count in result['changes'].items())
+            elif result['error']:
+                line += f" ({result['error']})"
+            self.stdout.write(line)
@@ -0,0 +1,98 @@
+"""
+Prometheus metrics of the extraction pipeline and the API.
+
+Every stage of subtitle extraction (probe, extract, parse, insert) is
+recorded as a span: a histogram observation per stage and language, and a
+structured log record on the 'videos.metrics' logger. Requests are timed
+per endpoint along with the number and duration of their SQL queries (see
+videos.middleware).
+
+Web and Celery processes each hold their own metrics. Set the
+PROMETHEUS_MULTIPROC_DIR environment variable to the same empty directory
+for all of them on a host, and the scrape endpoint reports every process.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Histogram, generate_latest,
+                               multiprocess)
+
+logger = logging.getLogger(__name__)
+
+# Language label of spans covering several languages at once
+ALL_LANGUAGES = 'all'
+
+STAGE_SECONDS = Histogram(
+    'video_stage_seconds', 'Seconds spent in a stage of subtitle extraction.',
+    ['stage', 'language'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800))
+
+REQUEST_SECONDS = Histogram(
+    'api_request_seconds', 'Seconds spent answering a request.',
+    ['endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+REQUEST_QUERIES = Histogram(
+    'api_request_queries', 'SQL queries run while answering a request.',
+    ['endpoint'], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+
+REQUEST_QUERY_SECONDS = Histogram(
+    'api_request_query_seconds',
+    'Seconds spent in SQL queries while answering a request.',
+    ['endpoint'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+
+def record_stage(stage, seconds, language=ALL_LANGUAGES, **context):
+    """
+    Record time spent in a stage of subtitle extraction. `context`, e.g.
+    the video_id, is added to the log record.
+    """
+    STAGE_SECONDS.labels(stage=stage, language=language or ALL_LANGUAGES).observe(seconds)
+    logger.info(
+        f"{stage} ({language or ALL_LANGUAGES}) took {seconds:.3f}s",
+        extra={'span': {'stage': stage, 'language': language or ALL_LANGUAGES,
+                        'seconds': seconds, **context}})
+
+
+@contextmanager
+def span(stage, language=ALL_LANGUAGES, **context):
+    """Record the time spent in the block as a stage (see record_stage)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, language, **context)
+
+
+def record_request(endpoint, method, status, seconds, queries, query_seconds):
+    """Record a request answered by `endpoint` and the SQL queries it ran."""
+    REQUEST_SECONDS.labels(endpoint=endpoint, method=method,
+                           status=str(status)).observe(seconds)
+    REQUEST_QUERIES.labels(endpoint=endpoint).observe(queries)
+    REQUEST_QUERY_SECONDS.labels(endpoint=endpoint).observe(query_seconds)
+
+
+def metrics_registry():
+    """
+    Return the registry to export: the metrics of every process sharing
+    PROMETHEUS_MULTIPROC_DIR, or those of this process only.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Serve the metrics in the Prometheus text format to local scrapers."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(metrics_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
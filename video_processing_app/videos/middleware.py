@@ -0,0 +1,96 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import record_request
+
+# Recorder of the request served in the current context. Context variables
+# follow the ORM calls async views hand to sync_to_async into their thread.
+current_recorder = ContextVar('query_recorder', default=None)
+
+
+class QueryRecorder:
+    """Database execute wrapper counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper handing queries to the recorder of the current request."""
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Wrap every database connection once. Connections are per thread, so
+    wrapping them up front, rather than in the request, spares async
+    requests a hop to a thread just to install the wrapper.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Time each request and the SQL queries it runs, per endpoint (the name
+    of the URL pattern it matched).
+
+    The middleware is both sync and async capable, so under ASGI requests
+    to the async views never go through a thread for it. Queries are
+    attributed to the request whose context runs them (see record_query).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, started, recorder)
+        return response
+
+    def record(self, request, response, started, recorder):
+        match = request.resolver_match
+        record_request(
+            (match.url_name or match.view_name) if match else 'unmatched',
+            request.method, response.status_code,
+            time.perf_counter() - started, recorder.count, recorder.seconds)
@@ -0,0 +1,135 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:14
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Text search configuration of each language code as of this migration;
+# migrations must not depend on app code that may change later
+SEARCH_CONFIGS = {
+    "ar": "arabic",
+    "ara": "arabic",
+    "hy": "armenian",
+    "arm": "armenian",
+    "hye": "armenian",
+    "eu": "basque",
+    "baq": "basque",
+    "eus": "basque",
+    "ca": "catalan",
+    "cat": "catalan",
+    "da": "danish",
+    "dan": "danish",
+    "nl": "dutch",
+    "dut": "dutch",
+    "nld": "dutch",
+    "en": "english",
+    "eng": "english",
+    "fi": "finnish",
+    "fin": "finnish",
+    "fr": "french",
+    "fre": "french",
+    "fra": "french",
+    "de": "german",
+    "ger": "german",
+    "deu": "german",
+    "el": "greek",
+    "gre": "greek",
+    "ell": "greek",
+    "hi": "hindi",
+    "hin": "hindi",
+    "hu": "hungarian",
+    "hun": "hungarian",
+    "id": "indonesian",
+    "ind": "indonesian",
+    "ga": "irish",
+    "gle": "irish",
+    "it": "italian",
+    "ita": "italian",
+    "lt": "lithuanian",
+    "lit": "lithuanian",
+    "ne": "nepali",
+    "nep": "nepali",
+    "no": "norwegian",
+    "nor": "norwegian",
+    "nb": "norwegian",
+    "nob": "norwegian",
+    "nn": "norwegian",
+    "nno": "norwegian",
+    "pt": "portuguese",
+    "por": "portuguese",
+    "ro": "romanian",
+    "rum": "romanian",
+    "ron": "romanian",
+    "ru": "russian",
+    "rus": "russian",
+    "sr": "serbian",
+    "srp": "serbian",
+    "es": "spanish",
+    "spa": "spanish",
+    "sv": "swedish",
+    "swe": "swedish",
+    "ta": "tamil",
+    "tam": "tamil",
+    "tr": "turkish",
+    "tur": "turkish",
+    "yi": "yiddish",
+    "yid": "yiddish",
+}
+
+
+def search_config_for(language_code):
+    return SEARCH_CONFIGS.get(language_code.lower(), "simple")
+
+
+def set_search_configs(apps, schema_editor):
+    Language = apps.get_model("videos", "Language")
+    for language in Language.objects.all():
+        language.search_config = search_config_for(language.code)
+        language.save(update_fields=["search_config"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0003_language_subtitle_timestamp_end_and_more"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="language",
+            name="search_config",
+            field=models.CharField(default="simple", max_length=32),
+        ),
+        migrations.AddField(
+            model_name="subtitle",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.RunPython(set_search_configs, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql="""
+                UPDATE videos_subtitle AS subtitle
+                SET search_vector = to_tsvector(
+                    language.search_config::regconfig, subtitle.content)
+                FROM videos_language AS language
+                WHERE subtitle.language_id = language.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="subtitle",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="subtitle_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subtitle",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["content"],
+                name="subtitle_content_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+import math
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+# Largest value of the integer columns
+MAX_MS = 2147483647
+
+
+def timestamp_to_ms(timestamp):
+    """
+    Convert a `HH:MM:SS.mmm` or `MM:SS.mmm` timestamp to milliseconds, or
+    None. A copy of the parser as of this migration.
+    """
+    parts = timestamp.strip().replace(",", ".").split(":")
+    if not 2 <= len(parts) <= 3:
+        return None
+    try:
+        seconds = float(parts[-1])
+        minutes = int(parts[-2])
+        hours = int(parts[0]) if len(parts) == 3 else 0
+    except ValueError:
+        return None
+    if not math.isfinite(seconds) or min(seconds, minutes, hours) < 0:
+        return None
+    milliseconds = round(((hours * 60 + minutes) * 60 + seconds) * 1000)
+    return milliseconds if milliseconds <= MAX_MS else None
+
+
+def fill_milliseconds(apps, schema_editor):
+    Subtitle = apps.get_model("videos", "Subtitle")
+    subtitles = Subtitle.objects.only("id", "timestamp_start", "timestamp_end")
+    batch = []
+    for subtitle in subtitles.iterator(chunk_size=BATCH_SIZE):
+        subtitle.start_ms = timestamp_to_ms(subtitle.timestamp_start or "") or 0
+        # Cues ending before they start would be rejected by the interval
+        # index of 0006
+        subtitle.end_ms = max(
+            timestamp_to_ms(subtitle.timestamp_end or "") or 0, subtitle.start_ms
+        )
+        batch.append(subtitle)
+        if len(batch) == BATCH_SIZE:
+            Subtitle.objects.bulk_update(batch, ["start_ms", "end_ms"])
+            batch = []
+    Subtitle.objects.bulk_update(batch, ["start_ms", "end_ms"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0004_subtitle_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subtitle",
+            name="start_ms",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="subtitle",
+            name="end_ms",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(fill_milliseconds, migrations.RunPython.noop),
+        # The same start time written in different formats used to create
+        # separate rows; keep the first one
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM videos_subtitle AS duplicate
+                USING videos_subtitle AS original
+                WHERE duplicate.video_id = original.video_id
+                  AND duplicate.language_id = original.language_id
+                  AND duplicate.start_ms = original.start_ms
+                  AND duplicate.id > original.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0005_subtitle_start_ms_end_ms"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AlterField(
+            model_name="subtitle",
+            name="start_ms",
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="subtitle",
+            name="end_ms",
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="subtitle",
+            unique_together={("video", "language", "start_ms")},
+        ),
+        migrations.AddIndex(
+            model_name="subtitle",
+            index=django.contrib.postgres.indexes.GistIndex(
+                models.F("video"),
+                models.Func(
+                    models.F("start_ms"),
+                    models.F("end_ms"),
+                    function="int4range",
+                    output_field=django.contrib.postgres.fields.ranges.IntegerRangeField(),
+                ),
+                name="subtitle_interval_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0007_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="duplicates",
+                to="videos.video",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="video",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("duplicate_of__isnull", True)),
+                fields=("content_hash",),
+                name="unique_video_content_hash",
+            ),
+        ),
+    ]
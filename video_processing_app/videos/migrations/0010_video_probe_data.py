@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0009_processingjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="probe_data",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="probe_key",
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
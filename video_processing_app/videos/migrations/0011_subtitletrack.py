@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0010_video_probe_data"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubtitleTrack",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("vtt_file", models.FileField(upload_to="subtitle_tracks/")),
+                ("etag", models.CharField(max_length=64)),
+                ("size", models.PositiveIntegerField()),
+                ("cue_count", models.PositiveIntegerField()),
+                ("generated_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "language",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="videos.language",
+                    ),
+                ),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="subtitle_tracks",
+                        to="videos.video",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("video", "language")},
+            },
+        ),
+    ]
@@ -0,0 +1,367 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+# Language tables and helpers as of this migration; migrations must not
+# depend on app code that may change later
+UNKNOWN = "x-unknown"
+
+# ISO 639-1 code, ISO 639-2/B code, ISO 639-2/T code when it differs, name
+ISO_639 = """
+aa aar - Afar
+ab abk - Abkhazian
+ae ave - Avestan
+af afr - Afrikaans
+ak aka - Akan
+am amh - Amharic
+an arg - Aragonese
+ar ara - Arabic
+as asm - Assamese
+av ava - Avaric
+ay aym - Aymara
+az aze - Azerbaijani
+ba bak - Bashkir
+be bel - Belarusian
+bg bul - Bulgarian
+bh bih - Bihari
+bi bis - Bislama
+bm bam - Bambara
+bn ben - Bengali
+bo tib bod Tibetan
+br bre - Breton
+bs bos - Bosnian
+ca cat - Catalan
+ce che - Chechen
+ch cha - Chamorro
+co cos - Corsican
+cr cre - Cree
+cs cze ces Czech
+cu chu - Church Slavic
+cv chv - Chuvash
+cy wel cym Welsh
+da dan - Danish
+de ger deu German
+dv div - Divehi
+dz dzo - Dzongkha
+ee ewe - Ewe
+el gre ell Greek
+en eng - English
+eo epo - Esperanto
+es spa - Spanish
+et est - Estonian
+eu baq eus Basque
+fa per fas Persian
+ff ful - Fulah
+fi fin - Finnish
+fj fij - Fijian
+fo fao - Faroese
+fr fre fra French
+fy fry - Western Frisian
+ga gle - Irish
+gd gla - Scottish Gaelic
+gl glg - Galician
+gn grn - Guarani
+gu guj - Gujarati
+gv glv - Manx
+ha hau - Hausa
+he heb - Hebrew
+hi hin - Hindi
+ho hmo - Hiri Motu
+hr hrv - Croatian
+ht hat - Haitian
+hu hun - Hungarian
+hy arm hye Armenian
+hz her - Herero
+ia ina - Interlingua
+id ind - Indonesian
+ie ile - Interlingue
+ig ibo - Igbo
+ii iii - Sichuan Yi
+ik ipk - Inupiaq
+io ido - Ido
+is ice isl Icelandic
+it ita - Italian
+iu iku - Inuktitut
+ja jpn - Japanese
+jv jav - Javanese
+ka geo kat Georgian
+kg kon - Kongo
+ki kik - Kikuyu
+kj kua - Kuanyama
+kk kaz - Kazakh
+kl kal - Kalaallisut
+km khm - Khmer
+kn kan - Kannada
+ko kor - Korean
+kr kau - Kanuri
+ks kas - Kashmiri
+ku kur - Kurdish
+kv kom - Komi
+kw cor - Cornish
+ky kir - Kyrgyz
+la lat - Latin
+lb ltz - Luxembourgish
+lg lug - Ganda
+li lim - Limburgish
+ln lin - Lingala
+lo lao - Lao
+lt lit - Lithuanian
+lu lub - Luba-Katanga
+lv lav - Latvian
+mg mlg - Malagasy
+mh mah - Marshallese
+mi mao mri Maori
+mk mac mkd Macedonian
+ml mal - Malayalam
+mn mon - Mongolian
+mr mar - Marathi
+ms may msa Malay
+mt mlt - Maltese
+my bur mya Burmese
+na nau - Nauru
+nb nob - Norwegian Bokmål
+nd nde - North Ndebele
+ne nep - Nepali
+ng ndo - Ndonga
+nl dut nld Dutch
+nn nno - Norwegian Nynorsk
+no nor - Norwegian
+nr nbl - South Ndebele
+nv nav - Navajo
+ny nya - Chichewa
+oc oci - Occitan
+oj oji - Ojibwa
+om orm - Oromo
+or ori - Odia
+os oss - Ossetian
+pa pan - Punjabi
+pi pli - Pali
+pl pol - Polish
+ps pus - Pashto
+pt por - Portuguese
+qu que - Quechua
+rm roh - Romansh
+rn run - Rundi
+ro rum ron Romanian
+ru rus - Russian
+rw kin - Kinyarwanda
+sa san - Sanskrit
+sc srd - Sardinian
+sd snd - Sindhi
+se sme - Northern Sami
+sg sag - Sango
+si sin - Sinhala
+sk slo slk Slovak
+sl slv - Slovenian
+sm smo - Samoan
+sn sna - Shona
+so som - Somali
+sq alb sqi Albanian
+sr srp - Serbian
+ss ssw - Swati
+st sot - Southern Sotho
+su sun - Sundanese
+sv swe - Swedish
+sw swa - Swahili
+ta tam - Tamil
+te tel - Telugu
+tg tgk - Tajik
+th tha - Thai
+ti tir - Tigrinya
+tk tuk - Turkmen
+tl tgl - Tagalog
+tn tsn - Tswana
+to ton - Tongan
+tr tur - Turkish
+ts tso - Tsonga
+tt tat - Tatar
+tw twi - Twi
+ty tah - Tahitian
+ug uig - Uyghur
+uk ukr - Ukrainian
+ur urd - Urdu
+uz uzb - Uzbek
+ve ven - Venda
+vi vie - Vietnamese
+vo vol - Volapük
+wa wln - Walloon
+wo wol - Wolof
+xh xho - Xhosa
+yi yid - Yiddish
+yo yor - Yoruba
+za zha - Zhuang
+zh chi zho Chinese
+zu zul - Zulu
+- fil - Filipino
+- haw - Hawaiian
+- yue - Cantonese
+- mul - Multiple languages
+- zxx - No linguistic content
+"""
+
+LANGUAGE_NAMES = {UNKNOWN: "Unknown"}
+LANGUAGE_ALIASES = {
+    "und": UNKNOWN,
+    "iw": "heb",
+    "in": "ind",
+    "ji": "yid",
+    "mo": "rum",
+    "cmn": "chi",
+}
+for line in ISO_639.strip().splitlines():
+    part1, part2b, part2t, name = line.split(maxsplit=3)
+    LANGUAGE_NAMES[part2b] = name
+    for alias in (part1, part2b, part2t):
+        if alias != "-":
+            LANGUAGE_ALIASES[alias] = part2b
+
+# Text search configuration of each language code
+SEARCH_CONFIGS = {
+    "ar": "arabic",
+    "ara": "arabic",
+    "hy": "armenian",
+    "arm": "armenian",
+    "hye": "armenian",
+    "eu": "basque",
+    "baq": "basque",
+    "eus": "basque",
+    "ca": "catalan",
+    "cat": "catalan",
+    "da": "danish",
+    "dan": "danish",
+    "nl": "dutch",
+    "dut": "dutch",
+    "nld": "dutch",
+    "en": "english",
+    "eng": "english",
+    "fi": "finnish",
+    "fin": "finnish",
+    "fr": "french",
+    "fre": "french",
+    "fra": "french",
+    "de": "german",
+    "ger": "german",
+    "deu": "german",
+    "el": "greek",
+    "gre": "greek",
+    "ell": "greek",
+    "hi": "hindi",
+    "hin": "hindi",
+    "hu": "hungarian",
+    "hun": "hungarian",
+    "id": "indonesian",
+    "ind": "indonesian",
+    "ga": "irish",
+    "gle": "irish",
+    "it": "italian",
+    "ita": "italian",
+    "lt": "lithuanian",
+    "lit": "lithuanian",
+    "ne": "nepali",
+    "nep": "nepali",
+    "no": "norwegian",
+    "nor": "norwegian",
+    "nb": "norwegian",
+    "nob": "norwegian",
+    "nn": "norwegian",
+    "nno": "norwegian",
+    "pt": "portuguese",
+    "por": "portuguese",
+    "ro": "romanian",
+    "rum": "romanian",
+    "ron": "romanian",
+    "ru": "russian",
+    "rus": "russian",
+    "sr": "serbian",
+    "srp": "serbian",
+    "es": "spanish",
+    "spa": "spanish",
+    "sv": "swedish",
+    "swe": "swedish",
+    "ta": "tamil",
+    "tam": "tamil",
+    "tr": "turkish",
+    "tur": "turkish",
+    "yi": "yiddish",
+    "yid": "yiddish",
+}
+
+
+def search_config_for(language_code):
+    return SEARCH_CONFIGS.get(language_code.lower(), "simple")
+
+
+def canonical_language_code(tag):
+    tag = (tag or "").strip().lower().replace("_", "-")
+    if not tag or tag == UNKNOWN:
+        return UNKNOWN
+    primary = tag.split("-")[0]
+    return LANGUAGE_ALIASES.get(primary, primary or tag)[:10]
+
+
+def language_name(code):
+    return LANGUAGE_NAMES.get(code, "")
+
+
+def merge_language_aliases(apps, schema_editor):
+    """
+    Merge the languages stored under alias codes (e.g. 'en' and 'eng') into
+    one language with the canonical code, and fill in missing names.
+    """
+    Language = apps.get_model("videos", "Language")
+    Subtitle = apps.get_model("videos", "Subtitle")
+    SubtitleTrack = apps.get_model("videos", "SubtitleTrack")
+
+    groups = {}
+    for language in Language.objects.order_by("id"):
+        groups.setdefault(canonical_language_code(language.code), []).append(language)
+
+    for code, languages in groups.items():
+        # Keep the language already using the canonical code, or the oldest
+        keeper = next(
+            (language for language in languages if language.code == code),
+            languages[0],
+        )
+        aliases = [language for language in languages if language != keeper]
+        if aliases:
+            # Tracks are rebuilt from the merged subtitles on their next request
+            for track in SubtitleTrack.objects.filter(language__in=languages):
+                track.vtt_file.delete(save=False)
+                track.delete()
+        for alias in aliases:
+            # Cues the keeper already has at the same time are duplicates
+            Subtitle.objects.filter(language=alias).filter(
+                Exists(
+                    Subtitle.objects.filter(
+                        language=keeper,
+                        video_id=OuterRef("video_id"),
+                        start_ms=OuterRef("start_ms"),
+                    )
+                )
+            ).delete()
+            Subtitle.objects.filter(language=alias).update(language=keeper)
+            alias.delete()
+
+        search_config = search_config_for(code)
+        reindex = search_config != keeper.search_config
+        keeper.code = code
+        keeper.name = keeper.name or language_name(code)
+        keeper.search_config = search_config
+        keeper.save()
+        if reindex:
+            Subtitle.objects.filter(language=keeper).update(
+                search_vector=SearchVector("content", config=search_config)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0011_subtitletrack"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_language_aliases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0012_merge_language_aliases"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoPreview",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("probe_key", models.CharField(max_length=100)),
+                ("interval", models.PositiveIntegerField()),
+                ("tile_width", models.PositiveSmallIntegerField()),
+                ("tile_height", models.PositiveSmallIntegerField()),
+                ("columns", models.PositiveSmallIntegerField()),
+                ("rows", models.PositiveSmallIntegerField()),
+                ("thumbnail_count", models.PositiveIntegerField()),
+                ("sprites", models.JSONField(default=list)),
+                ("track_file", models.FileField(upload_to="previews/")),
+                ("keyframes", models.JSONField(default=list)),
+                ("generated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "video",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="preview",
+                        to="videos.video",
+                    ),
+                ),
+            ],
+        ),
+    ]
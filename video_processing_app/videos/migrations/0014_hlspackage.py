@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0013_videopreview"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HlsPackage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("probe_key", models.CharField(max_length=100)),
+                ("directory", models.CharField(max_length=255)),
+                ("transcoded", models.BooleanField(default=False)),
+                ("duration", models.FloatField()),
+                ("segment_count", models.PositiveIntegerField()),
+                ("size", models.PositiveBigIntegerField()),
+                ("bandwidth", models.PositiveIntegerField()),
+                ("average_bandwidth", models.PositiveIntegerField()),
+                ("packaged_at", models.DateTimeField(auto_now=True)),
+                (
+                    "video",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hls_package",
+                        to="videos.video",
+                    ),
+                ),
+            ],
+        ),
+    ]
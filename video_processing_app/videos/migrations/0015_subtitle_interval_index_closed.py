@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:38
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0014_hlspackage"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="subtitle",
+            name="subtitle_interval_idx",
+        ),
+        migrations.AddIndex(
+            model_name="subtitle",
+            index=django.contrib.postgres.indexes.GistIndex(
+                models.F("video"),
+                models.Func(
+                    models.F("start_ms"),
+                    models.F("end_ms"),
+                    models.Value("[]"),
+                    function="int4range",
+                    output_field=django.contrib.postgres.fields.ranges.IntegerRangeField(),
+                ),
+                name="subtitle_interval_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,14 @@
+import bisect
+import time
+import uuid
+from contextlib import contextmanager
 
+from django.contrib.postgres.fields import IntegerRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F, Func, Value
+from django.utils import timezone
 
 
 class Language(models.Model):
@@ -7,6 +16,8 @@ class Language(models.Model):
     code = models.CharField(max_length=10, unique=True)
     # Human-readable language name (e.g., 'English', 'Spanish')
     name = models.CharField(max_length=50)
+    # PostgreSQL text search configuration used for this language's subtitles
+    search_config = models.CharField(max_length=32, default='simple')
 
     def __str__(self):
         return self.name
@@ -16,11 +27,165 @@ class Video(models.Model):
     title = models.CharField(max_length=255)
     video_file = models.FileField(upload_to='videos/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # SHA-256 of the file content, computed while the upload is written
+    content_hash = models.CharField(
+        max_length=64, null=True, blank=True, editable=False)
+    # Earlier upload of the same content whose media file this video shares
+    duplicate_of = models.ForeignKey(
+        'self', null=True, blank=True, editable=False,
+        on_delete=models.PROTECT, related_name='duplicates')
+    # Stream metadata from ffprobe (see videos/probe.py), and the identity
+    # of the file it was read from: "size:mtime_ns:content_hash"
+    probe_data = models.JSONField(null=True, blank=True, editable=False)
+    probe_key = models.CharField(max_length=100, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            # Only one stored copy per content; duplicates point to it
+            models.UniqueConstraint(
+                fields=['content_hash'],
+                condition=models.Q(duplicate_of__isnull=True),
+                name='unique_video_content_hash'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class ProcessingJob(models.Model):
+    """A run of the subtitle extraction pipeline for a video."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    FINISHED_STATES = (SUCCEEDED, FAILED)
+
+    video = models.ForeignKey(
+        Video, on_delete=models.CASCADE, related_name='jobs')
+    state = models.CharField(
+        max_length=16, choices=STATE_CHOICES, default=PENDING)
+    # Pipeline stage currently running (probe, extract, parse, insert)
+    stage = models.CharField(max_length=16, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Seconds spent in each stage, e.g. {"probe": 0.4, "extract": 12.1}
+    stage_timings = models.JSONField(default=dict, blank=True)
+    # Outcome of each subtitle stream:
+    # [{"index": 2, "language": "eng", "status": "succeeded", "cues": 812, "error": ""}]
+    stream_results = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['video', '-created_at'],
+                         name='job_video_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Processing job {self.id} for {self.video_id}: {self.state}"
+
+    def as_dict(self):
+        """JSON-serializable snapshot of the job, as published to clients."""
+        return {
+            'id': self.id,
+            'video_id': self.video_id,
+            'state': self.state,
+            'stage': self.stage,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'stage_timings': self.stage_timings,
+            'stream_results': self.stream_results,
+            'error': self.error,
+        }
+
+    def update(self, **fields):
+        """Set and save the given fields, then notify listeners."""
+        from .events import publish_job
+
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.save()
+        publish_job(self)
+
+    def start(self):
+        self.update(state=self.RUNNING, started_at=timezone.now(),
+                    finished_at=None, error='')
+
+    def finish(self, error=''):
+        """
+        Mark the job as finished. It fails on `error`, or when streams were
+        extracted and all of them failed; skipped streams do not count.
+        """
+        statuses = {result['status'] for result in self.stream_results}
+        failed = bool(error) or ('failed' in statuses and 'succeeded' not in statuses)
+        self.update(state=self.FAILED if failed else self.SUCCEEDED,
+                    stage='', finished_at=timezone.now(), error=error)
+
+    def add_timing(self, stage, seconds):
+        """Add time spent in a stage; saved with the next update."""
+        self.stage_timings[stage] = self.stage_timings.get(stage, 0) + seconds
+
+    @contextmanager
+    def stage_timer(self, stage):
+        """Mark `stage` as running and record the time spent in it."""
+        self.update(stage=stage)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_timing(stage, time.perf_counter() - started)
+
+    def record_stream(self, index, language, status, cues=0, error='',
+                      changes=None):
+        """
+        Record the outcome of one subtitle stream. `changes` counts the cues
+        inserted, updated, deleted and left unchanged when the stream was
+        diffed against stored subtitles.
+        """
+        result = {
+            'index': index, 'language': language, 'status': status,
+            'cues': cues, 'error': error,
+        }
+        if changes is not None:
+            result['changes'] = changes
+        self.stream_results.append(result)
+        self.update()
+
+
+class UploadSession(models.Model):
+    """A chunked, resumable video upload in progress."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    title = models.CharField(max_length=255)
+    # Original file name, used for the stored video
+    filename = models.CharField(max_length=255)
+    # Total size of the file in bytes
+    size = models.PositiveBigIntegerField()
+    # Number of bytes received and acknowledged so far
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Video created when the upload is finalized
+    video = models.OneToOneField(
+        Video, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='upload_session')
+
+    @property
+    def partial_name(self):
+        """Storage name of the file the chunks are appended to."""
+        return f'uploads/{self.id}.part'
+
+    def __str__(self):
+        return f"Upload of {self.filename} ({self.offset}/{self.size} bytes)"
+
+
 class Subtitle(models.Model):
     video = models.ForeignKey(
         Video, on_delete=models.CASCADE, related_name='subtitles')
@@ -30,9 +195,130 @@ class Subtitle(models.Model):
     timestamp_start = models.CharField(max_length=15, null=True)
     # End timestamp (format: HH:MM:SS)
     timestamp_end = models.CharField(max_length=15, null=True)
+    # Start and end of the cue in milliseconds, used for sorting and range
+    # queries
+    start_ms = models.PositiveIntegerField()
+    end_ms = models.PositiveIntegerField()
+    # Full-text search document, built with the language's search config
+    search_vector = SearchVectorField(null=True)
 
     class Meta:
-        unique_together = ('video', 'language', 'timestamp_start')
+        # Also serves as the (video, language, start_ms) lookup index
+        unique_together = ('video', 'language', 'start_ms')
+        indexes = [
+            # Closed ranges: a '[)' range of an instant cue would be empty
+            # and overlap nothing
+            GistIndex(F('video'), Func(F('start_ms'), F('end_ms'), Value('[]'),
+                                       function='int4range',
+                                       output_field=IntegerRangeField()),
+                      name='subtitle_interval_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='subtitle_search_vector_idx'),
+            GinIndex(fields=['content'], opclasses=['gin_trgm_ops'],
+                     name='subtitle_content_trgm_idx'),
+        ]
 
     def __str__(self):
         return f"{self.language.code} Subtitle for {self.video.title} from {self.timestamp_start} to {self.timestamp_end}"
+
+
+class SubtitleTrack(models.Model):
+    """
+    WebVTT rendering of the subtitles of one language of a video, generated
+    on first request and deleted whenever those subtitles change.
+    """
+    video = models.ForeignKey(
+        Video, on_delete=models.CASCADE, related_name='subtitle_tracks')
+    language = models.ForeignKey(Language, on_delete=models.CASCADE)
+    vtt_file = models.FileField(upload_to='subtitle_tracks/')
+    # SHA-256 of the file content
+    etag = models.CharField(max_length=64)
+    size = models.PositiveIntegerField()
+    cue_count = models.PositiveIntegerField()
+    generated_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('video', 'language')
+
+    def __str__(self):
+        return f"{self.language.code} track of {self.video_id}"
+
+
+class VideoPreview(models.Model):
+    """
+    Thumbnail sprite sheets, WebVTT thumbnail track and keyframe index of a
+    video (see videos/previews.py). Duplicates use the preview of the video
+    they share their file with.
+    """
+    video = models.OneToOneField(
+        Video, on_delete=models.CASCADE, related_name='preview')
+    # Identity of the file the preview was generated from (see Video.probe_key)
+    probe_key = models.CharField(max_length=100)
+    # Seconds between thumbnails
+    interval = models.PositiveIntegerField()
+    # Size of a thumbnail in pixels, and thumbnails per row and column of a
+    # sprite sheet
+    tile_width = models.PositiveSmallIntegerField()
+    tile_height = models.PositiveSmallIntegerField()
+    columns = models.PositiveSmallIntegerField()
+    rows = models.PositiveSmallIntegerField()
+    thumbnail_count = models.PositiveIntegerField()
+    # Storage names of the sprite sheets, in order
+    sprites = models.JSONField(default=list)
+    track_file = models.FileField(upload_to='previews/')
+    # Presentation times of the keyframes in milliseconds, ascending
+    keyframes = models.JSONField(default=list)
+    generated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Preview of {self.video_id}"
+
+    def tile_at(self, ms):
+        """
+        Return the sprite index and (x, y) position of the thumbnail shown
+        at `ms`, or None if the preview has no thumbnails.
+        """
+        if not self.thumbnail_count:
+            return None
+        index = min(ms // (self.interval * 1000), self.thumbnail_count - 1)
+        sprite, position = divmod(index, self.columns * self.rows)
+        row, column = divmod(position, self.columns)
+        return sprite, column * self.tile_width, row * self.tile_height
+
+    def keyframe_at(self, ms):
+        """Return the last keyframe at or before `ms`, in milliseconds."""
+        position = bisect.bisect_right(self.keyframes, ms)
+        return self.keyframes[position - 1] if position else None
+
+
+class HlsPackage(models.Model):
+    """
+    HLS rendition of a video: a media playlist and its fMP4 segments, in a
+    storage directory of their own (see videos/hls.py). Duplicates use the
+    package of the video they share their file with.
+    """
+    video = models.OneToOneField(
+        Video, on_delete=models.CASCADE, related_name='hls_package')
+    # Identity of the file the package was made from (see Video.probe_key)
+    probe_key = models.CharField(max_length=100)
+    # Storage directory of the playlist, init segment and media segments;
+    # each packaging gets a new one, so its files never change
+    directory = models.CharField(max_length=255)
+    # Whether the streams had to be re-encoded rather than copied
+    transcoded = models.BooleanField(default=False)
+    # Seconds of media, and number and total size in bytes of the segments
+    duration = models.FloatField()
+    segment_count = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()
+    # Peak and average bits per second of the segments
+    bandwidth = models.PositiveIntegerField()
+    average_bandwidth = models.PositiveIntegerField()
+    packaged_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"HLS package of {self.video_id}"
+
+    @property
+    def version(self):
+        """Last part of the directory, used in the URLs of the files."""
+        return self.directory.rsplit('/', 1)[-1]
@@ -0,0 +1,154 @@
+import base64
+import binascii
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class SubtitleKeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination of a video's subtitles ordered by language and
+    start time.
+
+    The cursor encodes the (language_id, start_ms) of the last subtitle of the
+    page, which is unique per video, so every page is a single index range
+    scan no matter how deep it is.
+    """
+    page_size = 500
+    max_page_size = 5000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('language_id', 'start_ms')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_results(
+            list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """Async version of `paginate_queryset`, for the async views."""
+        return self.paginate_results(
+            [subtitle async for subtitle in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """Return the queryset of the requested page, plus one subtitle."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            language_id, start_ms = position
+            queryset = queryset.filter(
+                Q(language_id__gt=language_id) |
+                Q(language_id=language_id, start_ms__gt=start_ms)
+            )
+        return queryset[:self.page_size + 1]
+
+    def paginate_results(self, results):
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            self.next_position = (results[-1].language_id, results[-1].start_ms)
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            language_id, start_ms = (int(value) for value in decoded.split(':'))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound("Invalid cursor.")
+        return language_id, start_ms
+
+    def encode_cursor(self, position):
+        cursor = base64.urlsafe_b64encode(
+            f"{position[0]}:{position[1]}".encode('ascii')).decode('ascii')
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination that can also paginate through the async ORM,
+    for the async views.
+    """
+
+    async def apaginate_queryset(self, queryset, request):
+        """Async version of `paginate_queryset`."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Counted here, so the paginator never queries synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+
+        bottom = (number - 1) * page_size
+        objects = [obj async for obj in queryset[bottom:bottom + page_size]]
+        self.page = Page(objects, number, paginator)
+        self.request = request
+        return objects
+
+
+class VideoListPagination(AsyncPageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class LibrarySearchPagination(PageNumberPagination):
+    """Pages of videos matching a library-wide subtitle search."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SubtitleSearchPagination(AsyncPageNumberPagination):
+    """
+    Pages of the subtitles of a video matching a search. Results are only
+    paginated when a `page_size` is requested.
+    """
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 500
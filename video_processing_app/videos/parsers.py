@@ -0,0 +1,226 @@
+"""
+Streaming subtitle parsers.
+
+Parsers consume an iterable of text lines (an open file, a pipe, ...) and
+yield cues one at a time, so memory use does not depend on the file length.
+WebVTT is what ffmpeg extracts embedded streams to; SubRip and ASS/SSA
+are parsed as uploaded (see videos/sidecars.py).
+"""
+import html
+import math
+import re
+from collections import namedtuple
+
+# A single subtitle cue: timestamps as written in the source, plain text
+# joined into one line
+Cue = namedtuple('Cue', ['start', 'end', 'text'])
+
+# WebVTT blocks that carry no cues and are skipped up to the next blank line
+VTT_SKIPPED_BLOCKS = ('NOTE', 'STYLE', 'REGION')
+
+# Formatting tags of WebVTT and SubRip cue text: <i>, <c.yellow>, <v Bob>,
+# <00:01.500> timestamps, <font color="...">, {\an8}...
+CUE_TAG_RE = re.compile(r'</?[a-zA-Z][^>]*>|<\d[^>]*>|\{\\[^}]*\}')
+
+# Fields of a Dialogue line of an ASS script without a Format line
+ASS_DEFAULT_FORMAT = ['layer', 'start', 'end', 'style', 'name', 'marginl',
+                      'marginr', 'marginv', 'effect', 'text']
+# Override blocks of ASS text, e.g. {\i1} or {\pos(10,20)}
+ASS_OVERRIDE_RE = re.compile(r'\{[^}]*\}')
+# Override tag switching to drawing mode: the text is a vector shape
+ASS_DRAWING_RE = re.compile(r'\\p[1-9]')
+
+# Largest timestamp stored: start_ms and end_ms are PostgreSQL integers
+MAX_TIMESTAMP_MS = 2147483647
+
+
+def parse_vtt_timing(line):
+    """
+    Parse a WebVTT timing line such as
+    `00:01.000 --> 00:04.000 align:start position:10%`.
+    Returns (start, end) with any cue settings dropped.
+    """
+    start, _, rest = line.partition('-->')
+    end = rest.split(None, 1)[0] if rest.strip() else ''
+    return start.strip(), end
+
+
+def strip_cue_tags(line):
+    """Return a line of WebVTT or SubRip cue text without formatting tags."""
+    return CUE_TAG_RE.sub('', line).strip()
+
+
+def iter_vtt_cues(lines):
+    """
+    Yield a `Cue` for every non-empty cue in a WebVTT document.
+
+    Handles the WEBVTT header, NOTE/STYLE/REGION blocks, cue identifiers,
+    cue settings and multi-line cue payloads (joined with spaces). As in
+    SubRip files, formatting tags are dropped; character references such
+    as `&amp;` are decoded.
+    """
+    timing = None
+    text_lines = []
+    skipping = False
+    block_start = True
+
+    for line in lines:
+        line = line.rstrip('\r\n').lstrip('\ufeff')
+
+        if not line.strip():
+            if timing is not None:
+                text = ' '.join(text_lines).strip()
+                if text:
+                    yield Cue(timing[0], timing[1], text)
+            timing, text_lines = None, []
+            skipping = False
+            block_start = True
+            continue
+
+        if skipping:
+            continue
+
+        if block_start:
+            block_start = False
+            keyword = line.split(None, 1)[0]
+            if keyword in VTT_SKIPPED_BLOCKS or keyword == 'WEBVTT':
+                skipping = True
+                continue
+
+        if timing is None:
+            # Lines before the timing line are cue identifiers
+            if '-->' in line:
+                timing = parse_vtt_timing(line)
+        else:
+            text = html.unescape(strip_cue_tags(line))
+            if text:
+                text_lines.append(text)
+
+    if timing is not None:
+        text = ' '.join(text_lines).strip()
+        if text:
+            yield Cue(timing[0], timing[1], text)
+
+
+def iter_srt_cues(lines):
+    """
+    Yield a `Cue` for every non-empty cue in a SubRip document.
+
+    Cue numbers are optional, formatting tags are dropped and multi-line
+    cue payloads are joined with spaces.
+    """
+    timing = None
+    text_lines = []
+
+    for line in lines:
+        line = line.rstrip('\r\n').lstrip('\ufeff')
+
+        if not line.strip():
+            if timing is not None:
+                text = ' '.join(text_lines).strip()
+                if text:
+                    yield Cue(timing[0], timing[1], text)
+            timing, text_lines = None, []
+            continue
+
+        if timing is None:
+            # Lines before the timing line are cue numbers
+            if '-->' in line:
+                timing = parse_vtt_timing(line)
+        else:
+            text = strip_cue_tags(line)
+            if text:
+                text_lines.append(text)
+
+    if timing is not None:
+        text = ' '.join(text_lines).strip()
+        if text:
+            yield Cue(timing[0], timing[1], text)
+
+
+def ass_dialogue_text(text):
+    """
+    Return the plain text of an ASS dialogue: override blocks dropped, line
+    breaks and hard spaces turned into spaces. Returns '' for drawings.
+    """
+    if any(ASS_DRAWING_RE.search(block) for block in ASS_OVERRIDE_RE.findall(text)):
+        return ''
+    text = ASS_OVERRIDE_RE.sub('', text)
+    for escape in ('\\N', '\\n', '\\h'):
+        text = text.replace(escape, ' ')
+    return ' '.join(text.split())
+
+
+def iter_ass_cues(lines):
+    """
+    Yield a `Cue` for every Dialogue line of the [Events] section of an
+    ASS or SSA script, fields located by its Format line.
+
+    Consecutive dialogues with the same timing, e.g. two speakers shown
+    at once, are joined into one cue.
+    """
+    in_events = False
+    fields = ASS_DEFAULT_FORMAT
+    pending = None
+
+    for line in lines:
+        line = line.strip().lstrip('\ufeff')
+        if line.startswith('['):
+            in_events = line.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+
+        key, separator, value = line.partition(':')
+        key = key.strip().lower()
+        if not separator:
+            continue
+        if key == 'format':
+            fields = [field.strip().lower() for field in value.split(',')]
+            continue
+        if key != 'dialogue':
+            continue
+
+        # The text is the last field and may itself contain commas
+        values = value.lstrip().split(',', len(fields) - 1)
+        if len(values) != len(fields):
+            continue
+        event = dict(zip(fields, values))
+        text = ass_dialogue_text(event.get('text', ''))
+        if not text:
+            continue
+        cue = Cue(event.get('start', '').strip(), event.get('end', '').strip(), text)
+        if pending is not None and pending[:2] == cue[:2]:
+            pending = pending._replace(text=f'{pending.text} {cue.text}')
+            continue
+        if pending is not None:
+            yield pending
+        pending = cue
+
+    if pending is not None:
+        yield pending
+
+
+def timestamp_to_ms(timestamp):
+    """
+    Convert a `HH:MM:SS.mmm` or `MM:SS.mmm` timestamp (',' is accepted as
+    the decimal separator) to integer milliseconds.
+    Returns None if the timestamp cannot be parsed, or is beyond what the
+    integer columns storing it hold.
+    """
+    parts = timestamp.strip().replace(',', '.').split(':')
+    if not 2 <= len(parts) <= 3:
+        return None
+    try:
+        seconds = float(parts[-1])
+        minutes = int(parts[-2])
+        hours = int(parts[0]) if len(parts) == 3 else 0
+    except ValueError:
+        return None
+    # float() also parses 'nan' and 'inf'
+    if not math.isfinite(seconds) or min(seconds, minutes, hours) < 0:
+        return None
+    milliseconds = round(((hours * 60 + minutes) * 60 + seconds) * 1000)
+    if milliseconds > MAX_TIMESTAMP_MS:
+        return None
+    return milliseconds
@@ -0,0 +1,211 @@
+"""
+Thumbnail previews and keyframe index of videos.
+
+A single sequential ffmpeg pass decodes only the keyframes of a video. Their
+timestamps form the keyframe index, and a thumbnail is taken from them every
+PREVIEW_INTERVAL seconds, scaled down and packed into sprite sheets. A
+WebVTT thumbnail track maps each interval to its tile, so players preview
+frames while scrubbing and search results point at a thumbnail and the
+keyframe to seek to, without running ffmpeg per request.
+"""
+import os
+import re
+import subprocess
+import tempfile
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .cache import invalidate_video_queries
+from .metrics import span
+from .models import Video, VideoPreview
+from .probe import file_probe_key
+from .tracks import format_vtt_timestamp
+
+# Frames logged by the showinfo filters of the ffmpeg pass
+SHOWINFO_RE = re.compile(
+    r'^\[showinfo@(keyframes|thumbnails) @ [^\]]+\] n:\s*\d+ .*?pts_time:(\S+)')
+
+
+def preview_filters(interval, tile_width, tile_height, columns, rows):
+    """
+    Return the filter chain of the preview pass: log the keyframes, take a
+    frame every `interval` seconds, letterbox it into a tile, log it and
+    pack the tiles into sheets.
+    """
+    return ','.join([
+        'showinfo@keyframes',
+        f'fps=1/{interval}',
+        f'scale={tile_width}:{tile_height}:force_original_aspect_ratio=decrease',
+        f'pad={tile_width}:{tile_height}:(ow-iw)/2:(oh-ih)/2',
+        'showinfo@thumbnails',
+        f'tile={columns}x{rows}',
+    ])
+
+
+def extract_preview(video_path, output_dir, interval, tile_width, tile_height,
+                    columns, rows):
+    """
+    Decode the keyframes of a video once, writing its sprite sheets to
+    `output_dir` as sprite_001.jpg, sprite_002.jpg...
+
+    Returns a tuple (keyframes, thumbnail_count, sprite_paths) with the
+    keyframe times in milliseconds. Raises CalledProcessError if ffmpeg
+    fails.
+    """
+    ffmpeg_cmd = [
+        'ffmpeg', '-hide_banner', '-nostats', '-v', 'info', '-y',
+        '-skip_frame', 'nokey', '-i', video_path, '-map', '0:v:0',
+        '-vf', preview_filters(interval, tile_width, tile_height, columns, rows),
+        '-q:v', '4', os.path.join(output_dir, 'sprite_%03d.jpg'),
+    ]
+    process = subprocess.Popen(
+        ffmpeg_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True, encoding='utf-8', errors='replace'
+    )
+    # Only the last lines of the log are kept for the error message
+    keyframes, thumbnail_count, errors = [], 0, deque(maxlen=20)
+    try:
+        # The frames are logged on stderr as they are decoded
+        for line in process.stderr:
+            match = SHOWINFO_RE.match(line)
+            if match is None:
+                errors.append(line)
+            elif match[1] == 'keyframes':
+                keyframes.append(round(float(match[2]) * 1000))
+            else:
+                thumbnail_count += 1
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, ffmpeg_cmd, stderr=''.join(errors))
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stderr.close()
+
+    sprite_paths = sorted(
+        os.path.join(output_dir, name) for name in os.listdir(output_dir)
+        if name.startswith('sprite_'))
+    return sorted(set(keyframes)), thumbnail_count, sprite_paths
+
+
+def render_thumbnail_track(preview, duration_ms=None):
+    """
+    Render the WebVTT thumbnail track of a preview: each interval points at
+    its tile with a media fragment, e.g. /media/.../sprite_001.jpg#xywh=160,0,160,90.
+    """
+    parts = ['WEBVTT\n']
+    step = preview.interval * 1000
+    for index in range(preview.thumbnail_count):
+        start = index * step
+        end = start + step
+        if duration_ms is not None and index == preview.thumbnail_count - 1:
+            end = max(start + 1, duration_ms)
+        sprite, x, y = preview.tile_at(start)
+        parts.append(
+            f"\n{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}\n"
+            f"{default_storage.url(preview.sprites[sprite])}"
+            f"#xywh={x},{y},{preview.tile_width},{preview.tile_height}\n")
+    return ''.join(parts)
+
+
+def preview_settings():
+    """Return the interval, tile size and sheet layout previews are made with."""
+    tile_width, tile_height = settings.PREVIEW_TILE_SIZE
+    columns, rows = settings.PREVIEW_SPRITE_GRID
+    return {'interval': settings.PREVIEW_INTERVAL, 'tile_width': tile_width,
+            'tile_height': tile_height, 'columns': columns, 'rows': rows}
+
+
+def generate_preview(video, force=False):
+    """
+    Generate the preview of a video, unless one was already made from the
+    file as it is now with the current settings and `force` is not set.
+    Returns the preview.
+    """
+    video_path = video.video_file.path
+    probe_key = file_probe_key(video_path, video.content_hash)
+    layout = preview_settings()
+    preview = VideoPreview.objects.filter(video=video).first()
+    if (preview is not None and not force and preview.probe_key == probe_key
+            and all(getattr(preview, name) == value for name, value in layout.items())):
+        return preview
+
+    with tempfile.TemporaryDirectory() as output_dir, span('preview', video_id=video.id):
+        keyframes, thumbnail_count, sprite_paths = extract_preview(
+            video_path, output_dir, **layout)
+
+        # Every generation gets its own directory, so files still served
+        # from an older preview are never overwritten
+        directory = f'{video.id}/{uuid.uuid4().hex[:12]}'
+        sprites = []
+        for sprite_path in sprite_paths:
+            with open(sprite_path, 'rb') as file:
+                sprites.append(default_storage.save(
+                    f'previews/{directory}/{os.path.basename(sprite_path)}',
+                    File(file)))
+
+    old_files = [] if preview is None else [preview.track_file.name, *preview.sprites]
+    preview = preview or VideoPreview(video=video)
+    for name, value in layout.items():
+        setattr(preview, name, value)
+    preview.probe_key = probe_key
+    preview.keyframes = keyframes
+    preview.thumbnail_count = thumbnail_count
+    preview.sprites = sprites
+
+    duration = (video.probe_data or {}).get('duration')
+    track = render_thumbnail_track(
+        preview, round(duration * 1000) if duration else None)
+    preview.track_file.save(f'{directory}/thumbnails.vtt',
+                            ContentFile(track.encode('utf-8')), save=False)
+    preview.save()
+    delete_preview_files(old_files)
+    # Search results of the video and its duplicates point at the new tiles
+    for video_id in [video.id, *video.duplicates.values_list('id', flat=True)]:
+        invalidate_video_queries(video_id)
+    return preview
+
+
+def delete_preview_files(names):
+    """Remove stored preview files, ignoring the ones already gone."""
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+def get_previews(video_ids):
+    """
+    Return {video_id: VideoPreview} for the videos that have a preview,
+    directly or through the video they duplicate.
+    """
+    originals = dict(Video.objects.filter(
+        id__in=video_ids).values_list('id', 'duplicate_of_id'))
+    previews = {preview.video_id: preview for preview in VideoPreview.objects.filter(
+        video_id__in={original or video_id for video_id, original in originals.items()})}
+    return {video_id: previews[original or video_id]
+            for video_id, original in originals.items()
+            if (original or video_id) in previews}
+
+
+def describe_tile(preview, ms, request=None):
+    """
+    Describe the thumbnail shown at `ms` and the keyframe to seek to, as
+    included in search results. Returns None without a preview.
+    """
+    tile = preview.tile_at(ms) if preview is not None else None
+    if tile is None:
+        return None
+    sprite, x, y = tile
+    url = default_storage.url(preview.sprites[sprite])
+    return {
+        'sprite': request.build_absolute_uri(url) if request else url,
+        'x': x, 'y': y,
+        'width': preview.tile_width, 'height': preview.tile_height,
+        'keyframe_ms': preview.keyframe_at(ms),
+    }
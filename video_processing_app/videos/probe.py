@@ -0,0 +1,94 @@
+"""
+Stream metadata of video files.
+
+ffprobe is run once per video and its result is stored on the video with
+the identity of the file it describes: its size, modification time and
+content hash. The stored metadata is reused until the file changes, so
+reprocessing, retries and the metadata endpoints never probe again.
+"""
+import json
+import os
+import subprocess
+
+from .cache import invalidate_video_queries
+from .metrics import span
+from .models import Video
+
+# Image-based subtitle codecs (Blu-ray PGS, DVB, DVD VobSub, DivX XSUB):
+# their cues are pictures, which ffmpeg cannot convert to text
+BITMAP_SUBTITLE_CODECS = {'hdmv_pgs_subtitle', 'dvb_subtitle', 'dvd_subtitle', 'xsub'}
+
+
+def probe_video(video_path):
+    """
+    Probe every stream of a video with ffprobe.
+
+    Returns a dict with the 'duration' in seconds (None when unknown) and
+    the 'streams', each with its 'index', 'codec_type', 'codec_name',
+    'language', 'title' and 'default' and 'forced' dispositions.
+    """
+    ffprobe_cmd = [
+        'ffprobe', '-v', 'error', '-show_streams', '-show_format',
+        '-of', 'json', video_path
+    ]
+    with span('probe'):
+        result = subprocess.run(
+            ffprobe_cmd, capture_output=True, text=True, check=True
+        )
+    data = json.loads(result.stdout)
+
+    streams = []
+    for stream in data.get('streams', []):
+        tags = stream.get('tags', {})
+        disposition = stream.get('disposition', {})
+        streams.append({
+            'index': stream['index'],
+            'codec_type': stream.get('codec_type'),
+            'codec_name': stream.get('codec_name'),
+            'language': tags.get('language'),
+            'title': tags.get('title'),
+            'default': bool(disposition.get('default')),
+            'forced': bool(disposition.get('forced')),
+        })
+
+    duration = data.get('format', {}).get('duration')
+    return {
+        'duration': float(duration) if duration else None,
+        'streams': streams,
+    }
+
+
+def file_probe_key(video_path, content_hash=None):
+    """
+    Return the key identifying the file a probe describes, built from its
+    size, modification time and content hash.
+    """
+    stat = os.stat(video_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{content_hash or ''}"
+
+
+def get_probe_data(video, refresh=False):
+    """
+    Return the stream metadata of a video, probing its file only when no
+    metadata is stored for the file as it is now, or when `refresh` is set.
+    """
+    video_path = video.video_file.path
+    probe_key = file_probe_key(video_path, video.content_hash)
+    if refresh or video.probe_data is None or video.probe_key != probe_key:
+        video.probe_data = probe_video(video_path)
+        video.probe_key = probe_key
+        Video.objects.filter(id=video.id).update(
+            probe_data=video.probe_data, probe_key=probe_key)
+        invalidate_video_queries(video.id)
+    return video.probe_data
+
+
+def subtitle_streams(probe_data):
+    """Return the subtitle streams of stored metadata."""
+    return [stream for stream in probe_data['streams']
+            if stream['codec_type'] == 'subtitle']
+
+
+def is_bitmap_subtitle(stream):
+    """Return whether a subtitle stream holds pictures rather than text."""
+    return stream['codec_name'] in BITMAP_SUBTITLE_CODECS
@@ -0,0 +1,41 @@
+"""
+Sampled cProfile profiles of Celery tasks.
+
+TASK_PROFILE_RATES maps task names to the fraction of their runs to
+profile, e.g. {'videos.tasks.extract_subtitles_task': 0.1}. The profile of
+each sampled run is written to TASK_PROFILE_DIR as
+<task name>-<task id>.prof, to be read with pstats or snakeviz.
+"""
+import cProfile
+import logging
+import os
+import random
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Profilers of the tasks running in this process, by task ID
+profilers = {}
+
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, **kwargs):
+    rate = settings.TASK_PROFILE_RATES.get(task.name, 0)
+    if rate and random.random() < rate:
+        profiler = cProfile.Profile()
+        profilers[task_id] = profiler
+        profiler.enable()
+
+
+@task_postrun.connect
+def save_task_profile(task_id=None, task=None, **kwargs):
+    profiler = profilers.pop(task_id, None)
+    if profiler is None:
+        return
+    profiler.disable()
+    os.makedirs(settings.TASK_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.TASK_PROFILE_DIR, f"{task.name}-{task_id}.prof")
+    profiler.dump_stats(path)
+    logger.info(f"Saved the profile of task {task.name} {task_id} to {path}.")
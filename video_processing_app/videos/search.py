@@ -0,0 +1,229 @@
+"""
+Subtitle search backends.
+
+Subtitles store a `tsvector` built with their language's PostgreSQL text
+search configuration (GIN indexed), and `content` carries a `pg_trgm` GIN
+index that serves substring and fuzzy matches. The available modes are:
+
+- 'fulltext': stemmed word search on the stored tsvector, ranked.
+- 'trigram': substring and fuzzy word matches through the trigram index.
+- 'auto': union of 'fulltext' and substring matches, ranked by text rank.
+- 'icontains': plain case-insensitive substring match, the fallback that
+  relies on no PostgreSQL specific feature.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery,
+                                            SearchRank, SearchVector,
+                                            TrigramWordSimilarity)
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Language, Subtitle
+
+SEARCH_MODES = ('auto', 'fulltext', 'trigram', 'icontains')
+
+# Built-in PostgreSQL text search configurations by ISO 639-1 / 639-2 code.
+# Languages without a stemmer (e.g. Japanese) use the 'simple' configuration.
+SEARCH_CONFIGS = {
+    'ar': 'arabic', 'ara': 'arabic',
+    'hy': 'armenian', 'arm': 'armenian', 'hye': 'armenian',
+    'eu': 'basque', 'baq': 'basque', 'eus': 'basque',
+    'ca': 'catalan', 'cat': 'catalan',
+    'da': 'danish', 'dan': 'danish',
+    'nl': 'dutch', 'dut': 'dutch', 'nld': 'dutch',
+    'en': 'english', 'eng': 'english',
+    'fi': 'finnish', 'fin': 'finnish',
+    'fr': 'french', 'fre': 'french', 'fra': 'french',
+    'de': 'german', 'ger': 'german', 'deu': 'german',
+    'el': 'greek', 'gre': 'greek', 'ell': 'greek',
+    'hi': 'hindi', 'hin': 'hindi',
+    'hu': 'hungarian', 'hun': 'hungarian',
+    'id': 'indonesian', 'ind': 'indonesian',
+    'ga': 'irish', 'gle': 'irish',
+    'it': 'italian', 'ita': 'italian',
+    'lt': 'lithuanian', 'lit': 'lithuanian',
+    'ne': 'nepali', 'nep': 'nepali',
+    'no': 'norwegian', 'nor': 'norwegian',
+    'nb': 'norwegian', 'nob': 'norwegian',
+    'nn': 'norwegian', 'nno': 'norwegian',
+    'pt': 'portuguese', 'por': 'portuguese',
+    'ro': 'romanian', 'rum': 'romanian', 'ron': 'romanian',
+    'ru': 'russian', 'rus': 'russian',
+    'sr': 'serbian', 'srp': 'serbian',
+    'es': 'spanish', 'spa': 'spanish',
+    'sv': 'swedish', 'swe': 'swedish',
+    'ta': 'tamil', 'tam': 'tamil',
+    'tr': 'turkish', 'tur': 'turkish',
+    'yi': 'yiddish', 'yid': 'yiddish',
+}
+
+HEADLINE_OPTIONS = {
+    'start_sel': '<mark>',
+    'stop_sel': '</mark>',
+    'highlight_all': True,
+}
+
+
+def search_config_for(language_code):
+    """Return the text search configuration for a language code."""
+    return SEARCH_CONFIGS.get(language_code.lower(), 'simple')
+
+
+def subtitle_search_vector(content, language):
+    """Return the expression that builds the stored tsvector of a subtitle."""
+    return SearchVector(Value(content), config=language.search_config)
+
+
+def language_ids_by_config(languages=None):
+    """Map each text search configuration in use to its language IDs."""
+    configs = {}
+    languages = Language.objects.all() if languages is None else languages
+    for language_id, config in languages.values_list('id', 'search_config'):
+        configs.setdefault(config, []).append(language_id)
+    return configs
+
+
+def fulltext_filter(term, languages=None):
+    """
+    Build a filter matching `term` against the stored tsvectors.
+
+    The query is parsed once per text search configuration in use, so every
+    branch compares against a constant tsquery and can use the GIN index.
+    """
+    condition = Q(pk__in=[])
+    for config, language_ids in language_ids_by_config(languages).items():
+        condition |= Q(
+            language_id__in=language_ids,
+            search_vector=SearchQuery(
+                term, config=config, search_type='websearch'),
+        )
+    return condition
+
+
+def fulltext_rank(term, languages=None):
+    """
+    Build the rank of the stored tsvectors against `term`. As in
+    `fulltext_filter`, the query is parsed once per configuration rather
+    than once per row.
+    """
+    return Case(
+        *[When(language_id__in=language_ids,
+               then=SearchRank(F('search_vector'), SearchQuery(
+                   term, config=config, search_type='websearch')))
+          for config, language_ids in language_ids_by_config(languages).items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def match_subtitles(queryset, term, mode=None, languages=None):
+    """Filter a Subtitle queryset by a search term, without ranking it."""
+    mode = mode or settings.SUBTITLE_SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+
+    if mode == 'icontains':
+        return queryset.filter(content__icontains=term)
+
+    if mode == 'trigram':
+        return queryset.filter(
+            Q(content__icontains=term) | Q(content__trigram_word_similar=term))
+
+    condition = fulltext_filter(term, languages)
+    if mode == 'auto':
+        condition |= Q(content__icontains=term)
+    return queryset.filter(condition)
+
+
+def search_subtitles(queryset, term, mode=None, languages=None, highlight=True):
+    """
+    Filter a Subtitle queryset by a search term using the given mode.
+
+    Matches are annotated with `rank` (higher is better) and, for modes
+    using the tsvector and unless `highlight` is false, a highlighted
+    `snippet`, and ordered by rank.
+    """
+    mode = mode or settings.SUBTITLE_SEARCH_MODE
+    matches = match_subtitles(queryset, term, mode, languages)
+
+    if mode == 'icontains':
+        return matches.order_by('id')
+
+    if mode == 'trigram':
+        return matches.annotate(
+            rank=TrigramWordSimilarity(term, 'content'),
+        ).order_by('-rank', 'id')
+
+    matches = matches.annotate(rank=fulltext_rank(term, languages))
+    if highlight:
+        # Highlight with each row's own configuration; this only runs over
+        # the matched rows
+        query = SearchQuery(term, config=F('language__search_config'),
+                            search_type='websearch')
+        matches = matches.annotate(
+            snippet=SearchHeadline('content', query,
+                                   config=F('language__search_config'),
+                                   **HEADLINE_OPTIONS))
+    return matches.order_by('-rank', 'id')
+
+
+def search_library(subtitles, term, mode=None, languages=None, max_matches=None):
+    """
+    Search a Subtitle queryset spanning many videos and group the matches
+    by video.
+
+    Only the first `max_matches` matches found (LIBRARY_SEARCH_MAX_MATCHES
+    by default) are counted, so the cost of the facet is bounded whatever
+    the size of the library. Returns a tuple (groups, capped): a list of
+    dicts with the 'video_id' and its number of 'hits', most hits first,
+    and whether the cap was reached, in which case the hits are lower
+    bounds and videos with few matches may be missing.
+    """
+    max_matches = max_matches or settings.LIBRARY_SEARCH_MAX_MATCHES
+    matches = match_subtitles(subtitles, term, mode, languages).order_by().values(
+        'video_id')[:max_matches]
+    sql, params = matches.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT video_id, COUNT(*) AS hits FROM ({sql}) AS matches '
+            'GROUP BY video_id ORDER BY hits DESC, video_id DESC', params)
+        groups = [{'video_id': video_id, 'hits': hits}
+                  for video_id, hits in cursor.fetchall()]
+    return groups, sum(group['hits'] for group in groups) >= max_matches
+
+
+def top_hits(subtitles, video_ids, term, mode=None, languages=None, per_video=3):
+    """
+    Return the `per_video` best matches of each of the given videos, as a
+    dict of ranked and highlighted Subtitle lists keyed by video ID.
+
+    The best matches of each video are picked by a LATERAL subquery with a
+    LIMIT, so the rows of a video stop being read once its best matches
+    are known where an index allows it; only the picked rows are
+    highlighted.
+    """
+    if not video_ids:
+        return {}
+    ranked = search_subtitles(
+        subtitles.filter(video_id=RawSQL('page.video_id', [])),
+        term, mode, languages, highlight=False)
+    # Without a rank, the earliest matches come first
+    order = [F('start_ms').asc()]
+    if 'rank' in ranked.query.annotations:
+        order.insert(0, F('rank').desc())
+    best = ranked.order_by(*order).values('id')[:per_video]
+    sql, params = best.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT best.id FROM unnest(%s::bigint[]) AS page(video_id) '
+            f'CROSS JOIN LATERAL ({sql}) AS best', [list(video_ids), *params])
+        best_ids = [row[0] for row in cursor.fetchall()]
+
+    hits = search_subtitles(
+        Subtitle.objects.filter(id__in=best_ids).select_related('language'),
+        term, mode, languages)
+    grouped = {video_id: [] for video_id in video_ids}
+    for hit in hits.order_by('video_id', *order):
+        grouped[hit.video_id].append(hit)
+    return grouped
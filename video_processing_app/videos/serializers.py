@@ -1,5 +1,10 @@
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Video, Subtitle, Language
+from .models import (Video, Subtitle, Language, UploadSession, ProcessingJob,
+                     VideoPreview)
+from .previews import describe_tile
+from .uploads import VIDEO_EXTENSIONS, is_supported_video
 
 
 class LanguageSerializer(serializers.ModelSerializer):
@@ -8,13 +13,51 @@ class LanguageSerializer(serializers.ModelSerializer):
         fields = ['id', 'code', 'name']
 
 
-class SubtitleSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer that takes an additional `fields` argument restricting
+    the serialized fields to the given names.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class SubtitleSerializer(DynamicFieldsModelSerializer):
     language = LanguageSerializer()  # Nested serializer for language
 
     class Meta:
         model = Subtitle
         fields = ['id', 'language', 'content', 'video_id',
-                  'timestamp_start', 'timestamp_end']
+                  'timestamp_start', 'timestamp_end', 'start_ms', 'end_ms']
+
+
+class SubtitleSearchSerializer(SubtitleSerializer):
+    # Relevance and highlighted content, when the search mode provides them
+    rank = serializers.SerializerMethodField()
+    snippet = serializers.SerializerMethodField()
+    # Thumbnail at the start of the cue and keyframe to seek to, when the
+    # video has a preview; previews are passed in the `previews` context
+    # entry, by video ID
+    preview = serializers.SerializerMethodField()
+
+    class Meta(SubtitleSerializer.Meta):
+        fields = SubtitleSerializer.Meta.fields + ['rank', 'snippet', 'preview']
+
+    def get_rank(self, obj):
+        return getattr(obj, 'rank', None)
+
+    def get_snippet(self, obj):
+        return getattr(obj, 'snippet', None)
+
+    def get_preview(self, obj):
+        return describe_tile(self.context.get('previews', {}).get(obj.video_id),
+                             obj.start_ms, self.context.get('request'))
 
 
 class VideoSerializer(serializers.ModelSerializer):
@@ -24,3 +67,106 @@ class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
         fields = ['id', 'title', 'video_file', 'uploaded_at', 'subtitles']
+
+
+class VideoSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight video representation for listings: no nested subtitles,
+    only the number of cues per language.
+    Expects the queryset to be annotated with `status`, to select the HLS
+    packages of the videos and their originals, and the per-language counts
+    to be passed in the `subtitle_counts` context entry.
+    `stream_url` is the HLS master playlist of packaged videos, else null.
+    """
+    subtitle_counts = serializers.SerializerMethodField()
+    status = serializers.CharField(read_only=True)
+    stream_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Video
+        fields = ['id', 'title', 'video_file', 'uploaded_at',
+                  'subtitle_counts', 'status', 'stream_url']
+
+    def get_subtitle_counts(self, obj):
+        return self.context.get('subtitle_counts', {}).get(obj.id, {})
+
+    def get_stream_url(self, obj):
+        # Duplicates are played from the package of their original
+        original = obj.duplicate_of or obj
+        if getattr(original, 'hls_package', None) is None:
+            return None
+        url = reverse('hls-master', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'title', 'filename', 'size', 'offset', 'video',
+                  'created_at', 'updated_at']
+        read_only_fields = ['offset', 'video']
+
+    def validate_filename(self, value):
+        if not is_supported_video(value):
+            raise serializers.ValidationError(
+                f"Unsupported file type. Allowed: {', '.join(VIDEO_EXTENSIONS)}.")
+        return value
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("File size must be positive.")
+        return value
+
+
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProcessingJob
+        fields = ['id', 'video_id', 'state', 'stage', 'created_at',
+                  'started_at', 'finished_at', 'stage_timings',
+                  'stream_results', 'error']
+
+
+class SearchVideoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Video
+        fields = ['id', 'title', 'video_file', 'uploaded_at']
+
+
+class LibrarySearchResultSerializer(serializers.Serializer):
+    """A video matching a library-wide search, with its best matches."""
+    video = SearchVideoSerializer()
+    hits = serializers.IntegerField()
+    top = SubtitleSearchSerializer(many=True)
+
+
+class VideoPreviewSerializer(serializers.ModelSerializer):
+    """
+    Thumbnail track, sprite sheets and keyframe index of a video. With a
+    `tile` context entry, also the thumbnail and keyframe at a given time.
+    """
+    thumbnails = serializers.SerializerMethodField()
+    sprites = serializers.SerializerMethodField()
+    tile = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoPreview
+        fields = ['video_id', 'interval', 'tile_width', 'tile_height',
+                  'columns', 'rows', 'thumbnail_count', 'thumbnails',
+                  'sprites', 'keyframes', 'tile', 'generated_at']
+
+    def absolute_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_thumbnails(self, obj):
+        return self.absolute_url(obj.track_file.name)
+
+    def get_sprites(self, obj):
+        return [self.absolute_url(name) for name in obj.sprites]
+
+    def get_tile(self, obj):
+        if 'tile' not in self.context:
+            return None
+        return describe_tile(obj, self.context['tile'], self.context.get('request'))
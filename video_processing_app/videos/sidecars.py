@@ -0,0 +1,97 @@
+"""
+Subtitle files uploaded next to a video ("sidecars").
+
+SubRip (.srt), ASS/SSA (.ass, .ssa) and WebVTT (.vtt) files are stored,
+then parsed by a Celery task with the streaming parser of their format
+(see videos/parsers.py) into the subtitles of one language of the video,
+like an extracted stream. The file is read line by line, so its size does
+not matter, and deleted once imported.
+
+Files are decoded as UTF-8 (or UTF-16 with a byte order mark). Files that
+are not valid UTF-8 are read as SIDECAR_FALLBACK_ENCODING, the usual
+encoding of older SubRip files.
+"""
+import codecs
+import io
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .languages import canonical_language_code, language_name
+from .parsers import iter_ass_cues, iter_srt_cues, iter_vtt_cues
+
+# Parser of each supported file extension
+SIDECAR_PARSERS = {
+    '.srt': iter_srt_cues,
+    '.ass': iter_ass_cues,
+    '.ssa': iter_ass_cues,
+    '.vtt': iter_vtt_cues,
+}
+
+# Size of the blocks read while checking the encoding of a file
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def sidecar_extension(filename):
+    """Return the lowercased extension of a supported file name, or None."""
+    extension = os.path.splitext(filename)[1].lower()
+    return extension if extension in SIDECAR_PARSERS else None
+
+
+def guess_sidecar_language(filename):
+    """
+    Return the canonical language code in a file name such as
+    `movie.en.srt` or `movie.pt-BR.ass`, or None.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    _, separator, tag = stem.rpartition('.')
+    if not separator:
+        return None
+    code = canonical_language_code(tag)
+    return code if language_name(code) else None
+
+
+def detect_encoding(file):
+    """
+    Return the encoding of an open binary file: UTF-8 or UTF-16 when it
+    starts with a byte order mark, UTF-8 when it decodes as such, else
+    SIDECAR_FALLBACK_ENCODING. The file is rewound.
+    """
+    head = file.read(4)
+    file.seek(0)
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for block in iter(lambda: file.read(READ_BLOCK_SIZE), b''):
+            decoder.decode(block)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return settings.SIDECAR_FALLBACK_ENCODING
+    finally:
+        file.seek(0)
+    return 'utf-8'
+
+
+def iter_sidecar_cues(name):
+    """
+    Yield the cues of a stored subtitle file, parsed according to its
+    extension. The file is closed once the cues are consumed.
+    """
+    parser = SIDECAR_PARSERS[sidecar_extension(name)]
+    with default_storage.open(name, 'rb') as file:
+        lines = io.TextIOWrapper(file, encoding=detect_encoding(file),
+                                 errors='replace')
+        yield from parser(lines)
+
+
+def save_sidecar(video, uploaded_file):
+    """Store an uploaded subtitle file until it is imported. Returns its name."""
+    extension = sidecar_extension(uploaded_file.name)
+    return default_storage.save(
+        f'sidecars/{video.id}/{uuid.uuid4().hex[:12]}{extension}', uploaded_file)
@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import (invalidate_video_list, invalidate_video_queries,
+                    subtitle_track_cache_key)
+from .languages import registry
+from .hls import delete_package_files
+from .models import (HlsPackage, Language, ProcessingJob, SubtitleTrack,
+                     Video, VideoPreview)
+from .previews import delete_preview_files
+
+
+@receiver([post_save, post_delete], sender=Video)
+@receiver([post_save, post_delete], sender=ProcessingJob)
+def invalidate_cached_video_list(sender, **kwargs):
+    """
+    Drop the cached video list when a video or its processing status
+    change. Subtitles are only written in bulk, and their writers
+    invalidate the list once (see videos/tasks.py): any delete receiver on
+    Subtitle would also make Django load and delete cascaded subtitles one
+    by one instead of with a single query.
+    """
+    invalidate_video_list()
+
+
+@receiver(post_delete, sender=Video)
+def invalidate_cached_video_queries(sender, instance, **kwargs):
+    """
+    Drop the cached searches and language lookups of a deleted video. Bulk
+    writes of subtitles invalidate them themselves.
+    """
+    invalidate_video_queries(instance.pk)
+
+
+@receiver(post_delete, sender=SubtitleTrack)
+def delete_subtitle_track_file(sender, instance, **kwargs):
+    """Remove the file and cached metadata of a deleted WebVTT track."""
+    cache.delete(subtitle_track_cache_key(instance.video_id, instance.language.code))
+    instance.vtt_file.delete(save=False)
+
+
+@receiver(post_delete, sender=VideoPreview)
+def delete_video_preview_files(sender, instance, **kwargs):
+    """Remove the sprite sheets and thumbnail track of a deleted preview."""
+    delete_preview_files([instance.track_file.name, *instance.sprites])
+
+
+@receiver(post_delete, sender=HlsPackage)
+def delete_hls_package_files(sender, instance, **kwargs):
+    """Remove the playlist and segments of a deleted HLS package."""
+    delete_package_files(instance.directory)
+
+
+@receiver([post_save, post_delete], sender=Language)
+def refresh_language_registry(sender, instance, **kwargs):
+    """Reload an edited or deleted language in this process' registry."""
+    registry.discard(instance.code)
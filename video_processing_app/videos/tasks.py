@@ -2,137 +2,888 @@ import subprocess
 import json
 import logging
 import os
-from celery import shared_task
-from .models import Video, Subtitle, Language
+import tempfile
+import time
+from datetime import timedelta
+from itertools import islice
+from celery import chord, shared_task
+from celery.signals import worker_process_init
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import Video, Subtitle, Language, ProcessingJob
+from .cache import invalidate_video_list, invalidate_video_queries
+from .hls import package_video
+from .languages import canonical_language_code, get_languages, registry
+from .metrics import record_stage, span
+from .parsers import iter_vtt_cues, timestamp_to_ms
+from .previews import generate_preview
+from .probe import (BITMAP_SUBTITLE_CODECS, get_probe_data, is_bitmap_subtitle,
+                    subtitle_streams)
+from .search import subtitle_search_vector
+from .sidecars import iter_sidecar_cues
+from .tracks import format_vtt_timestamp, invalidate_subtitle_tracks
+from .uploads import deduplicate_video
 
 logger = logging.getLogger(__name__)
 
-# Updated mapping of language codes to their names
-LANGUAGE_NAMES = {
-    'en': 'English',
-    'ru': 'Russian',
-    'ja': 'Japanese',
-    'x-unknown': 'Unknown',  # For undetermined languages
-    # Add more languages as needed
-}
-
-
-def get_language(language_code):
-    """Retrieve or create a Language instance with a populated name."""
-    language_name = LANGUAGE_NAMES.get(language_code, '')
-    language, created = Language.objects.get_or_create(
-        code=language_code,
-        defaults={'name': language_name}
-    )
-
-    # Update name if it was empty
-    if created or not language.name:
-        language.name = language_name
-        language.save()
 
-    return language
+@worker_process_init.connect
+def warm_language_registry(**kwargs):
+    """Load the languages once in every worker process, before any task."""
+    registry.warm()
 
 
 def get_subtitle_info(video_path):
-    """Retrieve subtitle stream information using ffprobe."""
+    """
+    Retrieve the text subtitle streams of a video using ffprobe. Bitmap
+    streams are left out, as they cannot be extracted to VTT.
+    """
     ffprobe_cmd = [
         'ffprobe', '-v', 'error', '-select_streams', 's',
-        '-show_entries', 'stream=index,codec_type:stream_tags=language',
+        '-show_entries', 'stream=index,codec_type,codec_name:stream_tags=language',
         '-of', 'json', video_path
     ]
     result = subprocess.run(
         ffprobe_cmd, capture_output=True, text=True, check=True
     )
-    return json.loads(result.stdout)['streams']
+    return [stream for stream in json.loads(result.stdout)['streams']
+            if stream.get('codec_name') not in BITMAP_SUBTITLE_CODECS]
+
+
+def subtitle_output_path(video_path, subtitle_language):
+    """Return the VTT path used for a subtitle stream of the given language."""
+    return f"{video_path}_stream_{subtitle_language}.vtt"
+
+
+def partial_output_path(subtitle_path):
+    """
+    Return the path ffmpeg writes a VTT file to; it is renamed to
+    `subtitle_path` only once ffmpeg succeeded, so a failed or interrupted
+    run never leaves a truncated file that looks extracted.
+    """
+    return f"{subtitle_path}.part"
+
+
+def remove_partial_outputs(subtitle_paths):
+    """Delete the partial files of the given VTT paths, where they exist."""
+    for subtitle_path in subtitle_paths:
+        try:
+            os.remove(partial_output_path(subtitle_path))
+        except FileNotFoundError:
+            pass
 
 
 def extract_subtitle_stream(video_path, subtitle_index, subtitle_language):
     """Extract a specific subtitle stream from the video in VTT format."""
-    subtitle_path = f"{video_path}_stream_{subtitle_language}.vtt"
+    subtitle_path = subtitle_output_path(video_path, subtitle_language)
     ffmpeg_cmd = [
-        'ffmpeg', '-i', video_path, '-map', f'0:{subtitle_index}', subtitle_path, '-y'
+        'ffmpeg', '-y', '-i', video_path, '-map', f'0:{subtitle_index}',
+        '-f', 'webvtt', partial_output_path(subtitle_path)
     ]
-    subprocess.run(ffmpeg_cmd, check=True)
+    try:
+        with span('extract', subtitle_language):
+            subprocess.run(ffmpeg_cmd, check=True)
+    except subprocess.CalledProcessError:
+        remove_partial_outputs([subtitle_path])
+        raise
+    os.replace(partial_output_path(subtitle_path), subtitle_path)
     return subtitle_path
 
 
+def extract_subtitle_streams(video_path, streams):
+    """
+    Extract several subtitle streams to VTT files in a single ffmpeg pass.
+
+    `streams` is a list of (subtitle_index, subtitle_language) pairs. Every
+    stream is mapped to its own output so the container is demuxed only once.
+    Returns a tuple (paths, failures): `paths` maps each language to its VTT
+    file and `failures` maps each language that could not be extracted to
+    the error raised for it.
+    """
+    paths, failures = {}, {}
+    if not streams:
+        return paths, failures
+
+    subtitle_paths = {language: subtitle_output_path(video_path, language)
+                      for _, language in streams}
+    ffmpeg_cmd = ['ffmpeg', '-y', '-i', video_path]
+    for subtitle_index, subtitle_language in streams:
+        ffmpeg_cmd += ['-map', f'0:{subtitle_index}', '-f', 'webvtt',
+                       partial_output_path(subtitle_paths[subtitle_language])]
+
+    try:
+        with span('extract'):
+            subprocess.run(ffmpeg_cmd, check=True)
+    except subprocess.CalledProcessError as e:
+        # The outputs of the failed pass may be truncated
+        remove_partial_outputs(subtitle_paths.values())
+        # One bad stream fails the whole invocation, so retry the streams
+        # individually to find out which of them actually failed.
+        logger.warning(
+            f"Single-pass extraction failed for {video_path}: {e}. Falling back to per-stream extraction.")
+        for subtitle_index, subtitle_language in streams:
+            try:
+                paths[subtitle_language] = extract_subtitle_stream(
+                    video_path, subtitle_index, subtitle_language)
+            except subprocess.CalledProcessError as stream_error:
+                failures[subtitle_language] = stream_error
+        return paths, failures
+
+    for subtitle_language, subtitle_path in subtitle_paths.items():
+        os.replace(partial_output_path(subtitle_path), subtitle_path)
+        paths[subtitle_language] = subtitle_path
+    return paths, failures
+
+
+def iter_subtitle_stream(video_path, subtitle_index, cache_path=None):
+    """
+    Yield the lines of a subtitle stream converted to WebVTT by ffmpeg,
+    read straight from its stdout without an intermediate file.
+
+    When `cache_path` is given the lines are also written there; the file
+    only appears once the stream has been read completely.
+    Raises CalledProcessError if ffmpeg fails.
+    """
+    ffmpeg_cmd = [
+        'ffmpeg', '-v', 'error', '-i', video_path, '-map', f'0:{subtitle_index}',
+        '-f', 'webvtt', 'pipe:1'
+    ]
+    # stderr goes to a file: a pipe only read after stdout would deadlock
+    # once ffmpeg filled it while we wait for more stdout
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ffmpeg_cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+        text=True, encoding='utf-8'
+    )
+    part_path = partial_output_path(cache_path) if cache_path else None
+    cache_file = open(part_path, 'w', encoding='utf-8') if cache_path else None
+    try:
+        for line in process.stdout:
+            if cache_file:
+                cache_file.write(line)
+            yield line
+
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='replace')
+            raise subprocess.CalledProcessError(
+                process.returncode, ffmpeg_cmd, stderr=stderr)
+
+        if cache_file:
+            cache_file.close()
+            os.replace(part_path, cache_path)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr_file.close()
+        if cache_file and not cache_file.closed:
+            cache_file.close()
+            os.remove(part_path)
+
+
+def extract_pending_streams(video_path, streams, mode=None):
+    """
+    Extract the given (subtitle_index, subtitle_language) streams using the
+    configured extraction mode ('single_pass' or 'per_stream').
+    Returns the same (paths, failures) tuple as `extract_subtitle_streams`.
+    """
+    mode = mode or settings.SUBTITLE_EXTRACTION_MODE
+    if mode == 'single_pass':
+        return extract_subtitle_streams(video_path, streams)
+    if mode != 'per_stream':
+        raise ValueError(f"Unknown subtitle extraction mode: {mode}")
+
+    paths, failures = {}, {}
+    for subtitle_index, subtitle_language in streams:
+        try:
+            paths[subtitle_language] = extract_subtitle_stream(
+                video_path, subtitle_index, subtitle_language)
+        except subprocess.CalledProcessError as e:
+            failures[subtitle_language] = e
+    return paths, failures
+
+
+def build_subtitles(cues, video, language):
+    """
+    Yield a Subtitle instance for every cue. Cues whose timestamps cannot
+    be parsed are skipped, and so are cues starting at the same time as an
+    earlier one: subtitles are stored by their start time. Cues ending
+    before they start are cut to an instant, as the interval index rejects
+    reversed ranges. Timestamps are stored as WebVTT timestamps whatever
+    the source format, e.g. `00:00:01.500` for SubRip's `00:00:01,500`.
+    """
+    starts = set()
+    for cue in cues:
+        start_ms = timestamp_to_ms(cue.start)
+        end_ms = timestamp_to_ms(cue.end)
+        if start_ms is None or end_ms is None:
+            logger.warning(
+                f"Skipping {language.code} cue with invalid timestamps: {cue.start} --> {cue.end}")
+            continue
+        if start_ms in starts:
+            logger.warning(
+                f"Skipping {language.code} cue starting at {cue.start} like an earlier one.")
+            continue
+        starts.add(start_ms)
+        end_ms = max(end_ms, start_ms)
+        yield Subtitle(
+            video=video,
+            language=language,
+            content=cue.text,
+            timestamp_start=format_vtt_timestamp(start_ms),
+            timestamp_end=format_vtt_timestamp(end_ms),
+            start_ms=start_ms,
+            end_ms=end_ms,
+            search_vector=subtitle_search_vector(cue.text, language)
+        )
+
+
 def parse_subtitles(subtitle_path, video, language):
-    """Parse subtitles from the extracted VTT file and create Subtitle instances."""
-    subtitles_to_create = []
+    """
+    Parse subtitles from the extracted VTT file, yielding Subtitle instances.
+    The file is read line by line so long files are never held in memory.
+    """
     with open(subtitle_path, 'r', encoding='utf-8') as file:
-        content = file.read().strip().splitlines()
-
-        i = 0
-        while i < len(content):
-            if '-->' in content[i]:
-                # Extract timestamps
-                timestamp_start, timestamp_end = content[i].split(' --> ')
-                i += 1
-
-                # Gather all lines for this subtitle block
-                subtitle_content_lines = []
-                while i < len(content) and '-->' not in content[i]:
-                    subtitle_content_lines.append(content[i].strip())
-                    i += 1
-
-                # Join all subtitle lines into a single block of text
-                subtitle_content = ' '.join(subtitle_content_lines).strip()
-
-                # Create subtitle instance
-                if subtitle_content:
-                    subtitles_to_create.append(
-                        Subtitle(
-                            video=video,
-                            language=language,
-                            content=subtitle_content,
-                            timestamp_start=timestamp_start,
-                            timestamp_end=timestamp_end
-                        )
-                    )
+        yield from build_subtitles(iter_vtt_cues(file), video, language)
+
+
+def insert_subtitles(subtitles, batch_size=None, ignore_conflicts=False, job=None):
+    """
+    Insert an iterable of Subtitle instances in batches of `batch_size`,
+    so only one batch is held in memory at a time. Time spent writing is
+    added to the 'insert' stage of `job`, if given.
+    Returns the number of subtitles sent to the database.
+    """
+    batch_size = batch_size or settings.SUBTITLE_INSERT_BATCH_SIZE
+    subtitles = iter(subtitles)
+    inserted = 0
+    while True:
+        batch = list(islice(subtitles, batch_size))
+        if not batch:
+            return inserted
+        started = time.perf_counter()
+        Subtitle.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+        if job is not None:
+            job.add_timing('insert', time.perf_counter() - started)
+        inserted += len(batch)
+
+
+def copy_subtitles(source, video, sync=False):
+    """
+    Copy the subtitles of `source` to `video`, which shares its content.
+    Subtitles the video already has are left alone, so copying again after
+    more languages were extracted is safe. With `sync`, the subtitles of
+    every language are diffed against the source instead, so changes made
+    by reprocessing the source are carried over.
+    """
+    fields = ['language_id', 'content', 'timestamp_start', 'timestamp_end',
+              'start_ms', 'end_ms', 'search_vector']
+    if sync:
+        for language in Language.objects.filter(
+                subtitle__video=source).distinct():
+            rows = source.subtitles.filter(language=language).values(
+                *fields).iterator(chunk_size=settings.SUBTITLE_INSERT_BATCH_SIZE)
+            sync_language_subtitles(
+                video, language, (Subtitle(video=video, **row) for row in rows))
+        return
+
+    rows = source.subtitles.values(*fields).iterator(
+        chunk_size=settings.SUBTITLE_INSERT_BATCH_SIZE)
+    with transaction.atomic():
+        copied = insert_subtitles(
+            (Subtitle(video=video, **row) for row in rows),
+            ignore_conflicts=True)
+    invalidate_video_list()
+    invalidate_subtitle_tracks(video.id)
+    invalidate_video_queries(video.id)
+    logger.info(
+        f"Copied {copied} subtitles from video {source.id} to duplicate video {video.id}.")
+    return copied
+
+
+def insert_language_subtitles(video, language, subtitles, job, read_stage='parse'):
+    """
+    Insert the subtitles of one language in a single transaction, so a
+    failure only loses the language being inserted.
+
+    Subtitles are produced lazily while they are inserted; the time not
+    spent writing is recorded under `read_stage` of the job.
+    """
+    started = time.perf_counter()
+    insert_time = job.stage_timings.get('insert', 0)
+    job.update(stage=read_stage)
+    with transaction.atomic():
+        inserted = insert_subtitles(subtitles, job=job)
+    insert_time = job.stage_timings.get('insert', 0) - insert_time
+    read_time = time.perf_counter() - started - insert_time
+    job.add_timing(read_stage, read_time)
+    record_stage(read_stage, read_time, language.code, video_id=video.id)
+    record_stage('insert', insert_time, language.code, video_id=video.id)
+    # bulk_create sends no signals, so drop the cached video list, the
+    # WebVTT track and the cached queries of the video here
+    invalidate_video_list()
+    invalidate_subtitle_tracks(video.id, language.id)
+    invalidate_video_queries(video.id)
+    logger.info(
+        f"Inserted {inserted} {language.code} subtitles for video {video.id}.")
+    return inserted
+
+
+def sync_language_subtitles(video, language, subtitles, job=None,
+                            read_stage='parse'):
+    """
+    Bring the stored subtitles of one language in line with freshly parsed
+    ones, in a single transaction.
+
+    Cues are matched on their start time: new cues are inserted, cues whose
+    text or end time changed are updated and cues that disappeared are
+    deleted, so the work done is proportional to what changed. Returns a
+    dict counting the 'inserted', 'updated', 'deleted' and 'unchanged' cues.
+    """
+    started = time.perf_counter()
+    if job is not None:
+        job.update(stage=read_stage)
+    fresh = {}
+    for subtitle in subtitles:
+        # The first cue starting at a given time wins, as on insert
+        fresh.setdefault(subtitle.start_ms, subtitle)
+    read_time = time.perf_counter() - started
+    if job is not None:
+        job.add_timing(read_stage, read_time)
+    record_stage(read_stage, read_time, language.code, video_id=video.id)
+
+    started = time.perf_counter()
+    compared_fields = ['content', 'timestamp_start', 'timestamp_end', 'end_ms']
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    with transaction.atomic():
+        stored = video.subtitles.filter(language=language).values_list(
+            'id', 'start_ms', *compared_fields).iterator(
+                chunk_size=settings.SUBTITLE_INSERT_BATCH_SIZE)
+        changed, deleted_ids = [], []
+        for subtitle_id, start_ms, *values in stored:
+            subtitle = fresh.pop(start_ms, None)
+            if subtitle is None:
+                deleted_ids.append(subtitle_id)
+            elif values != [getattr(subtitle, field) for field in compared_fields]:
+                subtitle.id = subtitle_id
+                changed.append(subtitle)
             else:
-                i += 1  # Move to the next line if no timestamp is found
+                counts['unchanged'] += 1
+
+        batch_size = settings.SUBTITLE_INSERT_BATCH_SIZE
+        for i in range(0, len(deleted_ids), batch_size):
+            Subtitle.objects.filter(
+                id__in=deleted_ids[i:i + batch_size]).delete()
+        Subtitle.objects.bulk_update(
+            changed, compared_fields + ['search_vector'], batch_size=batch_size)
+        # Whatever was not matched is new
+        counts['inserted'] = insert_subtitles(fresh.values())
+    counts['updated'] = len(changed)
+    counts['deleted'] = len(deleted_ids)
+    insert_time = time.perf_counter() - started
+    if job is not None:
+        job.add_timing('insert', insert_time)
+    record_stage('insert', insert_time, language.code, video_id=video.id)
+
+    invalidate_video_list()
+    if counts['inserted'] or counts['updated'] or counts['deleted']:
+        invalidate_subtitle_tracks(video.id, language.id)
+        invalidate_video_queries(video.id)
+    logger.info(
+        f"Synced {language.code} subtitles for video {video.id}: {counts}.")
+    return counts
+
+
+def store_language_subtitles(video, language, subtitles, job, read_stage='parse'):
+    """
+    Store freshly parsed subtitles of one language. Languages the video has
+    no subtitles for yet are inserted in bulk; the others are diffed against
+    what is stored. Returns the number of cues and the changes applied.
+    """
+    if not video.subtitles.filter(language=language).exists():
+        inserted = insert_language_subtitles(
+            video, language, subtitles, job, read_stage)
+        return inserted, None
+    counts = sync_language_subtitles(video, language, subtitles, job, read_stage)
+    return counts['inserted'] + counts['updated'] + counts['unchanged'], counts
+
+
+def pending_file_streams(video_path, streams, job, reprocess=False):
+    """
+    Return the streams that still have to be extracted to VTT files.
+    Streams whose file already exists are recorded as skipped, unless
+    `reprocess` is set.
+    """
+    pending_streams = []
+    for subtitle_index, language_code in streams:
+        subtitle_path = subtitle_output_path(video_path, language_code)
+
+        # Check if the subtitle file already exists
+        if not reprocess and os.path.isfile(subtitle_path):
+            logger.info(
+                f"Subtitle file already exists: {subtitle_path}. Skipping extraction for {language_code}.")
+            job.record_stream(subtitle_index, language_code, 'skipped')
+            continue
+        pending_streams.append((subtitle_index, language_code))
+    return pending_streams
 
-    return subtitles_to_create
+
+def store_extracted_streams(video, subtitle_paths, failures, stream_indexes,
+                            languages, job):
+    """
+    Record the streams that failed to extract, then parse and insert the
+    VTT files of the others. `stream_indexes` maps each language to the
+    index of its stream.
+    """
+    for language_code, error in failures.items():
+        logger.error(
+            f"FFmpeg error extracting {language_code} subtitles for video {video.id}: {error}")
+        job.record_stream(stream_indexes[language_code], language_code,
+                          'failed', error=str(error))
+
+    for language_code, subtitle_path in subtitle_paths.items():
+        language = languages[language_code]
+        try:
+            cues, changes = store_language_subtitles(
+                video, language, parse_subtitles(subtitle_path, video, language), job)
+        except Exception as e:
+            logger.error(
+                f"Error storing {language_code} subtitles for video {video.id}: {e}")
+            job.record_stream(stream_indexes[language_code], language_code,
+                              'failed', error=str(e))
+        else:
+            job.record_stream(stream_indexes[language_code], language_code,
+                              'succeeded', cues=cues, changes=changes)
+
+
+def process_streams_from_files(video, streams, pending_streams, languages, job):
+    """
+    Extract the pending streams (see pending_file_streams) to VTT files,
+    then parse and store them.
+    """
+    video_path = video.video_file.path
+
+    # Extract the pending subtitle streams
+    with job.stage_timer('extract'):
+        subtitle_paths, failures = extract_pending_streams(
+            video_path, pending_streams)
+
+    store_extracted_streams(
+        video, subtitle_paths, failures,
+        {language: index for index, language in streams}, languages, job)
+
+
+def group_streams(streams, size=None):
+    """Split streams into groups of at most `size` streams."""
+    size = size or settings.SUBTITLE_STREAMS_PER_TASK
+    return [streams[i:i + size] for i in range(0, len(streams), size)]
+
+
+def process_streams_from_pipe(video, streams, languages, job, reprocess=False):
+    """
+    Parse the streams straight from ffmpeg's stdout and store them.
+    Languages that already have subtitles for the video are skipped unless
+    `reprocess` is set. VTT files are only read or written when
+    SUBTITLE_VTT_CACHE is enabled, and never read when reprocessing.
+    """
+    video_path = video.video_file.path
+    existing_languages = set() if reprocess else set(
+        video.subtitles.values_list('language__code', flat=True).distinct())
+
+    for subtitle_index, language_code in streams:
+        if language_code in existing_languages:
+            logger.info(
+                f"Subtitles already stored for {language_code}. Skipping extraction for video {video.id}.")
+            job.record_stream(subtitle_index, language_code, 'skipped')
+            continue
+
+        cache_path = None
+        if settings.SUBTITLE_VTT_CACHE:
+            cache_path = subtitle_output_path(video_path, language_code)
+
+        language = languages[language_code]
+        try:
+            if cache_path and not reprocess and os.path.isfile(cache_path):
+                with open(cache_path, 'r', encoding='utf-8') as file:
+                    cues, changes = store_language_subtitles(video, language, build_subtitles(
+                        iter_vtt_cues(file), video, language), job)
+            else:
+                # ffmpeg runs while the output is parsed, so both are timed
+                # together as the extract stage
+                lines = iter_subtitle_stream(
+                    video_path, subtitle_index, cache_path)
+                cues, changes = store_language_subtitles(video, language, build_subtitles(
+                    iter_vtt_cues(lines), video, language), job, read_stage='extract')
+        except subprocess.CalledProcessError as e:
+            logger.error(
+                f"FFmpeg error extracting {language_code} subtitles for video {video.id}: {e.stderr or e}")
+            job.record_stream(subtitle_index, language_code, 'failed',
+                              error=e.stderr or str(e))
+        except Exception as e:
+            logger.error(
+                f"Error storing {language_code} subtitles for video {video.id}: {e}")
+            job.record_stream(subtitle_index, language_code, 'failed',
+                              error=str(e))
+        else:
+            job.record_stream(subtitle_index, language_code, 'succeeded',
+                              cues=cues, changes=changes)
 
 
 @shared_task
-def extract_subtitles_task(video_id):
+def extract_subtitles_task(video_id, job_id=None, reprocess=False):
+    """
+    Extract and store the subtitles of a video. With `reprocess`, streams
+    already extracted or stored are extracted again and diffed against the
+    stored subtitles instead of being skipped.
+    """
+    job = None
     try:
         video = Video.objects.get(id=video_id)
         video_path = video.video_file.path
 
-        # Retrieve subtitle stream information
-        subtitles_info = get_subtitle_info(video_path)
+        # Jobs are normally created when the task is queued
+        job = ProcessingJob.objects.filter(id=job_id, video=video).first()
+        if job is None:
+            job = ProcessingJob.objects.create(video=video)
+        job.start()
 
-        subtitles_to_create = []
+        # Retrieve subtitle stream information, probing only if the file
+        # changed since it was last probed
+        with job.stage_timer('probe'):
+            probe_data = get_probe_data(video)
 
-        for stream in subtitles_info:
-            if stream['codec_type'] == 'subtitle':
-                language_code = stream['tags'].get('language', 'x-unknown')
-                language = get_language(language_code)
+        streams, bitmap_streams = [], []
+        for stream in subtitle_streams(probe_data):
+            language_code = canonical_language_code(stream['language'])
 
-                # Construct subtitle file path
-                subtitle_path = f"{video_path}_stream_{language_code}.vtt"
+            # Bitmap streams would fail in ffmpeg after a full demux
+            if is_bitmap_subtitle(stream):
+                bitmap_streams.append((stream, language_code))
+                continue
+            # Only the first stream of each language is extracted
+            if language_code in {code for _, code in streams}:
+                continue
+            streams.append((stream['index'], language_code))
+        languages = get_languages([code for _, code in streams])
 
-                # Check if the subtitle file already exists
-                if os.path.isfile(subtitle_path):
-                    logger.info(
-                        f"Subtitle file already exists: {subtitle_path}. Skipping extraction for {language_code}.")
-                    continue
+        # Report the languages only available as pictures
+        reported = {code for _, code in streams}
+        for stream, language_code in bitmap_streams:
+            if language_code not in reported:
+                reported.add(language_code)
+                job.record_stream(
+                    stream['index'], language_code, 'skipped',
+                    error=f"Bitmap subtitles ({stream['codec_name']}) cannot be converted to text.")
 
-                # Extract the subtitle stream
-                subtitle_path = extract_subtitle_stream(
-                    video_path, stream['index'], language_code)
-                subtitles_to_create.extend(
-                    parse_subtitles(subtitle_path, video, language)
-                )
+        if settings.SUBTITLE_EXTRACTION_MODE == 'pipe':
+            process_streams_from_pipe(video, streams, languages, job, reprocess)
+        else:
+            pending_streams = pending_file_streams(
+                video_path, streams, job, reprocess)
+            groups = group_streams(pending_streams)
+            if settings.SUBTITLE_FANOUT and len(groups) > 1:
+                # The chord callback stores the subtitles and finishes the job;
+                # its errback finishes it when a group or the callback fails
+                job.update(stage='extract')
+                callback = store_extracted_subtitles_task.s(
+                    video.id, job.id, reprocess).on_error(fail_job_task.s(job.id))
+                chord(
+                    extract_stream_group_task.s(video.id, group)
+                    for group in groups
+                )(callback)
+                return
+            process_streams_from_files(
+                video, streams, pending_streams, languages, job)
 
-        # Bulk create subtitle instances
-        Subtitle.objects.bulk_create(subtitles_to_create)
+        finish_extraction(video, job, reprocess)
 
     except Video.DoesNotExist:
         logger.error(f"Video {video_id} does not exist.")
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg error processing video {video_id}: {e}")
+        if job is not None:
+            job.finish(error=f"FFmpeg error: {e.stderr or e}")
     except Exception as e:
         logger.error(f"Error processing video {video_id}: {e}")
+        if job is not None:
+            job.finish(error=str(e))
+
+
+@shared_task(bind=True)
+def extract_stream_group_task(self, video_id, streams, result=None):
+    """
+    Extract a group of subtitle streams of a video to VTT files.
+
+    Streams that fail are retried on their own, up to the task's
+    max_retries; `result` carries what earlier attempts produced. Returns
+    a dict with the extracted 'paths' and the 'failures' per language, the
+    stream 'indexes' per language and the 'seconds' spent extracting.
+    """
+    result = result or {'paths': {}, 'failures': {}, 'indexes': {}, 'seconds': 0}
+    result['indexes'].update(
+        {language: index for index, language in streams})
+    retryable = True
+    started = time.perf_counter()
+    try:
+        video_path = Video.objects.get(id=video_id).video_file.path
+        paths, failures = extract_pending_streams(video_path, streams)
+    except SoftTimeLimitExceeded:
+        # A stream that ran out of time would most likely do so again
+        retryable = False
+        paths = {}
+        failures = {language: "Extraction timed out."
+                    for _, language in streams}
+    except Exception as e:
+        paths = {}
+        failures = {language: e for _, language in streams}
+    result['seconds'] += time.perf_counter() - started
+    result['paths'].update(paths)
+
+    failed_streams = [(index, language)
+                      for index, language in streams if language in failures]
+    if failed_streams and retryable and self.request.retries < self.max_retries:
+        logger.warning(
+            f"Retrying extraction of {len(failed_streams)} subtitle streams for video {video_id}.")
+        raise self.retry(args=(video_id, failed_streams),
+                         kwargs={'result': result})
+
+    result['failures'].update(
+        {language: str(error) for language, error in failures.items()})
+    return result
+
+
+@shared_task
+def store_extracted_subtitles_task(results, video_id, job_id, reprocess=False):
+    """
+    Chord callback of the extraction fan-out: insert the subtitles every
+    group extracted, then finish the job.
+    """
+    job = None
+    try:
+        video = Video.objects.get(id=video_id)
+        job = ProcessingJob.objects.get(id=job_id)
+
+        subtitle_paths, failures, stream_indexes = {}, {}, {}
+        for result in results:
+            subtitle_paths.update(result['paths'])
+            failures.update(result['failures'])
+            stream_indexes.update(result['indexes'])
+        # The groups ran in parallel, so the slowest one is the stage's cost
+        job.add_timing('extract', max(result['seconds'] for result in results))
+
+        languages = get_languages(stream_indexes)
+        store_extracted_streams(video, subtitle_paths, failures,
+                                stream_indexes, languages, job)
+        finish_extraction(video, job, reprocess)
+
+    except Video.DoesNotExist:
+        logger.error(f"Video {video_id} does not exist.")
+    except Exception as e:
+        logger.error(f"Error storing subtitles of video {video_id}: {e}")
+        if job is not None:
+            job.finish(error=str(e))
+
+
+@shared_task
+def fail_job_task(request, exc, traceback, job_id):
+    """
+    Errback of the extraction chord: fail the job when a stream group could
+    not be extracted (time limit, exhausted retries, crash) or the callback
+    itself failed, so the job does not stay running.
+    """
+    job = ProcessingJob.objects.filter(id=job_id).first()
+    if job is not None and job.state not in ProcessingJob.FINISHED_STATES:
+        logger.error(f"Extraction of video {job.video_id} failed: {exc!r}")
+        job.finish(error=f"Extraction failed: {exc!r}")
+
+
+def fail_stale_jobs(jobs=None):
+    """
+    Fail the jobs among `jobs` (every job by default) still pending or
+    running PROCESSING_JOB_TIMEOUT seconds after they were queued: their
+    worker died without reporting back. Returns the number of jobs failed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PROCESSING_JOB_TIMEOUT)
+    jobs = ProcessingJob.objects.all() if jobs is None else jobs
+    stale = jobs.exclude(state__in=ProcessingJob.FINISHED_STATES).filter(
+        created_at__lt=cutoff)
+    failed = 0
+    for job in stale:
+        logger.warning(f"Failing stale processing job {job.id} of video {job.video_id}.")
+        job.finish(error="The job did not finish in time; its worker was probably lost.")
+        failed += 1
+    return failed
+
+
+@shared_task
+def fail_stale_jobs_task():
+    """Periodic sweep of stale jobs (see the beat schedule in celery.py)."""
+    fail_stale_jobs()
+
+
+def finish_extraction(video, job, reprocess=False):
+    """
+    Share the extracted subtitles with the duplicates of the video, then
+    mark the job as finished.
+    """
+    # Uploads of the same content registered while this one was processed,
+    # or every duplicate when the subtitles may have changed
+    for duplicate in video.duplicates.all():
+        copy_subtitles(video, duplicate, sync=reprocess)
+
+    job.finish()
+
+
+def queue_extraction(video, reprocess=False):
+    """
+    Create a pending processing job for the video and queue the extraction
+    task once the current transaction commits. Returns the job.
+    """
+    job = ProcessingJob.objects.create(video=video)
+    transaction.on_commit(
+        lambda: extract_subtitles_task.delay(video.id, job.id, reprocess))
+    transaction.on_commit(lambda: queue_media_tasks([video.id]))
+    return job
+
+
+def queue_registration(video, content_hash=None):
+    """
+    Create a pending processing job for an uploaded video and queue its
+    registration task once the current transaction commits. Returns the job.
+    """
+    job = ProcessingJob.objects.create(video=video)
+    transaction.on_commit(
+        lambda: register_upload_task.delay(video.id, job.id, content_hash))
+    return job
+
+
+@shared_task
+def register_upload_task(video_id, job_id, content_hash=None):
+    """
+    Hash and deduplicate an uploaded video (see videos/uploads.py), then
+    run its job: a duplicate gets a copy of the subtitles of its original,
+    new content is extracted.
+    """
+    job = None
+    try:
+        video = Video.objects.get(id=video_id)
+        job = ProcessingJob.objects.get(id=job_id)
+        original = deduplicate_video(video, content_hash)
+        if original is None:
+            extract_subtitles_task.delay(video.id, job.id)
+            queue_media_tasks([video.id])
+        else:
+            job.start()
+            copy_subtitles(original, video)
+            job.finish()
+
+    except (Video.DoesNotExist, ProcessingJob.DoesNotExist):
+        logger.error(f"Video {video_id} or its job {job_id} does not exist.")
+    except Exception as e:
+        logger.error(f"Error registering uploaded video {video_id}: {e}")
+        if job is not None:
+            job.finish(error=str(e))
+
+
+def queue_sidecar_import(video, name, language_code):
+    """
+    Create a pending processing job for the video and queue the import of
+    the stored subtitle file `name` once the current transaction commits.
+    Returns the job.
+    """
+    job = ProcessingJob.objects.create(video=video)
+    transaction.on_commit(
+        lambda: import_sidecar_task.delay(video.id, job.id, name, language_code))
+    return job
+
+
+@shared_task
+def import_sidecar_task(video_id, job_id, name, language_code):
+    """
+    Import an uploaded subtitle file (see videos/sidecars.py) as the
+    subtitles of one language of a video. Subtitles already stored in that
+    language are diffed against the file and replaced. The file is deleted
+    once imported.
+    """
+    job = None
+    try:
+        video = Video.objects.get(id=video_id)
+        job = ProcessingJob.objects.get(id=job_id)
+        job.start()
+
+        language = get_languages([language_code])[language_code]
+        try:
+            cues, changes = store_language_subtitles(video, language, build_subtitles(
+                iter_sidecar_cues(name), video, language), job)
+        except Exception as e:
+            logger.error(
+                f"Error importing {language_code} subtitles from {name} for video {video_id}: {e}")
+            job.record_stream(None, language_code, 'failed', error=str(e))
+        else:
+            job.record_stream(None, language_code, 'succeeded',
+                              cues=cues, changes=changes)
+        # The duplicates get the imported language too
+        finish_extraction(video, job, reprocess=True)
+
+    except (Video.DoesNotExist, ProcessingJob.DoesNotExist):
+        logger.error(f"Video {video_id} or its job {job_id} does not exist.")
+    except Exception as e:
+        logger.error(f"Error importing subtitles of video {video_id}: {e}")
+        if job is not None:
+            job.finish(error=str(e))
+    finally:
+        default_storage.delete(name)
+
+
+def queue_media_tasks(video_ids):
+    """
+    Queue the tasks run next to the subtitle extraction of new videos, as
+    enabled: thumbnail previews and HLS packaging.
+    """
+    for video_id in video_ids:
+        if settings.VIDEO_PREVIEWS:
+            generate_preview_task.delay(video_id)
+        if settings.HLS_PACKAGING:
+            package_hls_task.delay(video_id)
+
+
+@shared_task
+def generate_preview_task(video_id, force=False):
+    """
+    Generate the thumbnail sprites and keyframe index of a video (see
+    videos/previews.py), unless they are up to date or `force` is set.
+    Duplicates use the preview of the video they share their file with.
+    """
+    try:
+        video = Video.objects.get(id=video_id)
+        if video.duplicate_of_id is None:
+            generate_preview(video, force)
+    except Video.DoesNotExist:
+        logger.error(f"Video {video_id} does not exist.")
+    except subprocess.CalledProcessError as e:
+        logger.error(
+            f"FFmpeg error generating the preview of video {video_id}: {e.stderr or e}")
+
+
+@shared_task
+def package_hls_task(video_id, force=False):
+    """
+    Package a video for HLS playback (see videos/hls.py), unless its
+    package is up to date or `force` is set. Duplicates are played from
+    the package of the video they share their file with.
+    """
+    try:
+        video = Video.objects.get(id=video_id)
+        if video.duplicate_of_id is None and package_video(video, force) is None:
+            logger.info(
+                f"Not packaging video {video_id}: its codecs need re-encoding and HLS_TRANSCODE is off.")
+    except Video.DoesNotExist:
+        logger.error(f"Video {video_id} does not exist.")
+    except subprocess.CalledProcessError as e:
+        logger.error(
+            f"FFmpeg error packaging video {video_id} for HLS: {e.stderr or e}")
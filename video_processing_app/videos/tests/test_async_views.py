@@ -0,0 +1,79 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from videos.models import Language, Video
+from videos.parsers import Cue
+from videos.search import search_config_for
+from videos.tasks import build_subtitles, insert_subtitles
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        Video.objects.create(title='Empty', video_file='videos/empty.mkv')
+        for code, contents in (('eng', ['The dog runs', 'A cat sleeps', 'Dogs bark']),
+                               ('fre', ['Le chien court'])):
+            language = Language.objects.create(
+                code=code, name=code, search_config=search_config_for(code))
+            cues = (Cue(f'00:{i:02}.000', f'00:{i:02}.500', content)
+                    for i, content in enumerate(contents))
+            insert_subtitles(build_subtitles(cues, cls.video, language))
+
+    def setUp(self):
+        cache.clear()
+
+    async def assertSameResponse(self, name, params=None, args=None):
+        args = [self.video.id] if args is None else args
+        sync = await self.async_client.get(reverse(name, args=args), params or {})
+        cache.clear()
+        response = await self.async_client.get(reverse(f'async-{name}', args=args),
+                                               params or {})
+        self.assertEqual(response.status_code, sync.status_code)
+        # Pagination links point at the endpoint answering
+        self.assertEqual(
+            json.loads(response.content.decode().replace('/api/async/', '/api/')),
+            sync.json())
+        return response
+
+    async def test_video_list(self):
+        response = await self.assertSameResponse('video-list', args=[])
+        self.assertEqual(len(response.json()['results']), 2)
+
+    async def test_subtitle_list(self):
+        for params in ({}, {'language': 'en'}, {'fields': 'content, start_ms'}):
+            with self.subTest(params=params):
+                await self.assertSameResponse('video-subtitles-list', params)
+
+    async def test_search(self):
+        for params in ({'query': 'dog', 'mode': 'fulltext'},
+                       {'query': 'dog', 'mode': 'icontains', 'page_size': 1},
+                       {'query': 'chien', 'language': 'fr'}):
+            with self.subTest(params=params):
+                response = await self.assertSameResponse(
+                    'video-subtitles-search', params)
+                self.assertTrue(response.json())
+
+    def test_search_is_cached(self):
+        url = reverse('async-video-subtitles-search', args=[self.video.id])
+        self.client.get(url, {'query': 'dog'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'query': 'dog'})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_languages(self):
+        response = await self.assertSameResponse('video-languages')
+        self.assertEqual(len(response.json()), 2)
+
+    async def test_errors(self):
+        await self.assertSameResponse('video-subtitles-search', {'query': ' '})
+        for name in ('video-subtitles-list', 'video-subtitles-search',
+                     'video-languages'):
+            with self.subTest(name=name):
+                await self.assertSameResponse(name, {'query': 'dog'},
+                                              args=[self.video.id + 100])
+        response = await self.async_client.post(reverse('async-video-list'))
+        self.assertEqual(response.status_code, 405)
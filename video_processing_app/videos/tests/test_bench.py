@@ -0,0 +1,154 @@
+import io
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from videos.bench import (find_regressions, format_timestamp, iter_summaries,
+                          percentile, run_load, summarize, write_srt_fixture)
+from videos.management.commands.benchmark import Command
+from videos.parsers import iter_srt_cues
+
+
+def summary(p50, p99=None):
+    return {'runs': 5, 'min': p50, 'mean': p50, 'p50': p50, 'p99': p99 or p50,
+            'max': p99 or p50}
+
+
+class SummaryTests(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1), 100)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile([3, 1, 2], 0.5), 2)
+        self.assertEqual(percentile([7], 0.99), 7)
+
+    def test_summarize(self):
+        self.assertEqual(summarize([0.3, 0.1, 0.2, 0.4]), {
+            'runs': 4, 'min': 0.1, 'mean': 0.25, 'p50': 0.2, 'p99': 0.4, 'max': 0.4})
+
+    def test_iter_summaries(self):
+        results = {'runs': 5, 'scenarios': {
+            'short': {'probe': summary(0.1), 'endpoints': {'list': summary(0.2)}},
+            'long': {'probe': summary(0.3), 'errors': 0},
+        }}
+        self.assertEqual(dict(iter_summaries(results)), {
+            ('scenarios', 'short', 'probe'): summary(0.1),
+            ('scenarios', 'short', 'endpoints', 'list'): summary(0.2),
+            ('scenarios', 'long', 'probe'): summary(0.3),
+        })
+
+
+class RegressionTests(SimpleTestCase):
+    baseline = {'scenarios': {'short': {
+        'probe': summary(0.100), 'parse': summary(0.0010), 'insert': summary(0.200),
+        'extract': summary(0.050, p99=0.500),
+    }}}
+
+    def test_regressions(self):
+        results = {'scenarios': {'short': {
+            'probe': summary(0.150),     # +50%
+            'parse': summary(0.0019),    # +90%, but under a millisecond
+            'insert': summary(0.210),    # +5%
+            'extract': summary(0.200, p99=0.500),
+            'new': summary(1.0),         # Not in the baseline
+        }}}
+        self.assertEqual(find_regressions(self.baseline, results), [
+            (('scenarios', 'short', 'extract'), 0.050, 0.200),
+            (('scenarios', 'short', 'probe'), 0.100, 0.150),
+        ])
+        self.assertEqual(find_regressions(self.baseline, results, threshold=1), [
+            (('scenarios', 'short', 'extract'), 0.050, 0.200),
+        ])
+        # The p99 of extract did not move
+        self.assertEqual(find_regressions(self.baseline, results, statistic='p99'), [
+            (('scenarios', 'short', 'probe'), 0.100, 0.150),
+        ])
+        self.assertEqual(len(find_regressions(self.baseline, results, min_delta=0)), 3)
+
+    def test_command_fails_on_regressions(self):
+        command = Command(stdout=io.StringIO())
+        options = {'threshold': 0.2, 'statistic': 'p50', 'min_delta': 1.0}
+        results = {'environment': {'python': '3.11', 'revision': 'abc'},
+                   'scenarios': {'short': {'probe': summary(0.150)}}}
+        baseline = dict(self.baseline, environment={'python': '3.11', 'revision': 'def'})
+        with self.assertRaisesMessage(CommandError, '1 timings regressed.'):
+            command.check_regressions(baseline, results, options)
+        output = command.stdout.getvalue()
+        self.assertIn('scenarios / short / probe: p50 100.00 ms -> 150.00 ms (+50%)', output)
+        self.assertNotIn('another environment', output)
+
+        command = Command(stdout=io.StringIO())
+        command.check_regressions(baseline, {'environment': {'python': '3.12'}}, options)
+        self.assertIn('another environment', command.stdout.getvalue())
+        self.assertIn('No p50 slower than the baseline by more than 20%.',
+                      command.stdout.getvalue())
+
+    def test_unreadable_baseline(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as file:
+            file.write('{')
+            file.flush()
+            with self.assertRaisesMessage(CommandError, 'Cannot read baseline'):
+                call_command('benchmark', baseline=file.name)
+
+
+class FixtureTests(SimpleTestCase):
+    def test_format_timestamp(self):
+        self.assertEqual(format_timestamp(3_723_004), '01:02:03.004')
+        self.assertEqual(format_timestamp(500, ','), '00:00:00,500')
+
+    def test_srt_fixture(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'fixture.srt')
+            self.assertEqual(write_srt_fixture(path, 0, duration=60, cues_per_minute=20), 20)
+            with open(path, encoding='utf-8') as file:
+                cues = list(iter_srt_cues(file))
+        self.assertEqual(len(cues), 20)
+        self.assertEqual(cues[0][:2], ('00:00:00,000', '00:00:02,900'))
+        self.assertEqual(cues[-1][:2], ('00:00:57,000', '00:00:59,900'))
+        self.assertEqual(len({cue.text for cue in cues}), 20)
+
+
+class LoadHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status = 200 if self.path == '/ok/?q=1' else 500
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class RunLoadTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), LoadHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_requests(self):
+        result = run_load(f'{self.base_url}/ok/?q=1', requests=20, concurrency=4)
+        self.assertEqual(len(result['durations']), 20)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['elapsed'], 0)
+
+    def test_errors(self):
+        result = run_load(f'{self.base_url}/fail/', requests=5, concurrency=2)
+        self.assertEqual((result['durations'], result['errors']), ([], 5))
@@ -0,0 +1,142 @@
+from unittest import mock
+
+import redis
+from django.core.cache import cache
+from django.core.checks.registry import registry
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from videos.cache import (cached_video_query, invalidate_video_queries,
+                          query_cache_stats, reset_query_cache_stats)
+from videos.checks import check_cache_eviction
+from videos.models import Language, Video
+from videos.parsers import Cue
+from videos.search import search_config_for
+from videos.tasks import build_subtitles, sync_language_subtitles
+
+REDIS_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://cache-1:6379/1,redis://cache-2:6379/1',
+    }
+}
+
+
+class CachedVideoQueryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_result_is_cached_until_invalidated(self):
+        compute = mock.Mock(side_effect=[['first'], ['second']])
+        for _ in range(2):
+            self.assertEqual(cached_video_query('search', 1, {'q': 'dog'}, compute),
+                             ['first'])
+        self.assertEqual(compute.call_count, 1)
+        # Other parameters and other videos have their own entries
+        self.assertEqual(cached_video_query('search', 2, {'q': 'dog'}, lambda: ['other']),
+                         ['other'])
+        invalidate_video_queries(1)
+        self.assertEqual(cached_video_query('search', 1, {'q': 'dog'}, compute),
+                         ['second'])
+
+    @override_settings(QUERY_CACHE_MAX_ENTRY_SIZE=100)
+    def test_large_results_are_not_cached(self):
+        compute = mock.Mock(return_value=['x' * 100])
+        for _ in range(2):
+            cached_video_query('search', 1, {'q': 'x'}, compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_stats(self):
+        for _ in range(3):
+            cached_video_query('search', 1, {'q': 'dog'}, lambda: ['dog'])
+        self.assertEqual(query_cache_stats(), {
+            'search': {'hits': 2, 'misses': 1, 'hit_rate': 0.6667},
+            'languages': {'hits': 0, 'misses': 0, 'hit_rate': None},
+        })
+        reset_query_cache_stats()
+        self.assertEqual(query_cache_stats()['search']['hits'], 0)
+
+
+class SearchCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.language = Language.objects.create(
+            code='eng', name='English', search_config=search_config_for('eng'))
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self):
+        response = self.client.get(
+            reverse('video-subtitles-search', args=[self.video.id]),
+            {'query': 'dog', 'mode': 'icontains'})
+        return [result['content'] for result in response.json()]
+
+    def test_synced_subtitles_invalidate_searches(self):
+        cues = [Cue('00:01.000', '00:02.000', 'A dog')]
+        sync_language_subtitles(self.video, self.language,
+                                build_subtitles(cues, self.video, self.language))
+        self.assertEqual(self.search(), ['A dog'])
+        cues.append(Cue('00:03.000', '00:04.000', 'Another dog'))
+        sync_language_subtitles(self.video, self.language,
+                                build_subtitles(cues, self.video, self.language))
+        self.assertEqual(self.search(), ['A dog', 'Another dog'])
+        self.assertEqual(query_cache_stats()['search']['misses'], 2)
+
+    def test_stats_view(self):
+        self.search()
+        self.search()
+        url = reverse('query-cache-stats')
+        self.assertEqual(self.client.get(url).json()['search'],
+                         {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).json()['search']['misses'], 0)
+
+
+@override_settings(CACHES=REDIS_CACHES)
+class CacheEvictionCheckTests(SimpleTestCase):
+    def check(self, **config_get):
+        with mock.patch('videos.checks.redis.Redis.config_get', **config_get) as mock_get:
+            warnings = check_cache_eviction(None)
+        return [warning.id for warning in warnings], mock_get
+
+    def test_bounded_cache(self):
+        ids, mock_get = self.check(return_value={
+            'maxmemory': '104857600', 'maxmemory-policy': 'volatile-lru'})
+        self.assertEqual(ids, [])
+        mock_get.assert_called_once_with('maxmemory*')
+
+    def test_first_server_is_checked(self):
+        with mock.patch('videos.checks.redis.Redis.from_url') as from_url:
+            from_url.return_value.config_get.return_value = {
+                'maxmemory': '1', 'maxmemory-policy': 'volatile-ttl'}
+            self.assertEqual(check_cache_eviction(None), [])
+        self.assertEqual(from_url.call_args.args, ('redis://cache-1:6379/1',))
+        from_url.return_value.close.assert_called_once_with()
+
+    def test_unbounded_cache(self):
+        ids, _ = self.check(return_value={
+            'maxmemory': '0', 'maxmemory-policy': 'noeviction'})
+        self.assertEqual(ids, ['videos.W002', 'videos.W003'])
+
+    def test_config_disabled(self):
+        ids, _ = self.check(side_effect=redis.ResponseError(
+            "unknown command 'CONFIG', with args beginning with: 'GET'"))
+        self.assertEqual(ids, ['videos.W004'])
+
+    def test_unreachable(self):
+        ids, _ = self.check(side_effect=redis.ConnectionError('Connection refused'))
+        self.assertEqual(ids, ['videos.W001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_other_backends_are_not_checked(self):
+        ids, mock_get = self.check()
+        self.assertEqual(ids, [])
+        mock_get.assert_not_called()
+
+    def test_deploy_only(self):
+        self.assertIn(check_cache_eviction,
+                      registry.get_checks(include_deployment_checks=True))
+        self.assertNotIn(check_cache_eviction, registry.get_checks())
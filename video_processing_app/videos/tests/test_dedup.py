@@ -0,0 +1,147 @@
+import hashlib
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from videos.models import Language, ProcessingJob, Subtitle, Video
+from videos.tasks import register_upload_task
+from videos.uploads import (HashingMemoryFileUploadHandler,
+                            HashingTemporaryFileUploadHandler, deduplicate_video)
+
+
+class HashingUploadHandlerTests(SimpleTestCase):
+    def receive(self, handlers, content):
+        """Feed `content` through the handlers in 3-byte chunks, as Django does."""
+        for i, handler in enumerate(handlers):
+            try:
+                handler.new_file('video_file', 'movie.mkv', 'video/x-matroska',
+                                 len(content))
+            except StopFutureHandlers:
+                handlers = handlers[:i + 1]
+                break
+        for start in range(0, len(content), 3):
+            chunk = content[start:start + 3]
+            for handler in handlers:
+                chunk = handler.receive_data_chunk(chunk, start)
+                if chunk is None:
+                    break
+        for handler in handlers:
+            file = handler.file_complete(len(content))
+            if file is not None:
+                return file
+
+    def test_file_kept_in_memory(self):
+        handler = HashingMemoryFileUploadHandler()
+        handler.activated = True
+        file = self.receive([handler], b'tiny file')
+        self.assertEqual(file.content_hash, hashlib.sha256(b'tiny file').hexdigest())
+
+    def test_file_passed_on_to_disk(self):
+        # Too large for the memory handler, which passes every chunk on and
+        # must not hash them
+        memory_handler = HashingMemoryFileUploadHandler()
+        memory_handler.activated = False
+        content = b'larger than memory'
+        file = self.receive([memory_handler, HashingTemporaryFileUploadHandler()],
+                            content)
+        self.assertEqual(file.content_hash, hashlib.sha256(content).hexdigest())
+        file.close()
+
+
+class DeduplicationTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, content, probe_data=None):
+        name = default_storage.save('videos/movie.mkv', ContentFile(content))
+        return Video.objects.create(title='Movie', video_file=name, probe_data=probe_data)
+
+    def test_new_content(self):
+        video = self.upload(b'content')
+        self.assertIsNone(deduplicate_video(video))
+        video.refresh_from_db()
+        self.assertEqual(video.content_hash, hashlib.sha256(b'content').hexdigest())
+        self.assertIsNone(video.duplicate_of)
+
+    def test_duplicate_shares_the_original_file(self):
+        original = self.upload(b'content', probe_data={'streams': []})
+        deduplicate_video(original)
+        duplicate = self.upload(b'content')
+        duplicate_name = duplicate.video_file.name
+
+        self.assertEqual(deduplicate_video(duplicate), original)
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.duplicate_of, original)
+        self.assertEqual(duplicate.video_file.name, original.video_file.name)
+        self.assertEqual(duplicate.probe_data, {'streams': []})
+        self.assertFalse(default_storage.exists(duplicate_name))
+        self.assertTrue(default_storage.exists(original.video_file.name))
+
+    def test_given_hash_is_trusted(self):
+        video = self.upload(b'content')
+        deduplicate_video(video, 'f' * 64)
+        self.assertEqual(video.content_hash, 'f' * 64)
+
+    def test_registered_video_is_left_alone(self):
+        original = self.upload(b'content')
+        deduplicate_video(original)
+        duplicate = self.upload(b'content')
+        deduplicate_video(duplicate)
+        with self.assertNumQueries(0):
+            self.assertEqual(deduplicate_video(duplicate), original)
+
+
+class RegisterUploadTaskTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.language = Language.objects.create(code='eng', name='English')
+
+    def upload(self):
+        name = default_storage.save('videos/movie.mkv', ContentFile(b'content'))
+        video = Video.objects.create(title='Movie', video_file=name)
+        return video, ProcessingJob.objects.create(video=video)
+
+    @mock.patch('videos.tasks.queue_media_tasks')
+    @mock.patch('videos.tasks.extract_subtitles_task')
+    def test_new_content_is_extracted(self, extract_task, queue_media_tasks):
+        video, job = self.upload()
+        register_upload_task(video.id, job.id)
+        extract_task.delay.assert_called_once_with(video.id, job.id)
+        queue_media_tasks.assert_called_once_with([video.id])
+
+    @mock.patch('videos.tasks.extract_subtitles_task')
+    def test_duplicate_gets_a_copy_of_the_subtitles(self, extract_task):
+        original, _ = self.upload()
+        deduplicate_video(original)
+        Subtitle.objects.create(video=original, language=self.language, content='Hello',
+                                timestamp_start='00:00:01.000',
+                                timestamp_end='00:00:02.000', start_ms=1000, end_ms=2000)
+
+        video, job = self.upload()
+        register_upload_task(video.id, job.id)
+        extract_task.delay.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.SUCCEEDED)
+        self.assertEqual(list(video.subtitles.values_list('content', 'start_ms')),
+                         [('Hello', 1000)])
+
+    def test_failure_fails_the_job(self):
+        video, job = self.upload()
+        with mock.patch('videos.tasks.deduplicate_video', side_effect=OSError('gone')):
+            register_upload_task(video.id, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.FAILED)
+        self.assertEqual(job.error, 'gone')
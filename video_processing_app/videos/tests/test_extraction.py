@@ -0,0 +1,147 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+
+from videos.bench import generate_fixture
+from videos.tasks import (extract_subtitle_streams, iter_subtitle_stream,
+                          partial_output_path, subtitle_output_path)
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+class SinglePassExtractionTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.video_path = os.path.join(cls.directory, 'fixture.mkv')
+        cls.streams = generate_fixture(cls.video_path, duration=5, tracks=3,
+                                       cues_per_minute=60, size='64x36')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            if name != 'fixture.mkv':
+                os.remove(os.path.join(self.directory, name))
+
+    def test_every_stream_is_extracted(self):
+        paths, failures = extract_subtitle_streams(self.video_path, self.streams)
+        self.assertEqual(failures, {})
+        self.assertEqual(set(paths), {language for _, language in self.streams})
+        for language, path in paths.items():
+            self.assertEqual(path, subtitle_output_path(self.video_path, language))
+            with open(path, encoding='utf-8') as file:
+                self.assertTrue(file.read().startswith('WEBVTT'))
+            self.assertFalse(os.path.exists(partial_output_path(path)))
+
+    def test_failed_pass_falls_back_per_stream(self):
+        streams = self.streams[:1] + [(9, 'xxx')]
+        paths, failures = extract_subtitle_streams(self.video_path, streams)
+        self.assertEqual(list(paths), [self.streams[0][1]])
+        self.assertEqual(list(failures), ['xxx'])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted(['fixture.mkv', os.path.basename(paths['eng'])]))
+
+    def test_failed_pass_leaves_no_partial_outputs(self):
+        run = subprocess.run
+
+        def truncate_and_fail(cmd, **kwargs):
+            # The first (single-pass) run writes half of each output and dies
+            if mock_run.call_count == 1:
+                for argument in cmd:
+                    if argument.endswith('.part'):
+                        with open(argument, 'w') as file:
+                            file.write('WEBVTT\n\n00:00:00.000 --> ')
+                raise subprocess.CalledProcessError(1, cmd)
+            return run(cmd, **kwargs)
+
+        with mock.patch('videos.tasks.subprocess.run',
+                        side_effect=truncate_and_fail) as mock_run:
+            paths, failures = extract_subtitle_streams(self.video_path, self.streams)
+
+        self.assertEqual(mock_run.call_count, 1 + len(self.streams))
+        self.assertEqual(failures, {})
+        for path in paths.values():
+            with open(path, encoding='utf-8') as file:
+                self.assertIn('-->', file.read().split('\n\n', 1)[1])
+            self.assertFalse(os.path.exists(partial_output_path(path)))
+
+    def test_failed_stream_leaves_nothing_behind(self):
+        with mock.patch('videos.tasks.subprocess.run',
+                        side_effect=subprocess.CalledProcessError(1, 'ffmpeg')):
+            paths, failures = extract_subtitle_streams(self.video_path, self.streams)
+        self.assertEqual(paths, {})
+        self.assertEqual(set(failures), {language for _, language in self.streams})
+        self.assertEqual(os.listdir(self.directory), ['fixture.mkv'])
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+class PipeExtractionTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.video_path = os.path.join(cls.directory, 'fixture.mkv')
+        cls.streams = generate_fixture(cls.video_path, duration=5, tracks=1,
+                                       cues_per_minute=60, size='64x36')
+        cls.cache_path = subtitle_output_path(cls.video_path, 'eng')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def tearDown(self):
+        for path in (self.cache_path, partial_output_path(self.cache_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_lines(self):
+        lines = list(iter_subtitle_stream(self.video_path, self.streams[0][0]))
+        self.assertEqual(lines[0], 'WEBVTT\n')
+        self.assertEqual(sum('-->' in line for line in lines), 5)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_cache_file_appears_when_read(self):
+        lines = iter_subtitle_stream(self.video_path, self.streams[0][0],
+                                     cache_path=self.cache_path)
+        next(lines)
+        self.assertFalse(os.path.exists(self.cache_path))
+        rest = list(lines)
+        with open(self.cache_path, encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'WEBVTT\n' + ''.join(rest))
+        self.assertFalse(os.path.exists(partial_output_path(self.cache_path)))
+
+    def test_abandoned_stream_leaves_no_cache_file(self):
+        lines = iter_subtitle_stream(self.video_path, self.streams[0][0],
+                                     cache_path=self.cache_path)
+        next(lines)
+        lines.close()
+        self.assertEqual(os.listdir(self.directory), ['fixture.mkv'])
+
+    def test_failure(self):
+        with self.assertRaises(subprocess.CalledProcessError) as raised:
+            list(iter_subtitle_stream(self.video_path, 9, cache_path=self.cache_path))
+        self.assertIn('0:9', raised.exception.stderr)
+        self.assertEqual(os.listdir(self.directory), ['fixture.mkv'])
+
+    def test_verbose_stderr_does_not_block_stdout(self):
+        # More stderr than a pipe buffer holds, written before any stdout
+        script = ("import sys; sys.stderr.write('x' * 1_000_000); sys.stderr.flush(); "
+                  "print('WEBVTT')")
+        popen = subprocess.Popen
+
+        def run_script(cmd, **kwargs):
+            return popen([sys.executable, '-c', script], **kwargs)
+
+        with mock.patch('videos.tasks.subprocess.Popen', side_effect=run_script):
+            self.assertEqual(list(iter_subtitle_stream(self.video_path, 0)),
+                             ['WEBVTT\n'])
@@ -0,0 +1,178 @@
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from videos.bench import generate_fixture
+from videos.hls import codec_arguments, package_video
+from videos.models import HlsPackage, Language, Video
+from videos.parsers import Cue
+from videos.search import search_config_for
+from videos.tasks import build_subtitles, insert_subtitles
+
+
+def probe_data(video_codec, audio_codec=None):
+    streams = [{'index': 0, 'codec_type': 'video', 'codec_name': video_codec}]
+    if audio_codec:
+        streams.append({'index': 1, 'codec_type': 'audio', 'codec_name': audio_codec})
+    return {'duration': 12.0, 'streams': streams}
+
+
+class HomeTests(TestCase):
+    def test_hls_js_is_only_loaded_with_packaging(self):
+        for packaging in (True, False):
+            with self.subTest(packaging=packaging):
+                with override_settings(HLS_PACKAGING=packaging):
+                    response = self.client.get(reverse('home'))
+                self.assertEqual(b'/static/vendor/hls.min.js' in response.content, packaging)
+                self.assertContains(response, '/static/video_player.js')
+
+
+class CodecArgumentsTests(SimpleTestCase):
+    def test_copied(self):
+        self.assertEqual(codec_arguments(probe_data('h264', 'aac'), 6),
+                         (['-c:v', 'copy', '-c:a', 'copy'], False))
+        self.assertEqual(codec_arguments(probe_data('hevc'), 6),
+                         (['-c:v', 'copy', '-tag:v', 'hvc1'], False))
+
+    def test_transcoded(self):
+        arguments, transcoded = codec_arguments(probe_data('mpeg4', 'opus'), 4)
+        self.assertTrue(transcoded)
+        self.assertEqual(arguments[:2], ['-c:v', 'libx264'])
+        self.assertIn('expr:gte(t,n_forced*4)', arguments)
+        self.assertEqual(arguments[-6:], ['-c:a', 'aac', '-b:a', '128k', '-ac', '2'])
+        self.assertEqual(codec_arguments(probe_data('h264', 'opus'), 6)[1], True)
+
+
+class HlsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(
+            title='Sample', video_file='videos/sample.mp4',
+            probe_data={'duration': 12.0, 'streams': [
+                {'index': 2, 'codec_type': 'subtitle', 'codec_name': 'mov_text',
+                 'language': 'fre', 'default': True},
+            ]})
+        cls.duplicate = Video.objects.create(title='Copy', video_file='videos/sample.mp4',
+                                             duplicate_of=cls.video)
+        cls.unpackaged = Video.objects.create(title='Raw', video_file='videos/raw.mkv')
+        cls.package = HlsPackage.objects.create(
+            video=cls.video, probe_key='key', directory=f'hls/{cls.video.id}/abc123',
+            duration=11.5, segment_count=2, size=30, bandwidth=2000000,
+            average_bandwidth=1500000)
+        for code, name in (('eng', 'English'), ('fre', 'French')):
+            language = Language.objects.create(
+                code=code, name=name, search_config=search_config_for(code))
+            insert_subtitles(build_subtitles(
+                [Cue('00:01.000', '00:02.000', name)], cls.video, language))
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        default_storage.save(f'{self.package.directory}/segment_00000.m4s',
+                             ContentFile(b'0123456789'))
+
+    def test_master_playlist(self):
+        response = self.client.get(reverse('hls-master', args=[self.video.id]))
+        self.assertEqual(response['Content-Type'], 'application/vnd.apple.mpegurl')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response.content.decode(), '\n'.join([
+            '#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-INDEPENDENT-SEGMENTS',
+            '#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="English",LANGUAGE="en",'
+            f'DEFAULT=NO,AUTOSELECT=YES,URI="/api/videos/{self.video.id}/hls/subtitles/eng.m3u8"',
+            '#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="French",LANGUAGE="fr",'
+            f'DEFAULT=YES,AUTOSELECT=YES,URI="/api/videos/{self.video.id}/hls/subtitles/fre.m3u8"',
+            '#EXT-X-STREAM-INF:BANDWIDTH=2000000,AVERAGE-BANDWIDTH=1500000,SUBTITLES="subs"',
+            f'/api/videos/{self.video.id}/hls/abc123/video.m3u8',
+        ]) + '\n')
+
+    def test_subtitle_playlist(self):
+        response = self.client.get(reverse('hls-subtitles', args=[self.video.id, 'en']))
+        self.assertEqual(response.content.decode(), '\n'.join([
+            '#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:12',
+            '#EXT-X-PLAYLIST-TYPE:VOD', '#EXTINF:11.500,',
+            f'/api/videos/{self.video.id}/tracks/eng.vtt', '#EXT-X-ENDLIST',
+        ]) + '\n')
+
+    def test_duplicates_share_the_package(self):
+        response = self.client.get(reverse('hls-master', args=[self.duplicate.id]))
+        self.assertContains(response, f'/api/videos/{self.duplicate.id}/hls/abc123/video.m3u8')
+        response = self.client.get(
+            reverse('hls-file', args=[self.duplicate.id, 'abc123', 'segment_00000.m4s']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_files(self):
+        url = reverse('hls-file', args=[self.video.id, 'abc123', 'segment_00000.m4s'])
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'video/iso.segment')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        response = self.client.get(url, headers={'range': 'bytes=2-4'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+
+        response = self.client.get(url, headers={'if_none_match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing(self):
+        for url in (reverse('hls-master', args=[self.unpackaged.id]),
+                    reverse('hls-subtitles', args=[self.unpackaged.id, 'eng']),
+                    reverse('hls-file', args=[self.video.id, 'old', 'segment_00000.m4s']),
+                    reverse('hls-file', args=[self.video.id, 'abc123', 'segment_00001.m4s']),
+                    reverse('hls-file', args=[self.video.id, 'abc123', 'notes.txt'])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_stream_url(self):
+        results = self.client.get(reverse('video-list')).json()['results']
+        self.assertEqual(
+            {result['id']: result['stream_url'] for result in results},
+            {self.video.id: f'http://testserver/api/videos/{self.video.id}/hls/master.m3u8',
+             self.duplicate.id: f'http://testserver/api/videos/{self.duplicate.id}/hls/master.m3u8',
+             self.unpackaged.id: None})
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+class PackageVideoTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, HLS_SEGMENT_DURATION=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root, 'videos'))
+        generate_fixture(os.path.join(media_root, 'videos', 'fixture.mkv'),
+                         duration=5, tracks=1, size='64x36')
+        self.video = Video.objects.create(title='Fixture', video_file='videos/fixture.mkv')
+
+    @override_settings(HLS_TRANSCODE=False)
+    def test_not_transcoded_unless_allowed(self):
+        self.assertIsNone(package_video(self.video))
+        self.assertFalse(HlsPackage.objects.exists())
+
+    @override_settings(HLS_TRANSCODE=True)
+    def test_transcoded(self):
+        package = package_video(self.video)
+        self.assertTrue(package.transcoded)
+        self.assertEqual(package.segment_count, 3)
+        self.assertAlmostEqual(package.duration, 5, delta=0.1)
+        _, names = default_storage.listdir(package.directory)
+        self.assertEqual(sorted(names), ['init.mp4', 'segment_00000.m4s', 'segment_00001.m4s',
+                                         'segment_00002.m4s', 'video.m3u8'])
+        self.assertGreater(package.bandwidth, 0)
+
+        self.assertEqual(package_video(self.video).directory, package.directory)
+        repackaged = package_video(self.video, force=True)
+        self.assertNotEqual(repackaged.directory, package.directory)
+        self.assertFalse(default_storage.exists(package.directory + '/video.m3u8'))
@@ -0,0 +1,179 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from videos.bench import generate_fixture
+from videos.ingest import probe_file, register_batch, scan_library
+from videos.models import Language, ProcessingJob, Subtitle, Video
+
+
+class ScanLibraryTests(SimpleTestCase):
+    def test_supported_files_in_order(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ('b/2.MKV', 'b/1.mp4', 'a/z.avi', 'notes.txt', 'c.mkv.part', 'a.mkv'):
+            os.makedirs(os.path.dirname(os.path.join(directory, name)), exist_ok=True)
+            open(os.path.join(directory, name), 'w').close()
+        self.assertEqual(
+            [os.path.relpath(path, directory) for path in scan_library(directory)],
+            ['a.mkv', 'a/z.avi', 'b/1.mp4', 'b/2.MKV'])
+
+
+@skipUnless(shutil.which('ffprobe'), "ffprobe is not installed")
+class ProbeFileTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'fixture.mkv')
+        generate_fixture(cls.path, duration=1, tracks=2, cues_per_minute=60, size='64x36')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def test_probe(self):
+        probe = probe_file(self.path, with_hash=True)
+        self.assertEqual(probe['error'], '')
+        self.assertEqual(probe['languages'], ['eng', 'rus'])
+        self.assertEqual(len(probe['content_hash']), 64)
+        self.assertTrue(probe['probe_key'].endswith(probe['content_hash']))
+        self.assertIsNone(probe_file(self.path)['content_hash'])
+
+    def test_unreadable_file(self):
+        path = os.path.join(self.directory, 'broken.mkv')
+        with open(path, 'wb') as file:
+            file.write(b'not a video')
+        probe = probe_file(path)
+        self.assertNotEqual(probe['error'], '')
+        self.assertIsNone(probe['probe_data'])
+
+
+@mock.patch('videos.ingest.queue_media_tasks')
+@mock.patch('videos.ingest.extract_subtitles_task')
+class RegisterBatchTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def probe(self, name, content_hash=None, languages=('eng',)):
+        return {'path': os.path.join(self.media_root, 'library', name),
+                'languages': list(languages), 'content_hash': content_hash,
+                'probe_data': {'streams': []}, 'probe_key': 'key', 'error': ''}
+
+    def test_batch(self, extract_task, queue_media_tasks):
+        stored = Video.objects.create(title='Stored', video_file='videos/stored.mkv',
+                                      content_hash='a' * 64)
+        english = Language.objects.create(code='eng', name='English')
+        Subtitle.objects.create(video=stored, language=english, content='Hello',
+                                start_ms=0, end_ms=1000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            videos, duplicates, queued = register_batch([
+                self.probe('new.mkv', 'b' * 64),
+                self.probe('copy of new.mkv', 'b' * 64),
+                self.probe('copy of stored.mkv', 'a' * 64),
+                self.probe('silent.mkv', languages=()),
+            ])
+
+        self.assertEqual([video.title for video in videos], ['new', 'silent'])
+        new, silent = videos
+        self.assertEqual(new.video_file.name, 'library/new.mkv')
+        self.assertEqual([(video.title, video.duplicate_of) for video in duplicates],
+                         [('copy of new', new), ('copy of stored', stored)])
+        # Duplicates of stored videos get their subtitles now, the others
+        # once their original is extracted
+        self.assertEqual(duplicates[1].subtitles.count(), 1)
+        self.assertEqual(duplicates[0].subtitles.count(), 0)
+
+        new_job = ProcessingJob.objects.get(video=new)
+        self.assertEqual(queued, [(new.id, new_job.id)])
+        self.assertEqual(ProcessingJob.objects.get(video=silent).state,
+                         ProcessingJob.SUCCEEDED)
+        extract_task.delay.assert_called_once_with(new.id, new_job.id)
+        queue_media_tasks.assert_called_once_with([new.id, silent.id])
+
+    def test_one_insert_per_table(self, extract_task, queue_media_tasks):
+        probes = [self.probe(f'{i}.mkv', f'{i:064x}') for i in range(20)]
+        # Originals lookup, savepoint, videos, jobs, release
+        with self.assertNumQueries(5):
+            videos, _, queued = register_batch(probes)
+        self.assertEqual(len(videos), 20)
+        self.assertEqual(len(queued), 20)
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+@mock.patch('videos.management.commands.ingest_library.connections')
+@mock.patch('videos.ingest.queue_media_tasks')
+@mock.patch('videos.ingest.extract_subtitles_task')
+class IngestLibraryCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.library = os.path.join(cls.media_root, 'library')
+        os.makedirs(cls.library)
+        for name in ('one.mkv', 'two.mp4'):
+            generate_fixture(os.path.join(cls.library, name), duration=1, tracks=1,
+                             cues_per_minute=60, size='64x36')
+        with open(os.path.join(cls.library, 'broken.mkv'), 'wb') as file:
+            file.write(b'not a video')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media_root)
+        super().tearDownClass()
+
+    def setUp(self):
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+        self.addCleanup(lambda: os.path.exists(self.checkpoint) and os.remove(self.checkpoint))
+
+    def ingest(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('ingest_library', self.library, '--workers', '1',
+                         '--checkpoint', self.checkpoint, *args,
+                         stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_ingest(self, extract_task, queue_media_tasks, connections):
+        stdout, stderr = self.ingest('--hash')
+        self.assertIn("Found 3 video files, 0 already handled.", stdout)
+        self.assertIn("Registered 2 videos (0 duplicates), queued 2 extractions.", stdout)
+        self.assertIn("Could not probe", stderr)
+        self.assertEqual(sorted(Video.objects.values_list('video_file', flat=True)),
+                         ['library/one.mkv', 'library/two.mp4'])
+        self.assertEqual(extract_task.delay.call_count, 2)
+        with open(self.checkpoint) as file:
+            checkpoint = json.load(file)
+        self.assertEqual(len(checkpoint['registered']), 2)
+        self.assertEqual(list(checkpoint['failed']), [os.path.join(self.library, 'broken.mkv')])
+
+        # Registered and failed files are skipped when resuming
+        stdout, _ = self.ingest('--resume')
+        self.assertIn("Found 3 video files, 3 already handled.", stdout)
+        self.assertEqual(Video.objects.count(), 2)
+
+    def test_dry_run(self, extract_task, queue_media_tasks, connections):
+        stdout, _ = self.ingest('--dry-run')
+        self.assertIn("library/one.mkv: eng", stdout)
+        self.assertFalse(Video.objects.exists())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_directory_outside_media_root(self, extract_task, queue_media_tasks,
+                                          connections):
+        with self.assertRaisesMessage(CommandError, "is not inside MEDIA_ROOT"):
+            call_command('ingest_library', tempfile.gettempdir())
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from video_processing_app.celery import app
+from videos.bench import generate_fixture
+from videos.models import ProcessingJob, Video
+from videos.probe import get_probe_data
+from videos.tasks import (extract_subtitles_task, fail_job_task, fail_stale_jobs,
+                          subtitle_output_path)
+
+
+class ProcessingJobFinishTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+
+    def finish(self, statuses, error=''):
+        job = ProcessingJob.objects.create(video=self.video)
+        job.stream_results = [{'index': index, 'language': 'eng', 'status': status,
+                               'cues': 0, 'error': ''}
+                              for index, status in enumerate(statuses)]
+        job.finish(error)
+        return job.state
+
+    def test_outcome(self):
+        for statuses, state in (
+                ([], ProcessingJob.SUCCEEDED),
+                (['succeeded', 'failed'], ProcessingJob.SUCCEEDED),
+                (['failed', 'failed'], ProcessingJob.FAILED),
+                # Skipped streams were not extracted, so they decide nothing
+                (['skipped'], ProcessingJob.SUCCEEDED),
+                (['skipped', 'failed'], ProcessingJob.FAILED),
+                (['skipped', 'succeeded'], ProcessingJob.SUCCEEDED)):
+            with self.subTest(statuses=statuses):
+                self.assertEqual(self.finish(statuses), state)
+
+    def test_error(self):
+        self.assertEqual(self.finish(['succeeded'], error='Boom'), ProcessingJob.FAILED)
+
+
+class FailJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+
+    def test_errback_fails_running_job(self):
+        job = ProcessingJob.objects.create(video=self.video, state=ProcessingJob.RUNNING)
+        fail_job_task(None, RuntimeError('lost'), None, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.FAILED)
+        self.assertIn('lost', job.error)
+
+    def test_errback_leaves_finished_job(self):
+        job = ProcessingJob.objects.create(video=self.video, state=ProcessingJob.SUCCEEDED)
+        fail_job_task(None, RuntimeError('late'), None, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.SUCCEEDED)
+
+    @override_settings(PROCESSING_JOB_TIMEOUT=60)
+    def test_stale_jobs(self):
+        stale = ProcessingJob.objects.create(video=self.video, state=ProcessingJob.RUNNING)
+        recent = ProcessingJob.objects.create(video=self.video, state=ProcessingJob.RUNNING)
+        finished = ProcessingJob.objects.create(video=self.video, state=ProcessingJob.SUCCEEDED)
+        ProcessingJob.objects.filter(id__in=[stale.id, finished.id]).update(
+            created_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(fail_stale_jobs(), 1)
+        states = dict(ProcessingJob.objects.values_list('id', 'state'))
+        self.assertEqual(states, {stale.id: ProcessingJob.FAILED,
+                                  recent.id: ProcessingJob.RUNNING,
+                                  finished.id: ProcessingJob.SUCCEEDED})
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+@override_settings(SUBTITLE_EXTRACTION_MODE='single_pass', SUBTITLE_FANOUT=True,
+                   SUBTITLE_STREAMS_PER_TASK=1)
+class ExtractionFanOutTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.media_root, 'videos'))
+        cls.streams = generate_fixture(os.path.join(cls.media_root, 'videos', 'fixture.mkv'),
+                                       duration=3, tracks=3, cues_per_minute=60,
+                                       size='64x36')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media_root)
+        super().tearDownClass()
+
+    def setUp(self):
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.video = Video.objects.create(title='Fixture', video_file='videos/fixture.mkv')
+        self.job = ProcessingJob.objects.create(video=self.video)
+        for _, language in self.streams:
+            self.addCleanup(
+                lambda path=subtitle_output_path(self.video.video_file.path, language):
+                os.path.exists(path) and os.remove(path))
+
+    def test_chord(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        extract_subtitles_task(self.video.id, self.job.id)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.state, ProcessingJob.SUCCEEDED)
+        self.assertEqual(sorted(result['language'] for result in self.job.stream_results),
+                         sorted(language for _, language in self.streams))
+        self.assertEqual(self.video.subtitles.count(), 3 * len(self.streams))
+
+    def test_chord_failure_fails_the_job(self):
+        with mock.patch('videos.tasks.chord') as chord:
+            extract_subtitles_task(self.video.id, self.job.id)
+        # One group per stream, with an errback failing the job
+        header, = chord.call_args.args
+        self.assertEqual([group.args[1] for group in header],
+                         [[stream] for stream in self.streams])
+        callback, = chord.return_value.call_args.args
+        errback, = callback.options['link_error']
+        self.assertEqual(errback.task, fail_job_task.name)
+
+        errback.clone(args=(None, RuntimeError('Worker lost'), None)).apply()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.state, ProcessingJob.FAILED)
+        self.assertIn('Worker lost', self.job.error)
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+class BitmapStreamTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, SUBTITLE_FANOUT=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root, 'videos'))
+        generate_fixture(os.path.join(media_root, 'videos', 'fixture.mkv'),
+                         duration=3, tracks=1, cues_per_minute=60, size='64x36')
+        self.video = Video.objects.create(title='Fixture', video_file='videos/fixture.mkv')
+
+    def probe_with_bitmaps(self, video):
+        probe_data = get_probe_data(video)
+        # A picture-only language, and an English stream that is also text
+        for index, language in ((8, 'fre'), (9, 'fre'), (10, 'eng')):
+            probe_data['streams'].append({
+                'index': index, 'codec_type': 'subtitle', 'codec_name': 'hdmv_pgs_subtitle',
+                'language': language, 'default': False})
+        return probe_data
+
+    def test_bitmap_streams_are_reported_and_skipped(self):
+        job = ProcessingJob.objects.create(video=self.video)
+        with mock.patch('videos.tasks.get_probe_data', self.probe_with_bitmaps):
+            extract_subtitles_task(self.video.id, job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.SUCCEEDED)
+        self.assertEqual(sorted((result['language'], result['status'])
+                                for result in job.stream_results),
+                         [('eng', 'succeeded'), ('fre', 'skipped')])
+        skipped, = [result for result in job.stream_results if result['status'] == 'skipped']
+        self.assertEqual(skipped['index'], 8)
+        self.assertEqual(skipped['error'],
+                         "Bitmap subtitles (hdmv_pgs_subtitle) cannot be converted to text.")
+        self.assertEqual(set(self.video.subtitles.values_list('language__code', flat=True)),
+                         {'eng'})
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+
+from videos.languages import (UNKNOWN, LanguageRegistry, canonical_language_code,
+                              get_language, language_name, language_tag, registry)
+from videos.models import Language
+
+
+class LanguageCodeTests(SimpleTestCase):
+    def test_aliases(self):
+        self.assertEqual(canonical_language_code('en'), 'eng')
+        self.assertEqual(canonical_language_code('eng'), 'eng')
+        self.assertEqual(canonical_language_code('de'), 'ger')
+        self.assertEqual(canonical_language_code('deu'), 'ger')
+        self.assertEqual(canonical_language_code('iw'), 'heb')
+        self.assertEqual(canonical_language_code('cmn'), 'chi')
+
+    def test_subtags_are_dropped(self):
+        self.assertEqual(canonical_language_code('en-US'), 'eng')
+        self.assertEqual(canonical_language_code('pt_BR'), 'por')
+        self.assertEqual(canonical_language_code(' ZH-Hant-TW '), 'chi')
+
+    def test_unknown(self):
+        self.assertEqual(canonical_language_code(None), UNKNOWN)
+        self.assertEqual(canonical_language_code(''), UNKNOWN)
+        self.assertEqual(canonical_language_code('und'), UNKNOWN)
+        self.assertEqual(canonical_language_code('Klingon'), 'klingon')
+        self.assertEqual(language_name('klingon'), '')
+        self.assertEqual(language_name('eng'), 'English')
+
+    def test_tags(self):
+        self.assertEqual(language_tag('eng'), 'en')
+        self.assertEqual(language_tag('ger'), 'de')
+        self.assertEqual(language_tag(UNKNOWN), 'und')
+        self.assertEqual(language_tag('klingon'), 'klingon')
+
+
+class LanguageRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = LanguageRegistry()
+        Language.objects.create(code='eng', name='English', search_config='english')
+
+    def test_languages_are_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.registry.get('en').code, 'eng')
+            self.assertEqual(self.registry.get('eng-GB').code, 'eng')
+
+    def test_missing_languages_are_created_in_one_query(self):
+        self.registry.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                languages = self.registry.get_many(['fr', 'fre', 'de', 'en'])
+        self.assertEqual({tag: language.code for tag, language in languages.items()},
+                         {'fr': 'fre', 'fre': 'fre', 'de': 'ger', 'en': 'eng'})
+        self.assertEqual(languages['fr'], languages['fre'])
+        french = Language.objects.get(code='fre')
+        self.assertEqual((french.name, french.search_config), ('French', 'french'))
+        with self.assertNumQueries(0):
+            self.registry.get_many(['fr', 'de'])
+
+    def test_languages_created_by_another_process(self):
+        self.registry.warm()
+        german = Language.objects.create(code='ger', name='German', search_config='german')
+        self.assertEqual(self.registry.get('de').id, german.id)
+        self.assertEqual(Language.objects.filter(code='ger').count(), 1)
+
+    def test_rolled_back_languages_are_not_cached(self):
+        self.registry.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.registry.get('fr')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(Language.objects.filter(code='fre').exists())
+        self.assertNotIn('fre', self.registry.languages)
+        self.assertTrue(Language.objects.filter(id=self.registry.get('fr').id).exists())
+
+    def test_edited_languages_are_reloaded(self):
+        registry.warm()
+        self.addCleanup(registry.clear)
+        Language.objects.filter(code='eng').delete()
+        # Bulk deletes send the signal for each row
+        self.assertNotIn('eng', registry.languages)
+        english = get_language('en')
+        self.assertTrue(Language.objects.filter(id=english.id).exists())
@@ -0,0 +1,98 @@
+import datetime
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from videos.models import Language, Subtitle, Video
+from videos.parsers import Cue
+from videos.search import search_config_for, search_library, top_hits
+from videos.tasks import build_subtitles, insert_subtitles
+
+
+class LibrarySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.english = Language.objects.create(
+            code='eng', name='English', search_config=search_config_for('eng'))
+        cls.french = Language.objects.create(
+            code='fre', name='French', search_config=search_config_for('fre'))
+        cls.one = Video.objects.create(title='One', video_file='videos/one.mkv')
+        cls.two = Video.objects.create(title='Two', video_file='videos/two.mkv')
+        cls.three = Video.objects.create(title='Three', video_file='videos/three.mkv')
+        Video.objects.filter(id=cls.three.id).update(
+            uploaded_at=timezone.now() - datetime.timedelta(days=30))
+        for video, language, contents in (
+                (cls.one, cls.english, ['The dog barks', 'A dog and a cat', 'No match']),
+                (cls.two, cls.english, ['The dog', 'Two dogs', 'Three dogs', 'More dogs']),
+                (cls.three, cls.french, ['Un dog français'])):
+            cues = (Cue(f'00:{i:02}.000', f'00:{i:02}.500', content)
+                    for i, content in enumerate(contents))
+            insert_subtitles(build_subtitles(cues, video, language))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_groups_by_video_most_hits_first(self):
+        groups, capped = search_library(Subtitle.objects.all(), 'dog', 'icontains')
+        self.assertEqual(groups, [{'video_id': self.two.id, 'hits': 4},
+                                  {'video_id': self.one.id, 'hits': 2},
+                                  {'video_id': self.three.id, 'hits': 1}])
+        self.assertFalse(capped)
+
+    def test_capped(self):
+        groups, capped = search_library(Subtitle.objects.all(), 'dog', 'icontains',
+                                        max_matches=3)
+        self.assertEqual(sum(group['hits'] for group in groups), 3)
+        self.assertTrue(capped)
+
+    def test_top_hits(self):
+        hits = top_hits(Subtitle.objects.all(), [self.two.id, self.one.id], 'dog',
+                        'icontains', per_video=2)
+        self.assertEqual(list(hits), [self.two.id, self.one.id])
+        # Earliest matches first without a rank
+        self.assertEqual([hit.content for hit in hits[self.two.id]],
+                         ['The dog', 'Two dogs'])
+        self.assertEqual([hit.content for hit in hits[self.one.id]],
+                         ['The dog barks', 'A dog and a cat'])
+        self.assertEqual(top_hits(Subtitle.objects.all(), [], 'dog', 'icontains'), {})
+
+    def test_top_hits_are_ranked(self):
+        hits = top_hits(Subtitle.objects.all(), [self.one.id], 'dog bark',
+                        'fulltext', per_video=1)
+        self.assertEqual([hit.content for hit in hits[self.one.id]], ['The dog barks'])
+        self.assertEqual(hits[self.one.id][0].snippet,
+                         'The <mark>dog</mark> <mark>barks</mark>')
+
+    def test_view(self):
+        response = self.client.get(reverse('subtitles-search'),
+                                   {'query': 'dog', 'mode': 'icontains', 'top': 1})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertFalse(data['capped'])
+        self.assertEqual(
+            [(result['video']['id'], result['hits'], [hit['content'] for hit in result['top']])
+             for result in data['results']],
+            [(self.two.id, 4, ['The dog']), (self.one.id, 2, ['The dog barks']),
+             (self.three.id, 1, ['Un dog français'])])
+
+    def test_view_filters(self):
+        url = reverse('subtitles-search')
+        week_ago = (timezone.now() - datetime.timedelta(days=7)).date().isoformat()
+        for params, expected in (({'language': 'fr'}, [self.three.id]),
+                                 ({'uploaded_after': week_ago}, [self.two.id, self.one.id]),
+                                 ({'uploaded_before': week_ago}, [self.three.id])):
+            with self.subTest(params=params):
+                response = self.client.get(url, {'query': 'dog', 'mode': 'icontains',
+                                                 **params})
+                self.assertEqual([result['video']['id'] for result in response.json()['results']],
+                                 expected)
+
+    def test_view_rejects_invalid_parameters(self):
+        url = reverse('subtitles-search')
+        for params in ({'query': 'dog', 'top': 'many'}, {'query': 'dog', 'top': 0},
+                       {'query': 'dog', 'uploaded_after': 'yesterday'}, {'query': ''}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
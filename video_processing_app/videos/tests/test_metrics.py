@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from videos.metrics import record_stage, span
+from videos.models import Video
+from videos.profiling import profilers, save_task_profile, start_task_profile
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, url, **kwargs):
+        with mock.patch('videos.middleware.record_request') as record_request:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, **kwargs)
+        record_request.assert_called_once()
+        return record_request.call_args.args, len(queries)
+
+    def test_queries_are_counted_per_request(self):
+        (endpoint, method, status, seconds, count, query_seconds), queries = self.request(
+            reverse('video-list'))
+        self.assertEqual((endpoint, method, status), ('video-list', 'GET', 200))
+        self.assertGreater(queries, 0)
+        self.assertEqual(count, queries)
+        self.assertGreaterEqual(seconds, query_seconds)
+        self.assertGreater(query_seconds, 0)
+
+    def test_requests_without_queries(self):
+        args, _ = self.request(reverse('query-cache-stats'))
+        self.assertEqual(args[:3] + args[4:5], ('query-cache-stats', 'GET', 200, 0))
+
+    def test_unmatched(self):
+        args, _ = self.request('/api/nowhere/')
+        self.assertEqual(args[:3], ('unmatched', 'GET', 404))
+
+    async def test_async_views(self):
+        with mock.patch('videos.middleware.record_request') as record_request:
+            response = await self.async_client.get(reverse('async-video-list'))
+        self.assertEqual(response.status_code, 200)
+        endpoint, method, status, _, count, _ = record_request.call_args.args
+        self.assertEqual((endpoint, method, status), ('async-video-list', 'GET', 200))
+        self.assertGreater(count, 0)
+
+    def test_metrics_view(self):
+        self.client.get(reverse('video-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'api_request_queries_bucket{endpoint="video-list"', response.content)
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+
+class StageMetricsTests(SimpleTestCase):
+    def sample(self, stage, language):
+        return REGISTRY.get_sample_value(
+            'video_stage_seconds_count', {'stage': stage, 'language': language}) or 0
+
+    def test_record_stage(self):
+        before = self.sample('parse', 'eng')
+        with self.assertLogs('videos.metrics') as logs:
+            record_stage('parse', 0.25, 'eng', video_id=7)
+        self.assertEqual(self.sample('parse', 'eng'), before + 1)
+        self.assertEqual(logs.records[0].span, {
+            'stage': 'parse', 'language': 'eng', 'seconds': 0.25, 'video_id': 7})
+
+    def test_span(self):
+        before = self.sample('probe', 'all')
+        with self.assertLogs('videos.metrics'):
+            with self.assertRaises(ValueError):
+                with span('probe', language=None):
+                    raise ValueError
+        self.assertEqual(self.sample('probe', 'all'), before + 1)
+
+
+class TaskProfileTests(SimpleTestCase):
+    task = SimpleNamespace(name='videos.tasks.extract_subtitles_task')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.profile_dir = os.path.join(directory, 'profiles')
+
+    def run_task(self, rate):
+        with override_settings(TASK_PROFILE_RATES={self.task.name: rate},
+                               TASK_PROFILE_DIR=self.profile_dir):
+            start_task_profile(task_id='abc', task=self.task)
+            sum(range(1000))
+            save_task_profile(task_id='abc', task=self.task)
+
+    def test_sampled_runs_are_profiled(self):
+        with self.assertLogs('videos.profiling'):
+            self.run_task(1)
+        self.assertEqual(os.listdir(self.profile_dir),
+                         ['videos.tasks.extract_subtitles_task-abc.prof'])
+        self.assertEqual(profilers, {})
+
+    def test_other_runs_are_not(self):
+        self.run_task(0)
+        self.assertFalse(os.path.exists(self.profile_dir))
@@ -0,0 +1,124 @@
+import io
+
+from django.test import SimpleTestCase
+
+from videos.parsers import (Cue, iter_ass_cues, iter_srt_cues, iter_vtt_cues,
+                            timestamp_to_ms)
+
+
+def lines(text):
+    """Split a document into lines as a file would yield them."""
+    return io.StringIO(text)
+
+
+class VttParserTests(SimpleTestCase):
+    def test_cues(self):
+        document = (
+            "WEBVTT - with a title\n"
+            "\n"
+            "NOTE a comment\n"
+            "spanning lines\n"
+            "\n"
+            "STYLE\n"
+            "::cue { color: yellow }\n"
+            "\n"
+            "intro\n"
+            "00:01.000 --> 00:04.000 align:start position:10%\n"
+            "First line\n"
+            "second line\n"
+            "\n"
+            "01:00:00.500 --> 01:00:01.000\n"
+            "Last\n"
+        )
+        self.assertEqual(list(iter_vtt_cues(lines(document))), [
+            Cue('00:01.000', '00:04.000', 'First line second line'),
+            Cue('01:00:00.500', '01:00:01.000', 'Last'),
+        ])
+
+    def test_cues_are_yielded_as_read(self):
+        def document():
+            yield "WEBVTT\n"
+            yield "\n"
+            yield "00:01.000 --> 00:02.000\n"
+            yield "First\n"
+            yield "\n"
+            raise AssertionError("Read past the first cue")
+
+        self.assertEqual(next(iter_vtt_cues(document())),
+                         Cue('00:01.000', '00:02.000', 'First'))
+
+    def test_tags_are_dropped(self):
+        document = (
+            "WEBVTT\n"
+            "\n"
+            "00:01.000 --> 00:02.000\n"
+            "<v Bob><i>Hello</i> &amp; <c.yellow>bye</c> <00:01.500>now\n"
+            "\n"
+            "00:03.000 --> 00:04.000\n"
+            "<b></b>\n"
+        )
+        self.assertEqual(list(iter_vtt_cues(lines(document))), [
+            Cue('00:01.000', '00:02.000', 'Hello & bye now'),
+        ])
+
+
+class SrtParserTests(SimpleTestCase):
+    def test_cues(self):
+        document = (
+            "\ufeff1\r\n"
+            "00:00:01,000 --> 00:00:02,500\r\n"
+            "<i>Hello</i> {\\an8}there\r\n"
+            "<font color=\"red\">friend</font>\r\n"
+            "\r\n"
+            "00:00:03,000 --> 00:00:04,000\r\n"
+            "No number\r\n"
+        )
+        self.assertEqual(list(iter_srt_cues(lines(document))), [
+            Cue('00:00:01,000', '00:00:02,500', 'Hello there friend'),
+            Cue('00:00:03,000', '00:00:04,000', 'No number'),
+        ])
+
+    def test_empty_cues_are_skipped(self):
+        document = "1\n00:00:01,000 --> 00:00:02,000\n<i></i>\n\n"
+        self.assertEqual(list(iter_srt_cues(lines(document))), [])
+
+
+class AssParserTests(SimpleTestCase):
+    def test_cues(self):
+        document = (
+            "[Script Info]\n"
+            "Title: Sample\n"
+            "\n"
+            "[Events]\n"
+            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+            "Comment: 0,0:00:00.00,0:00:01.00,Default,,0,0,0,,Not shown\n"
+            "Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,{\\i1}Hello{\\i0}, world\\Nagain\n"
+            "Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,Second speaker\n"
+            "Dialogue: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,{\\p1}m 0 0 l 10 10{\\p0}\n"
+            "Dialogue: 0,0:00:05.00,0:00:06.00,Default,,0,0,0,,Last\n"
+        )
+        self.assertEqual(list(iter_ass_cues(lines(document))), [
+            Cue('0:00:01.00', '0:00:02.50', 'Hello, world again Second speaker'),
+            Cue('0:00:05.00', '0:00:06.00', 'Last'),
+        ])
+
+    def test_default_format(self):
+        document = "[Events]\nDialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Hi\n"
+        self.assertEqual(list(iter_ass_cues(lines(document))), [
+            Cue('0:00:01.00', '0:00:02.00', 'Hi'),
+        ])
+
+
+class TimestampTests(SimpleTestCase):
+    def test_timestamp_to_ms(self):
+        self.assertEqual(timestamp_to_ms('00:00:01.500'), 1500)
+        self.assertEqual(timestamp_to_ms('00:00:01,500'), 1500)
+        self.assertEqual(timestamp_to_ms('01:02.003'), 62003)
+        self.assertEqual(timestamp_to_ms('1:00:00.00'), 3600000)
+        self.assertEqual(timestamp_to_ms('596:31:23.647'), 2147483647)
+
+    def test_invalid_timestamps(self):
+        for timestamp in ('1.5', 'aa:bb.cc', '00:-01.000', '00:00:nan', '00:00:inf',
+                          '00:00:-inf', '596:31:23.648', '999999:00:00.000'):
+            with self.subTest(timestamp=timestamp):
+                self.assertIsNone(timestamp_to_ms(timestamp))
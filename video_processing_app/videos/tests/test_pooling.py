@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from video_processing_app.celery import close_database_pools
+
+# Prints the connection settings the project settings produce
+SHOW_DATABASE = """
+import json, sys, types
+if sys.argv[1] == 'eventlet':
+    eventlet = types.ModuleType('eventlet')
+    eventlet.patcher = types.SimpleNamespace(is_monkey_patched=lambda name: True)
+    sys.modules['eventlet'] = eventlet
+from video_processing_app import settings
+print(json.dumps(settings.DATABASES['default']))
+"""
+
+
+class PoolSettingsTests(SimpleTestCase):
+    def database(self, eventlet=False, **environ):
+        env = {name: value for name, value in os.environ.items()
+               if not name.startswith('DB_')}
+        env.update(environ)
+        output = subprocess.run(
+            [sys.executable, '-c', SHOW_DATABASE, 'eventlet' if eventlet else ''],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            check=True).stdout
+        return json.loads(output)
+
+    def test_pool_by_default(self):
+        database = self.database()
+        self.assertEqual(database['OPTIONS']['pool'],
+                         {'min_size': 2, 'max_size': 10, 'timeout': 10, 'max_idle': 300})
+        self.assertNotIn('CONN_MAX_AGE', database)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+
+    def test_pool_sizes(self):
+        database = self.database(DB_POOL_MIN_SIZE='1', DB_POOL_MAX_SIZE='4',
+                                 DB_POOL_TIMEOUT='2.5', DB_POOL_MAX_IDLE='60')
+        self.assertEqual(database['OPTIONS']['pool'],
+                         {'min_size': 1, 'max_size': 4, 'timeout': 2.5, 'max_idle': 60})
+
+    def test_persistent_connections(self):
+        database = self.database(DB_POOL='0', DB_CONN_MAX_AGE='30')
+        self.assertNotIn('OPTIONS', database)
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+
+    def test_eventlet(self):
+        database = self.database(eventlet=True)
+        self.assertNotIn('OPTIONS', database)
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+
+
+class CloseDatabasePoolsTests(SimpleTestCase):
+    def test_pools_are_closed(self):
+        pooled = mock.Mock()
+        unpooled = mock.Mock(spec=['close'])
+        with mock.patch('django.db.connections.all', return_value=[pooled, unpooled]):
+            close_database_pools()
+        pooled.close_pool.assert_called_once_with()
+        unpooled.close.assert_not_called()
@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from videos.bench import generate_fixture
+from videos.models import Language, Video, VideoPreview
+from videos.parsers import Cue
+from videos.previews import (describe_tile, generate_preview, get_previews,
+                             render_thumbnail_track)
+from videos.search import search_config_for
+from videos.tasks import build_subtitles, insert_subtitles
+
+
+def make_preview(**fields):
+    fields = {'interval': 10, 'tile_width': 160, 'tile_height': 90, 'columns': 2,
+              'rows': 2, 'thumbnail_count': 6, 'keyframes': [0, 4000, 12000, 30000],
+              'sprites': ['previews/1/a/sprite_001.jpg', 'previews/1/a/sprite_002.jpg'],
+              **fields}
+    return VideoPreview(**fields)
+
+
+class TileTests(SimpleTestCase):
+    def test_tile_at(self):
+        preview = make_preview()
+        self.assertEqual(preview.tile_at(0), (0, 0, 0))
+        self.assertEqual(preview.tile_at(9999), (0, 0, 0))
+        self.assertEqual(preview.tile_at(10000), (0, 160, 0))
+        self.assertEqual(preview.tile_at(25000), (0, 0, 90))
+        self.assertEqual(preview.tile_at(45000), (1, 0, 0))
+        self.assertEqual(preview.tile_at(55000), (1, 160, 0))
+        # Past the end, the last thumbnail
+        self.assertEqual(preview.tile_at(600000), (1, 160, 0))
+        self.assertIsNone(make_preview(thumbnail_count=0).tile_at(0))
+
+    def test_keyframe_at(self):
+        preview = make_preview()
+        self.assertEqual(preview.keyframe_at(0), 0)
+        self.assertEqual(preview.keyframe_at(11999), 4000)
+        self.assertEqual(preview.keyframe_at(12000), 12000)
+        self.assertEqual(preview.keyframe_at(99999), 30000)
+        self.assertIsNone(make_preview(keyframes=[500]).keyframe_at(0))
+
+    def test_thumbnail_track(self):
+        track = render_thumbnail_track(make_preview(thumbnail_count=3), duration_ms=25500)
+        self.assertEqual(track, (
+            "WEBVTT\n\n"
+            "00:00:00.000 --> 00:00:10.000\n/media/previews/1/a/sprite_001.jpg#xywh=0,0,160,90\n\n"
+            "00:00:10.000 --> 00:00:20.000\n/media/previews/1/a/sprite_001.jpg#xywh=160,0,160,90\n\n"
+            "00:00:20.000 --> 00:00:25.500\n/media/previews/1/a/sprite_001.jpg#xywh=0,90,160,90\n"))
+
+    def test_describe_tile(self):
+        self.assertEqual(describe_tile(make_preview(), 55000), {
+            'sprite': '/media/previews/1/a/sprite_002.jpg', 'x': 160, 'y': 0,
+            'width': 160, 'height': 90, 'keyframe_ms': 30000})
+        self.assertIsNone(describe_tile(None, 0))
+        self.assertIsNone(describe_tile(make_preview(thumbnail_count=0), 0))
+
+
+class PreviewViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.original = Video.objects.create(title='Original', video_file='videos/a.mkv')
+        cls.duplicate = Video.objects.create(title='Copy', video_file='videos/a.mkv',
+                                             duplicate_of=cls.original)
+        cls.other = Video.objects.create(title='Other', video_file='videos/b.mkv')
+        cls.preview = make_preview(video=cls.original, probe_key='key',
+                                   track_file='previews/1/a/thumbnails.vtt')
+        cls.preview.save()
+        language = Language.objects.create(
+            code='eng', name='English', search_config=search_config_for('eng'))
+        insert_subtitles(build_subtitles(
+            [Cue('00:55.000', '00:56.000', 'A dog')], cls.duplicate, language))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_duplicates_share_the_preview(self):
+        previews = get_previews([self.original.id, self.duplicate.id, self.other.id])
+        self.assertEqual(previews, {self.original.id: self.preview,
+                                    self.duplicate.id: self.preview})
+
+    def test_view(self):
+        url = reverse('video-preview', args=[self.duplicate.id])
+        data = self.client.get(url, {'t': 12500}).json()
+        self.assertEqual(data['thumbnails'],
+                         'http://testserver/media/previews/1/a/thumbnails.vtt')
+        self.assertEqual(data['keyframes'], [0, 4000, 12000, 30000])
+        self.assertEqual(data['tile'], {
+            'sprite': 'http://testserver/media/previews/1/a/sprite_001.jpg',
+            'x': 160, 'y': 0, 'width': 160, 'height': 90, 'keyframe_ms': 12000})
+        self.assertIsNone(self.client.get(url).json()['tile'])
+
+    def test_view_errors(self):
+        url = reverse('video-preview', args=[self.original.id])
+        for t in ('soon', '-1'):
+            with self.subTest(t=t):
+                self.assertEqual(self.client.get(url, {'t': t}).status_code, 400)
+        for video_id in (self.other.id, self.other.id + 100):
+            with self.subTest(video_id=video_id):
+                response = self.client.get(reverse('video-preview', args=[video_id]))
+                self.assertEqual(response.status_code, 404)
+
+    def test_search_results_point_at_thumbnails(self):
+        response = self.client.get(
+            reverse('video-subtitles-search', args=[self.duplicate.id]), {'query': 'dog'})
+        self.assertEqual(response.json()[0]['preview']['sprite'],
+                         'http://testserver/media/previews/1/a/sprite_002.jpg')
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+@override_settings(PREVIEW_INTERVAL=2, PREVIEW_TILE_SIZE=(32, 18), PREVIEW_SPRITE_GRID=(2, 1))
+class GeneratePreviewTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root, 'videos'))
+        generate_fixture(os.path.join(media_root, 'videos', 'fixture.mkv'),
+                         duration=6, tracks=0, size='64x36')
+        self.video = Video.objects.create(
+            title='Fixture', video_file='videos/fixture.mkv', probe_data={'duration': 6.0})
+
+    def test_generate(self):
+        preview = generate_preview(self.video)
+        # A thumbnail at 0, 2 and 4 seconds, two per sheet
+        self.assertEqual(preview.thumbnail_count, 3)
+        self.assertEqual(len(preview.sprites), 2)
+        self.assertTrue(all(default_storage.exists(name) for name in preview.sprites))
+        self.assertEqual(preview.keyframes[0], 0)
+        self.assertEqual(preview.keyframes, sorted(preview.keyframes))
+        with preview.track_file.open('rb') as file:
+            track = file.read().decode()
+        self.assertTrue(track.endswith('#xywh=0,0,32,18\n'))
+        self.assertIn('00:00:04.000 --> 00:00:06.000', track)
+
+    def test_regenerated_only_when_needed(self):
+        preview = generate_preview(self.video)
+        with self.assertNumQueries(1):
+            self.assertEqual(generate_preview(self.video).sprites, preview.sprites)
+
+        old_files = [preview.track_file.name, *preview.sprites]
+        forced = generate_preview(self.video, force=True)
+        self.assertEqual(forced.id, preview.id)
+        self.assertNotEqual(forced.sprites, preview.sprites)
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+
+        with override_settings(PREVIEW_INTERVAL=1):
+            self.assertEqual(generate_preview(self.video).thumbnail_count, 6)
+
+    def test_changed_file_is_previewed_again(self):
+        self.assertEqual(generate_preview(self.video).thumbnail_count, 3)
+        generate_fixture(self.video.video_file.path, duration=2, tracks=0, size='64x36')
+        self.assertEqual(generate_preview(self.video).thumbnail_count, 1)
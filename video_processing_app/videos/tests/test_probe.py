@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from videos.bench import generate_fixture
+from videos.models import Video
+from videos.probe import (file_probe_key, get_probe_data, is_bitmap_subtitle,
+                          probe_video, subtitle_streams)
+
+
+@skipUnless(shutil.which('ffprobe'), "ffprobe is not installed")
+class ProbeVideoTests(SimpleTestCase):
+    def test_streams(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'fixture.mkv')
+        generate_fixture(path, duration=2, tracks=2, cues_per_minute=60, size='64x36')
+
+        probe_data = probe_video(path)
+        self.assertAlmostEqual(probe_data['duration'], 2, delta=0.1)
+        self.assertEqual(
+            [(stream['index'], stream['codec_type'], stream['language'])
+             for stream in subtitle_streams(probe_data)],
+            [(1, 'subtitle', 'eng'), (2, 'subtitle', 'rus')])
+        self.assertFalse(any(is_bitmap_subtitle(stream)
+                             for stream in subtitle_streams(probe_data)))
+
+
+class ProbeCacheTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        name = default_storage.save('videos/movie.mkv', ContentFile(b'content'))
+        self.video = Video.objects.create(title='Movie', video_file=name)
+        self.probe_data = {'duration': 1.0, 'streams': []}
+        patcher = mock.patch('videos.probe.probe_video', return_value=self.probe_data)
+        self.probe_video = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_probed_once(self):
+        self.assertEqual(get_probe_data(self.video), self.probe_data)
+        # Stored, so a fresh instance does not probe either
+        video = Video.objects.get(id=self.video.id)
+        self.assertEqual(video.probe_data, self.probe_data)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_probe_data(video), self.probe_data)
+        self.assertEqual(self.probe_video.call_count, 1)
+
+    def test_changed_file_is_probed_again(self):
+        get_probe_data(self.video)
+        path = self.video.video_file.path
+        with open(path, 'ab') as file:
+            file.write(b' and more')
+        get_probe_data(self.video)
+        self.assertEqual(self.probe_video.call_count, 2)
+        self.assertEqual(Video.objects.get(id=self.video.id).probe_key,
+                         file_probe_key(path))
+
+    def test_refresh(self):
+        get_probe_data(self.video)
+        get_probe_data(self.video, refresh=True)
+        self.assertEqual(self.probe_video.call_count, 2)
+
+    def test_key_includes_the_content_hash(self):
+        path = self.video.video_file.path
+        self.assertNotEqual(file_probe_key(path), file_probe_key(path, 'a' * 64))
+        self.assertEqual(file_probe_key(path, 'a' * 64), file_probe_key(path, 'a' * 64))
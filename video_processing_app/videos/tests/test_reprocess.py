@@ -0,0 +1,126 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from videos.bench import generate_fixture
+from videos.models import ProcessingJob, Video
+from videos.tasks import extract_subtitles_task, subtitle_output_path
+
+
+class VideoReprocessViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+
+    def reprocess(self, video_id):
+        return self.client.post(reverse('video-reprocess', args=[video_id]))
+
+    @mock.patch('videos.tasks.queue_media_tasks')
+    @mock.patch('videos.tasks.extract_subtitles_task')
+    def test_queues_a_job(self, extract_task, queue_media_tasks):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.reprocess(self.video.id)
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get(id=response.json()['id'])
+        self.assertEqual(job.state, ProcessingJob.PENDING)
+        extract_task.delay.assert_called_once_with(self.video.id, job.id, True)
+
+    def test_busy_video(self):
+        ProcessingJob.objects.create(video=self.video, state=ProcessingJob.RUNNING)
+        self.assertEqual(self.reprocess(self.video.id).status_code, 409)
+        self.assertEqual(self.video.jobs.count(), 1)
+
+    def test_duplicate(self):
+        duplicate = Video.objects.create(title='Copy', video_file='videos/sample.mkv',
+                                         duplicate_of=self.video)
+        response = self.reprocess(duplicate.id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['original'], self.video.id)
+
+    def test_unknown_video(self):
+        self.assertEqual(self.reprocess(self.video.id + 100).status_code, 404)
+
+
+class ReprocessCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+
+    def call(self, *args):
+        stdout = io.StringIO()
+        call_command('reprocess_subtitles', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_skips_busy_videos_and_duplicates(self):
+        ProcessingJob.objects.create(video=self.video, state=ProcessingJob.RUNNING)
+        duplicate = Video.objects.create(title='Copy', video_file='videos/sample.mkv',
+                                         duplicate_of=self.video)
+        output = self.call(str(self.video.id), str(duplicate.id), '--inline')
+        self.assertIn(f"Skipping video {self.video.id}: it is already being processed.",
+                      output)
+        self.assertIn(f"Skipping video {duplicate.id}: duplicate of video {self.video.id}.",
+                      output)
+        self.assertEqual(ProcessingJob.objects.count(), 1)
+
+    @mock.patch('videos.management.commands.reprocess_subtitles.wait_for_capacity')
+    @mock.patch('videos.tasks.queue_media_tasks')
+    @mock.patch('videos.tasks.extract_subtitles_task')
+    def test_queues_jobs(self, extract_task, queue_media_tasks, wait_for_capacity):
+        with self.captureOnCommitCallbacks(execute=True):
+            output = self.call('--all', '--max-in-flight', '10')
+        job = self.video.jobs.get()
+        self.assertIn(f"Queued video {self.video.id} (job {job.id}).", output)
+        wait_for_capacity.assert_called_once_with(10)
+        extract_task.delay.assert_called_once_with(self.video.id, job.id, True)
+
+    def test_invalid_arguments(self):
+        with self.assertRaisesMessage(CommandError, "Give video IDs or --all."):
+            self.call()
+        with self.assertRaisesMessage(CommandError, f"Videos not found: {self.video.id + 100}"):
+            self.call(str(self.video.id), str(self.video.id + 100))
+
+
+@skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+@override_settings(SUBTITLE_EXTRACTION_MODE='single_pass', SUBTITLE_FANOUT=False)
+class InlineReprocessTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.media_root, 'videos'))
+        generate_fixture(os.path.join(cls.media_root, 'videos', 'fixture.mkv'),
+                         duration=3, tracks=1, cues_per_minute=60, size='64x36')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media_root)
+        super().tearDownClass()
+
+    def setUp(self):
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.video = Video.objects.create(title='Fixture', video_file='videos/fixture.mkv')
+        self.addCleanup(os.remove, subtitle_output_path(self.video.video_file.path, 'eng'))
+
+    def test_only_changes_are_applied(self):
+        extract_subtitles_task(self.video.id)
+        first = self.video.subtitles.order_by('start_ms').first()
+        first.content = 'Edited'
+        first.save()
+        self.video.subtitles.order_by('start_ms').last().delete()
+
+        stdout = io.StringIO()
+        call_command('reprocess_subtitles', str(self.video.id), '--inline', stdout=stdout)
+        self.assertIn(f"Video {self.video.id}: succeeded", stdout.getvalue())
+        self.assertIn("eng: succeeded: 0 deleted, 1 updated, 1 inserted, 1 unchanged",
+                      stdout.getvalue())
+        first.refresh_from_db()
+        self.assertNotEqual(first.content, 'Edited')
+        self.assertEqual(self.video.subtitles.count(), 3)
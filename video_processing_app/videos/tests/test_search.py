@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from videos.models import Language, Subtitle, Video
+from videos.parsers import Cue
+from videos.search import search_config_for, search_subtitles
+from videos.tasks import build_subtitles, insert_subtitles
+
+
+def has_pg_trgm():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.english = Language.objects.create(
+            code='eng', name='English', search_config=search_config_for('eng'))
+        cls.french = Language.objects.create(
+            code='fre', name='French', search_config=search_config_for('fre'))
+        for language, cues in ((cls.english, [('00:01.000', '00:02.000', 'The dog runs home'),
+                                              ('00:03.000', '00:04.000', 'Running late again'),
+                                              ('00:05.000', '00:06.000', 'A hotdog stand')]),
+                               (cls.french, [('00:01.000', '00:02.000', 'Les chiens courent')])):
+            insert_subtitles(build_subtitles(
+                (Cue(*cue) for cue in cues), cls.video, language))
+
+    def setUp(self):
+        cache.clear()
+
+    def contents(self, term, mode):
+        return [subtitle.content
+                for subtitle in search_subtitles(self.video.subtitles.all(), term, mode)]
+
+    def test_fulltext_stems_words(self):
+        self.assertEqual(sorted(self.contents('run', 'fulltext')),
+                         ['Running late again', 'The dog runs home'])
+        self.assertEqual(self.contents('chien', 'fulltext'), ['Les chiens courent'])
+        # Whole words only
+        self.assertEqual(self.contents('dog', 'fulltext'), ['The dog runs home'])
+
+    def test_fulltext_is_ranked_and_highlighted(self):
+        matches = list(search_subtitles(self.video.subtitles.all(), 'dog home', 'fulltext'))
+        self.assertEqual([match.content for match in matches], ['The dog runs home'])
+        self.assertGreater(matches[0].rank, 0)
+        self.assertEqual(matches[0].snippet, 'The <mark>dog</mark> runs <mark>home</mark>')
+
+    def test_icontains_matches_substrings(self):
+        self.assertEqual(self.contents('DOG', 'icontains'),
+                         ['The dog runs home', 'A hotdog stand'])
+
+    def test_auto_adds_substring_matches(self):
+        self.assertEqual(sorted(self.contents('dog', 'auto')),
+                         ['A hotdog stand', 'The dog runs home'])
+
+    def test_trigram_matches_misspellings(self):
+        if not has_pg_trgm():
+            self.skipTest("pg_trgm is not installed")
+        self.assertIn('The dog runs home', self.contents('hoem', 'trigram'))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            search_subtitles(Subtitle.objects.all(), 'dog', 'regex')
+
+    def test_view(self):
+        url = reverse('video-subtitles-search', args=[self.video.id])
+        response = self.client.get(url, {'query': 'runs', 'mode': 'fulltext',
+                                         'language': 'eng'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['content'] for result in response.json()],
+                         ['The dog runs home', 'Running late again'])
+
+    def test_view_rejects_invalid_parameters(self):
+        url = reverse('video-subtitles-search', args=[self.video.id])
+        for params in ({'query': ' '}, {'query': 'dog', 'mode': 'regex'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+        response = self.client.get(
+            reverse('video-subtitles-search', args=[self.video.id + 1]), {'query': 'dog'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,149 @@
+import codecs
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from videos.models import Language, ProcessingJob, Video
+from videos.sidecars import detect_encoding, guess_sidecar_language, iter_sidecar_cues
+from videos.tasks import import_sidecar_task
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\nCafé\n\n2\n00:00:03,000 --> 00:00:04,500\nBye\n"
+
+
+class SidecarTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_guess_language(self):
+        for filename, code in (('movie.en.srt', 'eng'), ('movie.pt-BR.ass', 'por'),
+                               ('dir.fr/movie.DE.vtt', 'ger'), ('movie.srt', None),
+                               ('movie.final.srt', None)):
+            with self.subTest(filename=filename):
+                self.assertEqual(guess_sidecar_language(filename), code)
+
+    def test_detect_encoding(self):
+        for content, encoding in ((SRT.encode('utf-8'), 'utf-8'),
+                                  (codecs.BOM_UTF8 + SRT.encode('utf-8'), 'utf-8-sig'),
+                                  (SRT.encode('utf-16'), 'utf-16'),
+                                  (SRT.encode('cp1252'), 'cp1252')):
+            with self.subTest(encoding=encoding):
+                file = io.BytesIO(content)
+                self.assertEqual(detect_encoding(file), encoding)
+                self.assertEqual(file.tell(), 0)
+
+    def test_cues(self):
+        for name, content in (('a.srt', SRT.encode('cp1252')),
+                              ('b.srt', SRT.encode('utf-16')),
+                              ('c.vtt', b'WEBVTT\n\n00:01.000 --> 00:02.000\n<i>Caf\xc3\xa9</i>\n'),
+                              ('d.ass', b'[Events]\nDialogue: 0,0:00:01.00,0:00:02.00,'
+                                        b'Default,,0,0,0,,Caf\xc3\xa9\n')):
+            with self.subTest(name=name):
+                name = default_storage.save(name, ContentFile(content))
+                self.assertEqual(next(iter_sidecar_cues(name)).text, 'Café')
+
+
+class SubtitleUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def upload(self, filename, video=None, **data):
+        url = reverse('video-subtitles-upload', args=[(video or self.video).id])
+        file = SimpleUploadedFile(filename, SRT.encode('utf-8'))
+        with mock.patch('videos.tasks.import_sidecar_task.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {'file': file, **data})
+        return response, delay
+
+    def test_upload(self):
+        response, delay = self.upload('movie.en.srt')
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get(id=response.json()['id'])
+        self.assertEqual(job.state, ProcessingJob.PENDING)
+        video_id, job_id, name, language_code = delay.call_args.args
+        self.assertEqual((video_id, job_id, language_code), (self.video.id, job.id, 'eng'))
+        self.assertTrue(name.startswith(f'sidecars/{self.video.id}/'))
+        self.assertTrue(default_storage.exists(name))
+
+    def test_explicit_language(self):
+        response, delay = self.upload('movie.en.srt', language='pt-BR')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(delay.call_args.args[3], 'por')
+
+    def test_invalid_uploads(self):
+        duplicate = Video.objects.create(title='Copy', video_file='videos/sample.mkv',
+                                         duplicate_of=self.video)
+        for filename, data, video in (('movie.en.sub', {}, None),
+                                      ('movie.srt', {}, None),
+                                      ('movie.en.srt', {'language': 'klingon'}, None),
+                                      ('movie.en.srt', {}, duplicate)):
+            with self.subTest(filename=filename, data=data):
+                response, delay = self.upload(filename, video, **data)
+                self.assertEqual(response.status_code, 400)
+                delay.assert_not_called()
+        with override_settings(SIDECAR_MAX_SIZE=10):
+            self.assertEqual(self.upload('movie.en.srt')[0].status_code, 400)
+
+    def test_unknown_video(self):
+        response, _ = self.upload('movie.en.srt', Video(id=self.video.id + 100))
+        self.assertEqual(response.status_code, 404)
+
+    def test_video_being_processed(self):
+        ProcessingJob.objects.create(video=self.video, state=ProcessingJob.RUNNING)
+        response, delay = self.upload('movie.en.srt')
+        self.assertEqual(response.status_code, 409)
+        delay.assert_not_called()
+
+    def test_import(self):
+        _, delay = self.upload('movie.en.srt')
+        import_sidecar_task(*delay.call_args.args)
+        job = ProcessingJob.objects.get(id=delay.call_args.args[1])
+        self.assertEqual(job.state, ProcessingJob.SUCCEEDED)
+        self.assertEqual(job.stream_results[0]['cues'], 2)
+        self.assertEqual(list(self.video.subtitles.order_by('start_ms').values_list(
+            'timestamp_start', 'timestamp_end', 'content')),
+            [('00:00:01.000', '00:00:02.000', 'Café'), ('00:00:03.000', '00:00:04.500', 'Bye')])
+        self.assertEqual(Language.objects.get().code, 'eng')
+        # The stored file is deleted once imported
+        self.assertFalse(default_storage.exists(delay.call_args.args[2]))
+
+    def test_import_replaces_the_language(self):
+        _, delay = self.upload('movie.en.srt')
+        import_sidecar_task(*delay.call_args.args)
+        name = default_storage.save('sidecars/new.srt', ContentFile(
+            b'00:00:03,000 --> 00:00:04,500\nBye\n'))
+        job = ProcessingJob.objects.create(video=self.video)
+        import_sidecar_task(self.video.id, job.id, name, 'eng')
+        job.refresh_from_db()
+        self.assertEqual(job.stream_results[0]['changes'],
+                         {'inserted': 0, 'updated': 0, 'deleted': 1, 'unchanged': 1})
+        self.assertEqual(list(self.video.subtitles.values_list('content', flat=True)), ['Bye'])
+
+    def test_unreadable_file_fails_the_job(self):
+        job = ProcessingJob.objects.create(video=self.video)
+        import_sidecar_task(self.video.id, job.id, 'sidecars/missing.srt', 'eng')
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.FAILED)
+        self.assertEqual(job.stream_results[0]['status'], 'failed')
+        self.assertFalse(self.video.subtitles.exists())
+
@@ -0,0 +1,151 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from videos.models import ProcessingJob, Video
+
+
+class FakePubSub:
+    """Pub/sub connection delivering the given messages, then nothing."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    def subscribe(self, channel):
+        self.channels.append(channel)
+
+    def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        if not self.messages:
+            return None
+        data = self.messages.pop(0)
+        return None if data is None else {'type': 'message', 'data': json.dumps(data)}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncPubSub(FakePubSub):
+    async def subscribe(self, channel):
+        super().subscribe(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        return super().get_message(ignore_subscribe_messages, timeout)
+
+    async def unsubscribe(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+class FakeAsyncRedis:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def pubsub(self):
+        return self._pubsub
+
+    async def aclose(self):
+        pass
+
+
+def parse_events(content):
+    """Return the data of the events in a Server-Sent Events stream, with
+    None for keep-alive comments."""
+    events = []
+    for block in content.decode().split('\n\n')[:-1]:
+        if block.startswith(':'):
+            events.append(None)
+        else:
+            events.append(json.loads(block.split('data: ', 1)[1]))
+    return events
+
+
+class VideoStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+
+    def test_latest_job(self):
+        ProcessingJob.objects.create(video=self.video, state=ProcessingJob.FAILED)
+        job = ProcessingJob.objects.create(video=self.video)
+        job.start()
+        with job.stage_timer('probe'):
+            pass
+        job.record_stream(2, 'eng', 'succeeded', cues=10)
+
+        response = self.client.get(reverse('video-status', args=[self.video.id]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['id'], data['state'], data['stage']),
+                         (job.id, ProcessingJob.RUNNING, 'probe'))
+        self.assertIn('probe', data['stage_timings'])
+        self.assertEqual(data['stream_results'], [
+            {'index': 2, 'language': 'eng', 'status': 'succeeded', 'cues': 10, 'error': ''}])
+
+    def test_not_found(self):
+        url = reverse('video-status', args=[self.video.id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = reverse('video-status', args=[self.video.id + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class VideoStatusStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.url = reverse('video-status-stream', args=[cls.video.id])
+
+    def stream(self, messages):
+        """Open the stream under WSGI; returns the events and the pub/sub."""
+        pubsub = FakePubSub(messages)
+        client = mock.Mock(pubsub=mock.Mock(return_value=pubsub))
+        with mock.patch('videos.events.get_redis_client', return_value=client):
+            response = self.client.get(self.url)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            # WSGI servers would read an async stream whole before sending it
+            self.assertFalse(response.is_async)
+            content = b''.join(response.streaming_content)
+        return parse_events(content), pubsub
+
+    def test_finished_job(self):
+        job = ProcessingJob.objects.create(video=self.video, state=ProcessingJob.SUCCEEDED)
+        events, pubsub = self.stream([])
+        self.assertEqual([event['id'] for event in events], [job.id])
+        self.assertEqual(pubsub.channels, [f'videos:{self.video.id}:status'])
+        self.assertTrue(pubsub.closed)
+
+    def test_updates_until_the_job_finishes(self):
+        job = ProcessingJob.objects.create(video=self.video)
+        snapshot = job.as_dict()
+        events, pubsub = self.stream([
+            None,
+            dict(snapshot, state=ProcessingJob.RUNNING),
+            dict(snapshot, state=ProcessingJob.FAILED),
+            dict(snapshot, state=ProcessingJob.RUNNING),
+        ])
+        self.assertEqual([event and event['state'] for event in events],
+                         [ProcessingJob.PENDING, None, ProcessingJob.RUNNING,
+                          ProcessingJob.FAILED])
+        self.assertTrue(pubsub.closed)
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        url = reverse('video-status-stream', args=[self.video.id + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    async def test_asgi(self):
+        job = await ProcessingJob.objects.acreate(video=self.video)
+        pubsub = FakeAsyncPubSub([dict(job.as_dict(), state=ProcessingJob.SUCCEEDED)])
+        with mock.patch('videos.events.redis.asyncio.Redis.from_url',
+                        return_value=FakeAsyncRedis(pubsub)):
+            response = await self.async_client.get(self.url)
+            self.assertTrue(response.is_async)
+            content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual([event['state'] for event in parse_events(content)],
+                         [ProcessingJob.PENDING, ProcessingJob.SUCCEEDED])
+        self.assertTrue(pubsub.closed)
@@ -0,0 +1,135 @@
+from django.test import TestCase
+
+from videos.models import Language, ProcessingJob, Subtitle, Video
+from videos.parsers import Cue
+from videos.tasks import build_subtitles, insert_subtitles, sync_language_subtitles
+
+
+class InsertSubtitlesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.language = Language.objects.create(code='eng', name='English')
+
+    def subtitles(self, count):
+        for i in range(count):
+            yield Subtitle(video=self.video, language=self.language, content=f'Cue {i}',
+                           timestamp_start='', timestamp_end='',
+                           start_ms=i * 1000, end_ms=i * 1000 + 500)
+
+    def test_batches(self):
+        with self.assertNumQueries(3):
+            inserted = insert_subtitles(self.subtitles(5), batch_size=2)
+        self.assertEqual(inserted, 5)
+        self.assertEqual(list(self.video.subtitles.order_by('start_ms').values_list(
+            'content', flat=True)), [f'Cue {i}' for i in range(5)])
+
+    def test_batches_are_built_lazily(self):
+        created = []
+
+        def subtitles():
+            for subtitle in self.subtitles(4):
+                created.append(subtitle)
+                # Never more than one batch waits to be written
+                self.assertLessEqual(len(created) - self.video.subtitles.count(), 2)
+                yield subtitle
+
+        self.assertEqual(insert_subtitles(subtitles(), batch_size=2), 4)
+
+    def test_insert_time_is_recorded(self):
+        job = ProcessingJob.objects.create(video=self.video)
+        insert_subtitles(self.subtitles(3), batch_size=2, job=job)
+        self.assertGreater(job.stage_timings['insert'], 0)
+
+    def test_nothing_to_insert(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(insert_subtitles(iter(()), batch_size=2), 0)
+
+
+class BuildSubtitlesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.language = Language.objects.create(code='eng', name='English')
+
+    def build(self, cues):
+        return [(s.timestamp_start, s.timestamp_end, s.start_ms, s.end_ms, s.content)
+                for s in build_subtitles((Cue(*cue) for cue in cues),
+                                         self.video, self.language)]
+
+    def test_timestamps(self):
+        self.assertEqual(self.build([
+            ('00:01.500', '00:02.000', 'Short form'),
+            ('01:00:00.000', '01:00:01.250', 'Long form'),
+        ]), [('00:00:01.500', '00:00:02.000', 1500, 2000, 'Short form'),
+             ('01:00:00.000', '01:00:01.250', 3600000, 3601250, 'Long form')])
+
+    def test_subrip_and_ass_timestamps_are_stored_as_webvtt(self):
+        self.assertEqual(self.build([
+            ('00:00:01,500', '00:00:02,000', 'SubRip'),
+            ('0:00:03.25', '0:00:04.00', 'ASS'),
+        ]), [('00:00:01.500', '00:00:02.000', 1500, 2000, 'SubRip'),
+             ('00:00:03.250', '00:00:04.000', 3250, 4000, 'ASS')])
+
+    def test_cues_ending_before_they_start_become_instants(self):
+        self.assertEqual(self.build([('00:03.000', '00:02.000', 'Reversed')]),
+                         [('00:00:03.000', '00:00:03.000', 3000, 3000, 'Reversed')])
+
+    def test_invalid_and_repeated_cues_are_skipped(self):
+        self.assertEqual(self.build([
+            ('00:01.000', '00:02.000', 'First'),
+            ('00:01.000', '00:04.000', 'Same start'),
+            ('bad', '00:05.000', 'Invalid start'),
+            ('00:06.000', '00:00:nan', 'Invalid end'),
+            ('999999:00:00.000', '999999:00:01.000', 'Out of range'),
+        ]), [('00:00:01.000', '00:00:02.000', 1000, 2000, 'First')])
+
+
+class SyncLanguageSubtitlesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.language = Language.objects.create(code='eng', name='English')
+
+    def build(self, cues):
+        return build_subtitles((Cue(*cue) for cue in cues), self.video, self.language)
+
+    def stored(self):
+        return list(self.video.subtitles.order_by('start_ms').values_list(
+            'start_ms', 'end_ms', 'content'))
+
+    def test_sync_applies_only_changes(self):
+        insert_subtitles(self.build([
+            ('00:01.000', '00:02.000', 'Unchanged'),
+            ('00:03.000', '00:04.000', 'Old text'),
+            ('00:05.000', '00:06.000', 'Removed'),
+        ]))
+        unchanged_id = self.video.subtitles.get(start_ms=1000).id
+
+        counts = sync_language_subtitles(self.video, self.language, self.build([
+            ('00:01.000', '00:02.000', 'Unchanged'),
+            ('00:03.000', '00:04.500', 'New text'),
+            ('00:07.000', '00:08.000', 'Added'),
+        ]))
+        self.assertEqual(counts, {'inserted': 1, 'updated': 1, 'deleted': 1,
+                                  'unchanged': 1})
+        self.assertEqual(self.stored(), [(1000, 2000, 'Unchanged'),
+                                         (3000, 4500, 'New text'),
+                                         (7000, 8000, 'Added')])
+        # Unchanged cues keep their rows
+        self.assertEqual(self.video.subtitles.get(start_ms=1000).id, unchanged_id)
+
+    def test_sync_is_idempotent(self):
+        cues = [('00:01.000', '00:02.000', 'One'), ('00:03.000', '00:04.000', 'Two')]
+        sync_language_subtitles(self.video, self.language, self.build(cues))
+        counts = sync_language_subtitles(self.video, self.language, self.build(cues))
+        self.assertEqual(counts, {'inserted': 0, 'updated': 0, 'deleted': 0,
+                                  'unchanged': 2})
+
+    def test_other_languages_are_left_alone(self):
+        french = Language.objects.create(code='fre', name='French')
+        Subtitle.objects.create(video=self.video, language=french, content='Bonjour',
+                                start_ms=1000, end_ms=2000)
+        counts = sync_language_subtitles(self.video, self.language, iter(()))
+        self.assertEqual(counts['deleted'], 0)
+        self.assertEqual(self.stored(), [(1000, 2000, 'Bonjour')])
@@ -0,0 +1,73 @@
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+
+from videos.languages import language_name
+from videos.models import Language, Subtitle, Video
+from videos.pagination import SubtitleKeysetPagination
+
+
+class SubtitleListViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.languages = [Language.objects.create(code=code, name=language_name(code))
+                         for code in ('eng', 'fre')]
+        Subtitle.objects.bulk_create(
+            Subtitle(video=cls.video, language=language, content=f'{language.code} {i}',
+                     start_ms=i * 1000, end_ms=i * 1000 + 500)
+            for language in cls.languages for i in range(5))
+        cls.url = reverse('video-subtitles-list', args=[cls.video.id])
+
+    def fetch_all(self, params):
+        """Follow the `next` links from the first page; returns every page."""
+        pages = []
+        url, data = self.url, params
+        while url:
+            # A video check and the page itself, whatever the page
+            with self.assertNumQueries(2):
+                response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json()['results'])
+            url, data = response.json()['next'], None
+        return pages
+
+    def test_pages_cover_every_subtitle_once(self):
+        pages = self.fetch_all({'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        starts = [(subtitle['language']['code'], subtitle['start_ms'])
+                  for page in pages for subtitle in page]
+        self.assertEqual(starts, [(language.code, i * 1000)
+                                  for language in sorted(self.languages, key=lambda l: l.id)
+                                  for i in range(5)])
+
+    def test_language_filter(self):
+        pages = self.fetch_all({'language': 'fr', 'page_size': 2})
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual({subtitle['language']['code'] for page in pages for subtitle in page},
+                         {'fre'})
+
+    def test_fields(self):
+        pages = self.fetch_all({'fields': 'id,content', 'page_size': 4})
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(set(pages[0][0]), {'id', 'content'})
+
+    def test_unknown_video(self):
+        response = self.client.get(reverse('video-subtitles-list', args=[self.video.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_round_trip(self):
+        paginator = SubtitleKeysetPagination()
+        paginator.request = Request(RequestFactory().get(self.url))
+        url = paginator.encode_cursor((12, 34500))
+        self.assertEqual(paginator.decode_cursor(Request(RequestFactory().get(url))),
+                         (12, 34500))
+
+    def test_invalid_cursor(self):
+        paginator = SubtitleKeysetPagination()
+        for cursor in ('not base64!', 'MTI='):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(NotFound):
+                    paginator.decode_cursor(
+                        Request(RequestFactory().get(self.url, {'cursor': cursor})))
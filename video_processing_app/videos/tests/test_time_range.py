@@ -0,0 +1,56 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from videos.models import Language, Subtitle, Video
+
+
+class SubtitleTimeRangeViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.english = Language.objects.create(code='eng', name='English')
+        cls.french = Language.objects.create(code='fre', name='French')
+        Subtitle.objects.bulk_create(
+            Subtitle(video=cls.video, language=language, content=content,
+                     start_ms=start_ms, end_ms=end_ms)
+            for language, content, start_ms, end_ms in (
+                (cls.english, 'One', 1000, 2000),
+                (cls.english, 'Two', 2000, 3000),
+                (cls.english, 'Instant', 5000, 5000),
+                (cls.french, 'Un', 1500, 2500),
+            ))
+        # Another video's cues are never listed
+        other = Video.objects.create(title='Other', video_file='videos/other.mkv')
+        Subtitle.objects.create(video=other, language=cls.english, content='Other',
+                                start_ms=0, end_ms=10000)
+        cls.url = reverse('video-subtitles-active', args=[cls.video.id])
+
+    def contents(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [subtitle['content'] for subtitle in response.json()]
+
+    def test_active_at_time(self):
+        self.assertEqual(self.contents({'t': 1800}), ['One', 'Un'])
+        # Both ends of a cue are included
+        self.assertEqual(self.contents({'t': 2000}), ['One', 'Two', 'Un'])
+        self.assertEqual(self.contents({'t': 4000}), [])
+
+    def test_instant_cues(self):
+        self.assertEqual(self.contents({'t': 5000}), ['Instant'])
+        self.assertEqual(self.contents({'start': 4000, 'end': 6000}), ['Instant'])
+        self.assertEqual(self.contents({'start': 5000, 'end': 5000}), ['Instant'])
+
+    def test_window(self):
+        self.assertEqual(self.contents({'start': 2600, 'end': 5000}), ['Two', 'Instant'])
+        self.assertEqual(self.contents({'start': 0, 'end': 1500, 'language': 'fr'}), ['Un'])
+
+    def test_invalid_parameters(self):
+        for params in ({}, {'t': 'soon'}, {'t': -1}, {'start': 10},
+                       {'start': 20, 'end': 10}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_unknown_video(self):
+        url = reverse('video-subtitles-active', args=[self.video.id + 2])
+        self.assertEqual(self.client.get(url, {'t': 0}).status_code, 404)
@@ -0,0 +1,129 @@
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from videos.http import RangeNotSatisfiable, parse_range, serve_file
+from videos.models import Language, Subtitle, SubtitleTrack, Video
+from videos.tracks import invalidate_subtitle_tracks, render_vtt
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-0', 10), (0, 0))
+        self.assertEqual(parse_range('bytes=3-', 10), (3, 9))
+        self.assertEqual(parse_range('bytes=8-100', 10), (8, 9))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=-30', 10), (0, 9))
+
+    def test_invalid_ranges_are_ignored(self):
+        for header in (None, '', 'junk', 'bytes=-', 'bytes=5-2', 'bytes=0-1,3-4',
+                       'items=0-1'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 10))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=10-', 'bytes=20-30', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(RangeNotSatisfiable):
+                    parse_range(header, 10)
+
+    def test_serve_file(self):
+        factory = RequestFactory()
+        for header, status, body in (('bytes=2-5', 206, b'2345'),
+                                     ('bytes=5-2', 200, b'0123456789'),
+                                     ('bytes=20-', 416, b'')):
+            with self.subTest(header=header):
+                file = io.BytesIO(b'0123456789')
+                response = serve_file(factory.get('/', HTTP_RANGE=header),
+                                      file, 10, 'text/plain')
+                self.assertEqual(response.status_code, status)
+                content = (b''.join(response.streaming_content)
+                           if response.streaming else response.content)
+                self.assertEqual(content, body)
+                response.close()
+                self.assertTrue(file.closed)
+
+
+class RenderVttTests(SimpleTestCase):
+    def test_content_is_escaped(self):
+        self.assertEqual(render_vtt([(1500, 3723004, 'Tom & <Jerry> -->')]), (
+            "WEBVTT\n\n"
+            "00:00:01.500 --> 01:02:03.004\n"
+            "Tom &amp; &lt;Jerry&gt; --&gt;\n"))
+
+
+class SubtitleTrackTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(title='Sample', video_file='videos/sample.mkv')
+        cls.language = Language.objects.create(code='eng', name='English')
+        Subtitle.objects.bulk_create(
+            Subtitle(video=cls.video, language=cls.language, content=f'Cue {i}',
+                     start_ms=i * 1000, end_ms=i * 1000 + 500)
+            for i in range(3))
+        cls.url = reverse('subtitle-track', args=[cls.video.id, 'en'])
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        content = (b''.join(response.streaming_content)
+                   if response.streaming else response.content)
+        return response, content
+
+    def test_track(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/vtt; charset=utf-8')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(content.decode(), (
+            "WEBVTT\n\n"
+            "00:00:00.000 --> 00:00:00.500\nCue 0\n\n"
+            "00:00:01.000 --> 00:00:01.500\nCue 1\n\n"
+            "00:00:02.000 --> 00:00:02.500\nCue 2\n"))
+        self.assertEqual(SubtitleTrack.objects.count(), 1)
+
+    def test_conditional_request_is_answered_from_the_cache(self):
+        response, _ = self.get()
+        with self.assertNumQueries(0):
+            response, content = self.get(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(content, b'')
+
+    def test_range(self):
+        response, content = self.get(range='bytes=0-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, b'WEBVTT')
+
+    def test_rebuilt_when_subtitles_change(self):
+        response, _ = self.get()
+        self.video.subtitles.filter(start_ms=0).update(content='Edited')
+        invalidate_subtitle_tracks(self.video.id)
+        self.assertEqual(SubtitleTrack.objects.count(), 0)
+
+        new_response, content = self.get(if_none_match=response['ETag'])
+        self.assertEqual(new_response.status_code, 200)
+        self.assertNotEqual(new_response['ETag'], response['ETag'])
+        self.assertIn(b'Edited', content)
+
+    def test_missing_file_is_rebuilt(self):
+        self.get()
+        default_storage.delete(SubtitleTrack.objects.get().vtt_file.name)
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Cue 2', content)
+
+    def test_unknown_language(self):
+        response = self.client.get(reverse('subtitle-track', args=[self.video.id, 'fr']))
+        self.assertEqual(response.status_code, 404)
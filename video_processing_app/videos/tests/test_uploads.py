@@ -0,0 +1,130 @@
+import fcntl
+import hashlib
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from videos.models import UploadSession, Video
+from videos.uploads import OffsetMismatch, append_chunk, reserve_video_name
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def start(self, content, filename='movie.mkv'):
+        response = self.client.post(reverse('upload-create'), {
+            'title': 'Movie', 'filename': filename, 'size': len(content)},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put(self, upload_id, chunk, offset, checksum=None):
+        return self.client.put(
+            reverse('upload-detail', args=[upload_id]), chunk,
+            content_type='application/octet-stream',
+            headers={'Upload-Offset': str(offset),
+                     'Chunk-SHA256': checksum or hashlib.sha256(chunk).hexdigest()})
+
+    def finalize(self, upload_id):
+        return self.client.post(reverse('upload-finalize', args=[upload_id]))
+
+    def partial_content(self, upload_id):
+        with default_storage.open(f'uploads/{upload_id}.part') as file:
+            return file.read()
+
+    def test_resume(self):
+        upload_id = self.start(b'0123456789')
+        self.assertEqual(self.put(upload_id, b'0123', 0).json()['offset'], 4)
+        # A retried chunk is refused with the offset to resume from
+        response = self.put(upload_id, b'0123', 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4)
+        response = self.client.get(reverse('upload-detail', args=[upload_id]))
+        self.assertEqual(response.json()['offset'], 4)
+        self.assertEqual(self.put(upload_id, b'456789', 4).json()['offset'], 10)
+
+        response = self.finalize(upload_id)
+        self.assertEqual(response.status_code, 201)
+        video = Video.objects.get(id=response.json()['id'])
+        self.assertEqual(video.video_file.name, 'videos/movie.mkv')
+        with video.video_file.open() as file:
+            self.assertEqual(file.read(), b'0123456789')
+        self.assertFalse(default_storage.exists(f'uploads/{upload_id}.part'))
+
+        # Finalizing again returns the same video
+        response = self.finalize(upload_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], video.id)
+
+    def test_checksum_mismatch(self):
+        upload_id = self.start(b'0123456789')
+        self.put(upload_id, b'0123', 0)
+        response = self.put(upload_id, b'4567', 4, checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).offset, 4)
+        self.assertEqual(self.partial_content(upload_id), b'0123')
+
+    def test_chunk_past_the_declared_size(self):
+        upload_id = self.start(b'0123')
+        self.assertEqual(self.put(upload_id, b'01234', 0).status_code, 400)
+        self.assertEqual(self.partial_content(upload_id), b'')
+
+    def test_concurrent_chunk_is_refused(self):
+        upload_id = self.start(b'0123456789')
+        with default_storage.open(f'uploads/{upload_id}.part', 'r+b') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            response = self.put(upload_id, b'0123', 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.put(upload_id, b'0123', 0).status_code, 200)
+
+    def test_offset_moved_while_reading(self):
+        upload_id = self.start(b'0123456789')
+        stream = io.BytesIO(b'0123')
+
+        def read(size):
+            # Another request acknowledged bytes without holding the lock
+            UploadSession.objects.filter(id=upload_id).update(offset=2)
+            return io.BytesIO.read(stream, size)
+
+        with mock.patch.object(stream, 'read', side_effect=read):
+            with self.assertRaises(OffsetMismatch) as raised:
+                append_chunk(upload_id, stream, 0, 4,
+                             hashlib.sha256(b'0123').hexdigest())
+        self.assertEqual(raised.exception.offset, 2)
+        self.assertEqual(self.partial_content(upload_id), b'')
+
+    def test_incomplete_upload_cannot_be_finalized(self):
+        upload_id = self.start(b'0123456789')
+        self.put(upload_id, b'0123', 0)
+        self.assertEqual(self.finalize(upload_id).status_code, 400)
+        self.assertFalse(Video.objects.exists())
+
+    def test_same_file_name(self):
+        names = []
+        for content in (b'first', b'second'):
+            upload_id = self.start(content)
+            self.put(upload_id, content, 0)
+            video = Video.objects.get(id=self.finalize(upload_id).json()['id'])
+            with video.video_file.open() as file:
+                self.assertEqual(file.read(), content)
+            names.append(video.video_file.name)
+        self.assertEqual(names[0], 'videos/movie.mkv')
+        self.assertNotEqual(names[1], names[0])
+
+    def test_reserved_name_is_not_reused(self):
+        taken = reserve_video_name('movie.mkv')
+        # The first name found free is claimed before it can be reserved
+        with mock.patch.object(default_storage, 'get_available_name',
+                               side_effect=[taken, 'videos/other.mkv']):
+            self.assertEqual(reserve_video_name('movie.mkv'), 'videos/other.mkv')
+        self.assertTrue(default_storage.exists('videos/other.mkv'))
@@ -0,0 +1,107 @@
+"""
+WebVTT subtitle tracks.
+
+The subtitles of one language of a video are rendered to a WebVTT file the
+first time the track is requested, and the file is kept in storage until
+those subtitles change. The track's validators (ETag, Last-Modified) and
+storage name are cached, so conditional requests are answered without
+touching the database.
+"""
+import hashlib
+import html
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+
+from .cache import subtitle_track_cache_key
+from .models import Language, Subtitle, SubtitleTrack
+
+
+def format_vtt_timestamp(ms):
+    """Format milliseconds as a WebVTT timestamp (HH:MM:SS.mmm)."""
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def render_vtt(subtitles):
+    """
+    Render an iterable of (start_ms, end_ms, content) rows as WebVTT. The
+    content is plain text, so `&`, `<` and `>` are escaped.
+    """
+    parts = ['WEBVTT\n']
+    for start_ms, end_ms, content in subtitles:
+        parts.append(
+            f"\n{format_vtt_timestamp(start_ms)} --> {format_vtt_timestamp(end_ms)}\n"
+            f"{html.escape(content, quote=False)}\n")
+    return ''.join(parts)
+
+
+def build_subtitle_track(video_id, language):
+    """Render the subtitles of a language of a video and store the track."""
+    rows = Subtitle.objects.filter(
+        video_id=video_id, language=language
+    ).order_by('start_ms').values_list('start_ms', 'end_ms', 'content')
+    content = render_vtt(rows.iterator(
+        chunk_size=settings.SUBTITLE_INSERT_BATCH_SIZE)).encode('utf-8')
+    etag = hashlib.sha256(content).hexdigest()
+
+    track = SubtitleTrack(video_id=video_id, language=language, etag=etag,
+                          size=len(content), cue_count=rows.count())
+    track.vtt_file.save(
+        f"{video_id}_{language.code}_{etag[:12]}.vtt", ContentFile(content),
+        save=False)
+    try:
+        with transaction.atomic():
+            track.save()
+    except IntegrityError:
+        # Built concurrently by another request
+        track.vtt_file.delete(save=False)
+        track = SubtitleTrack.objects.get(video_id=video_id, language=language)
+    return track
+
+
+def get_track_info(video_id, language_code):
+    """
+    Return the cached metadata of a subtitle track: its storage 'name',
+    'size', 'etag' and 'last_modified' timestamp. The track is built on
+    first use. Returns None if the video has no subtitles in the language.
+    """
+    key = subtitle_track_cache_key(video_id, language_code)
+    info = cache.get(key)
+    if info is not None:
+        return info
+
+    language = Language.objects.filter(code=language_code).first()
+    if language is None or not Subtitle.objects.filter(
+            video_id=video_id, language=language).exists():
+        return None
+    track = SubtitleTrack.objects.filter(
+        video_id=video_id, language=language).first()
+    if track is None:
+        track = build_subtitle_track(video_id, language)
+
+    info = {
+        'name': track.vtt_file.name,
+        'size': track.size,
+        'etag': track.etag,
+        'last_modified': int(track.generated_at.timestamp()),
+    }
+    cache.set(key, info, settings.SUBTITLE_TRACK_CACHE_TIMEOUT)
+    return info
+
+
+def invalidate_subtitle_tracks(video_id, language_id=None):
+    """
+    Drop the WebVTT tracks of a video, or only the track of one language,
+    so they are rebuilt from the subtitles on their next request.
+    """
+    tracks = SubtitleTrack.objects.filter(video_id=video_id)
+    if language_id is not None:
+        tracks = tracks.filter(language_id=language_id)
+    # Deleting a track removes its file and cached metadata (see signals.py)
+    for track in tracks.select_related('language'):
+        track.delete()
@@ -0,0 +1,269 @@
+"""
+Chunked, resumable uploads.
+
+A client opens an UploadSession, PUTs the file in chunks at the offset the
+server acknowledged last, and finalizes the session once every byte has been
+received. Chunks are streamed from the request straight onto the partial
+file in storage, never buffered as a whole, and checked against the SHA-256
+digest sent with them.
+
+Uploaded content is identified by its SHA-256 digest. Requests only store
+the file and create its Video; the file is hashed and deduplicated by a
+Celery task (see register_upload_task in videos/tasks.py). An upload whose
+content is already stored becomes a duplicate of the existing video: it
+shares its media file and gets a copy of its subtitles, without running
+ffprobe or ffmpeg again.
+"""
+import fcntl
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import (MemoryFileUploadHandler,
+                                             TemporaryFileUploadHandler)
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import UploadSession, Video
+
+# Supported video file extensions
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi')
+
+# Size of the blocks read from the request and written to storage
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised when a chunk or a finalize request cannot be accepted."""
+
+
+class OffsetMismatch(UploadError):
+    """Raised when a chunk does not start at the acknowledged offset."""
+
+    def __init__(self, offset):
+        super().__init__(f"Expected a chunk starting at offset {offset}.")
+        self.offset = offset
+
+
+class ChunkInProgress(UploadError):
+    """Raised when another chunk of the session is being written."""
+
+
+class ContentHashMixin:
+    """
+    Upload handler mixin computing the SHA-256 of each file while it is
+    received. The digest is set as `content_hash` on the uploaded file.
+
+    Only the handler that keeps the data hashes it: a handler that passes
+    a chunk on (the memory handler, for files too large for it) leaves it
+    to the next one.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.content_hash = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        if data is None:
+            self.content_hash.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.content_hash.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, read sequentially."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_original(content_hash):
+    """Return the video storing the given content, if any."""
+    if not content_hash:
+        return None
+    return Video.objects.filter(
+        content_hash=content_hash, duplicate_of__isnull=True).first()
+
+
+def deduplicate_video(video, content_hash=None):
+    """
+    Record the content hash of an uploaded video, hashing its file unless
+    `content_hash` is given (as computed by the upload handlers).
+
+    If the same content is already stored, the video becomes a duplicate of
+    it: it shares the media file of the original and its own copy is
+    deleted. Returns the original, or None when the video stores new content.
+    """
+    if video.content_hash:
+        # Already registered
+        return video.duplicate_of
+    content_hash = content_hash or hash_file(video.video_file.path)
+    original = find_original(content_hash)
+    if original is None:
+        try:
+            with transaction.atomic():
+                video.content_hash = content_hash
+                video.save(update_fields=['content_hash'])
+            return None
+        except IntegrityError:
+            # The same content was registered concurrently
+            video.content_hash = None
+            original = find_original(content_hash)
+
+    name = video.video_file.name
+    video.video_file = original.video_file.name
+    video.content_hash = content_hash
+    video.duplicate_of = original
+    video.probe_data = original.probe_data
+    video.probe_key = original.probe_key
+    video.save(update_fields=['video_file', 'content_hash', 'duplicate_of',
+                              'probe_data', 'probe_key'])
+    default_storage.delete(name)
+    return original
+
+
+def is_supported_video(filename):
+    """Return whether the file name has a supported video extension."""
+    return filename.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def create_upload_session(title, filename, size):
+    """Open an upload session and create its empty partial file."""
+    session = UploadSession.objects.create(
+        title=title, filename=os.path.basename(filename), size=size)
+    path = default_storage.path(session.partial_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return session
+
+
+def append_chunk(session_id, stream, offset, length, sha256):
+    """
+    Append `length` bytes read from `stream` to the session's partial file.
+
+    The chunk must start at the acknowledged offset and match the `sha256`
+    hex digest, otherwise the partial file is truncated back to the last
+    acknowledged offset. Returns the updated session.
+
+    A chunk can take as long as the client takes to send it, so no database
+    transaction is held while it is read: concurrent chunks of a session
+    are serialized by an exclusive lock on the partial file, and the offset
+    only advances if no other request moved it in the meantime.
+    """
+    session = UploadSession.objects.get(id=session_id)
+    with open(default_storage.path(session.partial_name), 'r+b') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkInProgress("Another chunk of this upload is being written.")
+        # A chunk may have been acknowledged before the lock was taken
+        session.refresh_from_db()
+        if session.video_id is not None:
+            raise UploadError("Upload is already finalized.")
+        if offset != session.offset:
+            raise OffsetMismatch(session.offset)
+        if session.offset + length > session.size:
+            raise UploadError("Chunk extends past the declared file size.")
+
+        digest = hashlib.sha256()
+        received = 0
+        # Drop any bytes left over by an interrupted chunk
+        file.truncate(session.offset)
+        file.seek(session.offset)
+        while received < length:
+            block = stream.read(min(COPY_BLOCK_SIZE, length - received))
+            if not block:
+                break
+            digest.update(block)
+            file.write(block)
+            received += len(block)
+
+        if received != length or digest.hexdigest() != sha256.lower():
+            file.truncate(session.offset)
+            raise UploadError(
+                "Chunk is incomplete or does not match its checksum.")
+        file.flush()
+
+        updated_at = timezone.now()
+        acknowledged = UploadSession.objects.filter(
+            id=session.id, offset=session.offset, video__isnull=True,
+        ).update(offset=session.offset + received, updated_at=updated_at)
+        if not acknowledged:
+            file.truncate(session.offset)
+            session.refresh_from_db()
+            raise OffsetMismatch(session.offset)
+    session.offset += received
+    session.updated_at = updated_at
+    return session
+
+
+def reserve_video_name(filename):
+    """
+    Return a free storage name for a video file, created empty so that no
+    other upload can claim the same name before the file is moved there.
+    """
+    while True:
+        name = default_storage.get_available_name(
+            f"{Video.video_file.field.upload_to}{filename}")
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            # Claimed by a concurrent upload since it was found free
+            continue
+        return name
+
+
+def finalize_upload(session_id):
+    """
+    Move a completely received upload into the videos storage and create its
+    Video. Hashes can't be carried across chunk requests, so the file is
+    hashed and deduplicated later, by the registration task.
+
+    Returns the video and whether this call created it, as the video of a
+    session finalized before is returned again.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+        if session.video_id is not None:
+            return session.video, False
+        if session.offset != session.size:
+            raise UploadError(
+                f"Upload is incomplete: received {session.offset} of {session.size} bytes.")
+
+        name = reserve_video_name(session.filename)
+        path = default_storage.path(name)
+        try:
+            session.video = Video.objects.create(title=session.title, video_file=name)
+            session.save(update_fields=['video', 'updated_at'])
+            # Rename in place over the reserved name; the file is never copied
+            os.replace(default_storage.path(session.partial_name), path)
+        except Exception:
+            os.remove(path)
+            raise
+    return session.video, True
+
+
+def abort_upload(session):
+    """Delete an unfinished upload session and its partial file."""
+    if session.video_id is None:
+        default_storage.delete(session.partial_name)
+    session.delete()
+
@@ -1,6 +1,14 @@
 from django.urls import path
 from .views import (VideoListView, VideoCreateView, VideoDetailView,
-                    SubtitleListView, SearchSubtitleView, VideoLanguagesView)
+                    SubtitleListView, SearchSubtitleView, VideoLanguagesView,
+                    SubtitleTimeRangeView, UploadSessionCreateView,
+                    UploadSessionDetailView, UploadSessionFinalizeView,
+                    VideoStatusView, video_status_stream, VideoReprocessView,
+                    subtitle_track, LibrarySearchView,
+                    QueryCacheStatsView, VideoPreviewView,
+                    hls_master_playlist, hls_subtitle_playlist, hls_file,
+                    SubtitleUploadView)
+from . import async_views
 from django.conf.urls.static import static
 from django.conf import settings
 
@@ -10,13 +18,52 @@ urlpatterns = [
          name='video-list'),  # List all videos
     path('upload/', VideoCreateView.as_view(),
          name='video-create'),  # Upload a new video
+    path('uploads/', UploadSessionCreateView.as_view(),
+         name='upload-create'),  # Start a chunked upload
+    path('uploads/<uuid:upload_id>/', UploadSessionDetailView.as_view(),
+         name='upload-detail'),
+    path('uploads/<uuid:upload_id>/finalize/',
+         UploadSessionFinalizeView.as_view(), name='upload-finalize'),
+    path('subtitles/search/', LibrarySearchView.as_view(),
+         name='subtitles-search'),  # Search every video
+    path('cache/stats/', QueryCacheStatsView.as_view(),
+         name='query-cache-stats'),  # Query cache hit/miss counters
     path('videos/<int:pk>/', VideoDetailView.as_view(), name='video-detail'),
     path('videos/<int:video_id>/subtitles/',
          SubtitleListView.as_view(), name='video-subtitles-list'),
+    path('videos/<int:video_id>/subtitles/upload/',
+         SubtitleUploadView.as_view(), name='video-subtitles-upload'),
     path('videos/<int:video_id>/subtitles/search/',
          SearchSubtitleView.as_view(), name='video-subtitles-search'),
+    path('videos/<int:video_id>/subtitles/active/',
+         SubtitleTimeRangeView.as_view(), name='video-subtitles-active'),
+    path('videos/<int:video_id>/tracks/<str:language_code>.vtt',
+         subtitle_track, name='subtitle-track'),
+    path('videos/<int:video_id>/status/',
+         VideoStatusView.as_view(), name='video-status'),
+    path('videos/<int:video_id>/status/stream/',
+         video_status_stream, name='video-status-stream'),
+    path('videos/<int:video_id>/reprocess/',
+         VideoReprocessView.as_view(), name='video-reprocess'),
     path('videos/<int:video_id>/languages/',
          VideoLanguagesView.as_view(), name='video-languages'),
+    path('videos/<int:video_id>/preview/',
+         VideoPreviewView.as_view(), name='video-preview'),
+    path('videos/<int:video_id>/hls/master.m3u8',
+         hls_master_playlist, name='hls-master'),  # Adaptive streaming
+    path('videos/<int:video_id>/hls/subtitles/<str:language_code>.m3u8',
+         hls_subtitle_playlist, name='hls-subtitles'),
+    path('videos/<int:video_id>/hls/<str:version>/<str:name>',
+         hls_file, name='hls-file'),
+
+    # Async versions of the read endpoints, for ASGI servers
+    path('async/videos/', async_views.video_list, name='async-video-list'),
+    path('async/videos/<int:video_id>/subtitles/',
+         async_views.subtitle_list, name='async-video-subtitles-list'),
+    path('async/videos/<int:video_id>/subtitles/search/',
+         async_views.search_subtitles, name='async-video-subtitles-search'),
+    path('async/videos/<int:video_id>/languages/',
+         async_views.video_languages, name='async-video-languages'),
 
 ]
 
@@ -1,4 +1,20 @@
-from django.db.models import Q
+import datetime
+import os
+from django.conf import settings
+from django.contrib.postgres.fields import IntegerRangeField
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import (Case, CharField, Count, Exists, F, Func, OuterRef, Q,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
 from rest_framework.exceptions import ValidationError, NotFound
 from .serializers import SubtitleSerializer
 from .models import Video
@@ -9,9 +25,33 @@ from rest_framework import status
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound, ValidationError
-from .models import Video, Subtitle
-from .serializers import VideoSerializer, SubtitleSerializer
-from .tasks import extract_subtitles_task
+from .models import (Language, Video, Subtitle, SubtitleTrack, UploadSession,
+                     ProcessingJob)
+from .languages import canonical_language_code, language_name
+from .probe import is_bitmap_subtitle, subtitle_streams
+from .serializers import (VideoSerializer, SubtitleSerializer, SubtitleSearchSerializer,
+                          VideoSummarySerializer, UploadSessionSerializer,
+                          ProcessingJobSerializer, LibrarySearchResultSerializer,
+                          VideoPreviewSerializer)
+from .events import ajob_events, job_events
+from .cache import (cached_video_query, normalize_query, query_cache_stats,
+                    reset_query_cache_stats, subtitle_track_cache_key,
+                    video_list_cache_key)
+from .hls import (CONTENT_TYPES, FILE_NAME_RE, get_package,
+                  render_master_playlist, render_subtitle_playlist)
+from .http import conditional_response, serve_file
+from .tracks import get_track_info
+from .previews import get_previews
+from .search import SEARCH_MODES, search_library, search_subtitles, top_hits
+from .pagination import (LibrarySearchPagination, SubtitleKeysetPagination,
+                         SubtitleSearchPagination, VideoListPagination)
+from .sidecars import (SIDECAR_PARSERS, guess_sidecar_language, save_sidecar,
+                       sidecar_extension)
+from .tasks import (fail_stale_jobs, queue_extraction, queue_registration,
+                    queue_sidecar_import)
+from .uploads import (ChunkInProgress, OffsetMismatch, UploadError, abort_upload,
+                      append_chunk, create_upload_session, finalize_upload,
+                      is_supported_video)
 from django.views.generic import TemplateView
 import logging
 
@@ -19,25 +59,93 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def get_subtitle_counts(video_ids):
+    """Return {video_id: {language_code: cue_count}} for the given videos."""
+    counts = {}
+    rows = Subtitle.objects.filter(video_id__in=video_ids).values(
+        'video_id', 'language__code').annotate(count=Count('id')).order_by()
+    for row in rows:
+        counts.setdefault(row['video_id'], {})[
+            row['language__code']] = row['count']
+    return counts
+
+
+def video_list_queryset():
+    """
+    Return the videos of the list, newest first, annotated with the
+    `status` of their latest processing job.
+    """
+    latest_job_state = ProcessingJob.objects.filter(
+        video=OuterRef('pk')).order_by('-created_at').values('state')[:1]
+    has_subtitles = Exists(Subtitle.objects.filter(video=OuterRef('pk')))
+    return Video.objects.annotate(
+        # Videos processed before jobs were recorded have no job
+        status=Coalesce(
+            Subquery(latest_job_state),
+            Case(
+                When(has_subtitles, then=Value(ProcessingJob.SUCCEEDED)),
+                default=Value(ProcessingJob.PENDING),
+            ),
+            output_field=CharField(),
+        ),
+    ).select_related(
+        'hls_package', 'duplicate_of__hls_package'
+    ).order_by('-uploaded_at', '-id')
+
+
 class Home(TemplateView):
     """
     Serve the main HTML template.
     """
     template_name = 'index.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # hls.js is only loaded when videos can have a stream
+        context['hls_packaging'] = settings.HLS_PACKAGING
+        return context
+
 
 class VideoListView(generics.ListAPIView):
     """
     API endpoint to list all uploaded videos.
+    Returns a paginated summary of each video (no nested subtitles) and
+    serves pages from the cache until a video or its subtitles change.
     """
-    queryset = Video.objects.all()
-    serializer_class = VideoSerializer
+    serializer_class = VideoSummarySerializer
+    pagination_class = VideoListPagination
+
+    def get_queryset(self):
+        return video_list_queryset()
+
+    def list(self, request, *args, **kwargs):
+        cache_key = video_list_cache_key(request.build_absolute_uri())
+        data = cache.get(cache_key)
+        if data is None:
+            page = self.paginate_queryset(self.get_queryset())
+            context = self.get_serializer_context()
+            context['subtitle_counts'] = get_subtitle_counts(
+                [video.id for video in page])
+            serializer = self.get_serializer(page, many=True, context=context)
+            data = self.get_paginated_response(serializer.data).data
+            cache.set(cache_key, data, settings.VIDEO_LIST_CACHE_TIMEOUT)
+        return Response(data)
+
+
+def pending_video_summary(video, context):
+    """
+    Serialize a video just created by an upload, whose registration job is
+    pending, without nested subtitles.
+    """
+    video.status = ProcessingJob.PENDING
+    return VideoSummarySerializer(video, context=context).data
 
 
 class VideoCreateView(generics.CreateAPIView):
     """
     API endpoint to upload a new video.
-    Triggers a background task for subtitle extraction upon successful upload.
+    Stores the file and queues its registration: deduplication, then the
+    subtitle extraction. Responds with the summary of the pending video.
     """
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
@@ -49,18 +157,108 @@ class VideoCreateView(generics.CreateAPIView):
             video_file = serializer.validated_data.get('video_file')
 
             # Validate the file type
-            if not video_file.name.endswith(('.mp4', '.mkv', '.avi')):
+            if not is_supported_video(video_file.name):
                 return Response({'error': 'Unsupported file type.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            video = serializer.save()
-            # Trigger background subtitle extraction task
-            extract_subtitles_task.delay(video.id)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            with transaction.atomic():
+                video = Video.objects.create(
+                    title=serializer.validated_data['title'], video_file=video_file)
+                # The upload handlers hashed the file while it was received
+                queue_registration(video, getattr(video_file, 'content_hash', None))
+            return Response(pending_video_summary(video, self.get_serializer_context()),
+                            status=status.HTTP_201_CREATED)
         else:
             logger.error(serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UploadSessionCreateView(generics.CreateAPIView):
+    """
+    API endpoint to start a chunked, resumable upload.
+    Takes the title, file name and total size of the video; the chunks are
+    then sent to the upload detail endpoint.
+    """
+    serializer_class = UploadSessionSerializer
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = create_upload_session(
+            data['title'], data['filename'], data['size'])
+
+
+class UploadSessionDetailView(APIView):
+    """
+    API endpoint for an upload session.
+    GET returns the acknowledged offset to resume from, PUT appends a chunk
+    sent as the raw request body with `Upload-Offset` and `Chunk-SHA256`
+    headers, and DELETE aborts the upload.
+    """
+    # The body is streamed to storage as is, never parsed
+    parser_classes = []
+
+    def get_session(self, upload_id):
+        try:
+            return UploadSession.objects.get(id=upload_id)
+        except UploadSession.DoesNotExist:
+            raise NotFound("Upload not found.")
+
+    def get(self, request, upload_id):
+        session = self.get_session(upload_id)
+        return Response(UploadSessionSerializer(session).data)
+
+    def put(self, request, upload_id):
+        self.get_session(upload_id)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+            checksum = request.headers['Chunk-SHA256']
+        except (KeyError, ValueError):
+            raise ValidationError(
+                "Upload-Offset, Content-Length and Chunk-SHA256 headers are required.")
+        if not 0 < length <= settings.UPLOAD_MAX_CHUNK_SIZE:
+            raise ValidationError(
+                f"Chunks must be between 1 and {settings.UPLOAD_MAX_CHUNK_SIZE} bytes.")
+
+        try:
+            session = append_chunk(
+                upload_id, request.stream, offset, length, checksum)
+        except OffsetMismatch as e:
+            return Response({'error': str(e), 'offset': e.offset},
+                            status=status.HTTP_409_CONFLICT)
+        except ChunkInProgress as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data)
+
+    def delete(self, request, upload_id):
+        abort_upload(self.get_session(upload_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionFinalizeView(APIView):
+    """
+    API endpoint to finish a chunked upload once every byte was received.
+    Creates the video and triggers the subtitle extraction task.
+    """
+
+    def post(self, request, upload_id):
+        try:
+            video, created = finalize_upload(upload_id)
+        except UploadSession.DoesNotExist:
+            raise NotFound("Upload not found.")
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not created:
+            serializer = VideoSummarySerializer(
+                video_list_queryset().get(id=video.id), context={'request': request})
+            return Response(serializer.data)
+        queue_registration(video)
+        return Response(pending_video_summary(video, {'request': request}),
+                        status=status.HTTP_201_CREATED)
+
+
 class VideoDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint to retrieve, update, or delete a video by ID.
@@ -71,64 +269,593 @@ class VideoDetailView(generics.RetrieveUpdateDestroyAPIView):
     def delete(self, request, *args, **kwargs):
         """
         Handle video deletion.
+        Duplicates of the deleted video are handed over to the oldest of
+        them, which becomes the owner of the shared media file.
         """
         instance = self.get_object()
-        instance.delete()
+        with transaction.atomic():
+            duplicates = list(instance.duplicates.order_by('id'))
+            if duplicates:
+                successor = duplicates[0]
+                content_hash = instance.content_hash
+                # Release the content hash before handing it over
+                Video.objects.filter(pk=instance.pk).update(content_hash=None)
+                instance.duplicates.exclude(pk=successor.pk).update(
+                    duplicate_of=successor)
+                Video.objects.filter(pk=successor.pk).update(
+                    duplicate_of=None, content_hash=content_hash)
+            instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class SubtitleListView(generics.ListAPIView):
     """
     API endpoint to list subtitles for a specific video.
+    Results are keyset paginated by language and start time, can be filtered
+    by language (`?language=<code>`) and restricted to a subset of fields
+    (`?fields=id,content,start_ms`). Runs in a fixed number of queries.
     """
     serializer_class = SubtitleSerializer
+    pagination_class = SubtitleKeysetPagination
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.request.GET.get('fields')
+        if fields:
+            kwargs['fields'] = [field.strip() for field in fields.split(',')]
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
         video_id = self.kwargs['video_id']
+        if not Video.objects.filter(id=video_id).exists():
+            raise NotFound("Video not found.")
+
+        return subtitle_list_queryset(video_id, self.request.GET.get('language'))
+
+
+def subtitle_list_queryset(video_id, language_code=None):
+    """
+    Return the subtitles of a video, in one language when `language_code`
+    is given.
+    """
+    subtitles = Subtitle.objects.filter(video_id=video_id).select_related(
+        'language').defer('search_vector')
+    if language_code:
+        subtitles = subtitles.filter(
+            language__code=canonical_language_code(language_code))
+    return subtitles
+
+
+class SubtitleTimeRangeView(generics.ListAPIView):
+    """
+    API endpoint to list the subtitles of a video that are active at a time
+    (`?t=<ms>`) or that overlap a window (`?start=<ms>&end=<ms>`), optionally
+    restricted to one language (`?language=<code>`).
+    Lets the player fetch only the cues near the playhead.
+    """
+    serializer_class = SubtitleSerializer
+
+    def get_time_param(self, name):
+        value = self.request.GET.get(name)
+        if value is None:
+            return None
         try:
-            video = Video.objects.get(id=video_id)
-            return video.subtitles.all()
-        except Video.DoesNotExist:
+            value = int(value)
+        except ValueError:
+            raise ValidationError(f"'{name}' must be an integer number of milliseconds.")
+        if value < 0:
+            raise ValidationError(f"'{name}' cannot be negative.")
+        return value
+
+    def get_queryset(self):
+        video_id = self.kwargs['video_id']
+        time = self.get_time_param('t')
+        start = self.get_time_param('start')
+        end = self.get_time_param('end')
+
+        if time is not None:
+            interval = NumericRange(time, time, '[]')
+        elif start is not None and end is not None:
+            if start > end:
+                raise ValidationError("'start' must not be after 'end'.")
+            interval = NumericRange(start, end, '[]')
+        else:
+            raise ValidationError("Provide either 't' or both 'start' and 'end'.")
+
+        if not Video.objects.filter(id=video_id).exists():
             raise NotFound("Video not found.")
 
+        # Same expression as the subtitle_interval_idx GiST index
+        subtitles = Subtitle.objects.filter(video_id=video_id).alias(
+            span=Func(F('start_ms'), F('end_ms'), Value('[]'), function='int4range',
+                      output_field=IntegerRangeField())
+        ).filter(span__overlap=interval)
+
+        language = self.request.GET.get('language')
+        if language:
+            subtitles = subtitles.filter(
+                language__code=canonical_language_code(language))
+        return subtitles.select_related('language').order_by('language_id', 'start_ms')
+
 
 class VideoLanguagesView(APIView):
     """
     API endpoint to list all the available languages of subtitles.
+
+    When the stream metadata of the video is stored, every subtitle stream
+    is listed with its title and dispositions, and `available` tells whether
+    its subtitles have been extracted. The file is never probed here.
+    The list is cached until the subtitles or metadata of the video change.
     """
 
     def get(self, request, video_id):
+        languages = cached_video_query(
+            'languages', video_id, {}, lambda: self.get_languages(video_id))
+        return Response(languages, status=status.HTTP_200_OK)
+
+    def get_languages(self, video_id):
+        try:
+            video = Video.objects.select_related('duplicate_of').get(id=video_id)
+        except Video.DoesNotExist:
+            raise NotFound("Video not found.")
+        # Duplicates share the media file of their original
+        probe_data = video.probe_data or (
+            video.duplicate_of.probe_data if video.duplicate_of else None)
+
         subtitles = Subtitle.objects.filter(
             video_id=video_id).select_related('language').distinct('language')
+        return describe_languages(
+            probe_data, [subtitle.language for subtitle in subtitles])
+
+
+def describe_languages(probe_data, stored_languages):
+    """
+    Describe the subtitle streams of stored metadata, or only the stored
+    languages when no metadata is stored.
+    """
+    stored = {language.code: language for language in stored_languages}
+    if probe_data is None:
         languages = [
             {
-                'code': subtitle.language.code,
-                'name': subtitle.language.name
-            } for subtitle in subtitles
+                'code': language.code,
+                'name': language.name
+            } for language in stored.values()
         ]
-        return Response(languages, status=status.HTTP_200_OK)
+        return languages
+
+    languages = []
+    for stream in subtitle_streams(probe_data):
+        code = canonical_language_code(stream['language'])
+        languages.append({
+            'code': code,
+            'name': stored[code].name if code in stored else language_name(code),
+            'index': stream['index'],
+            'codec': stream['codec_name'],
+            'title': stream['title'],
+            'default': stream['default'],
+            'forced': stream['forced'],
+            # Pictures, never extracted to text
+            'bitmap': is_bitmap_subtitle(stream),
+            'available': code in stored,
+        })
+    # Languages imported from uploaded subtitle files have no stream
+    listed = {language['code'] for language in languages}
+    for code, language in stored.items():
+        if code not in listed:
+            languages.append({
+                'code': code, 'name': language.name, 'index': None,
+                'codec': None, 'title': None, 'default': False,
+                'forced': False, 'bitmap': False, 'available': True,
+            })
+    return languages
+
+
+@require_safe
+def subtitle_track(request, video_id, language_code):
+    """
+    Serve the subtitles of one language of a video as a WebVTT file for a
+    <track> element, with ETag, Last-Modified and Range support.
+    Conditional requests are answered from the cache alone.
+    """
+    language_code = canonical_language_code(language_code)
+    info = get_track_info(video_id, language_code)
+    if info is None:
+        raise Http404("No subtitles in this language.")
+
+    etag = quote_etag(info['etag'])
+    response = conditional_response(request, etag, info['last_modified'])
+    if response is None:
+        try:
+            file = default_storage.open(info['name'], 'rb')
+        except FileNotFoundError:
+            # The file went missing: drop the track and build it again
+            SubtitleTrack.objects.filter(
+                video_id=video_id, language__code=language_code).delete()
+            cache.delete(subtitle_track_cache_key(video_id, language_code))
+            info = get_track_info(video_id, language_code)
+            etag = quote_etag(info['etag'])
+            file = default_storage.open(info['name'], 'rb')
+        response = serve_file(request, file, info['size'], 'text/vtt; charset=utf-8',
+                              etag, info['last_modified'])
+    # Let clients keep the track but revalidate it before each use
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_safe
+def hls_master_playlist(request, video_id):
+    """
+    Serve the HLS master playlist of a video, with a subtitle rendition per
+    language it has subtitles in. It follows the subtitles, so clients
+    revalidate it; the files it points at never change.
+    """
+    package = get_package(video_id)
+    if package is None:
+        raise Http404("This video has not been packaged for streaming.")
+    languages = Language.objects.filter(Exists(Subtitle.objects.filter(
+        video_id=video_id, language=OuterRef('pk')))).order_by('code')
+
+    # The stream flagged as default in the file selects the default rendition
+    probe_data = package.video.probe_data
+    default_code = next(
+        (canonical_language_code(stream['language'])
+         for stream in subtitle_streams(probe_data) if stream['default']),
+        None) if probe_data else None
+
+    response = HttpResponse(
+        render_master_playlist(video_id, package, list(languages), default_code),
+        content_type=CONTENT_TYPES['.m3u8'])
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_safe
+def hls_subtitle_playlist(request, video_id, language_code):
+    """Serve the media playlist of the subtitle rendition of a language."""
+    package = get_package(video_id)
+    if package is None:
+        raise Http404("This video has not been packaged for streaming.")
+    response = HttpResponse(
+        render_subtitle_playlist(
+            video_id, package, canonical_language_code(language_code)),
+        content_type=CONTENT_TYPES['.m3u8'])
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_safe
+def hls_file(request, video_id, version, name):
+    """
+    Serve a file of the HLS package of a video: its media playlist, init
+    segment or a media segment, with Range support. Each packaging writes
+    to a new version, so the files are cached for good.
+    """
+    if FILE_NAME_RE.match(name) is None:
+        raise Http404("No such file.")
+    package = get_package(video_id)
+    if package is None or package.version != version:
+        raise Http404("No such package.")
+
+    etag = quote_etag(f'{version}-{name}')
+    response = conditional_response(request, etag)
+    if response is None:
+        path = f'{package.directory}/{name}'
+        try:
+            file = default_storage.open(path, 'rb')
+        except FileNotFoundError:
+            raise Http404("No such file.")
+        response = serve_file(request, file, default_storage.size(path),
+                              CONTENT_TYPES[os.path.splitext(name)[1]], etag)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+class VideoStatusView(generics.RetrieveAPIView):
+    """
+    API endpoint returning the latest processing job of a video: its state,
+    current stage, per-stage timings, per-stream results and error details.
+    """
+    serializer_class = ProcessingJobSerializer
+
+    def get_object(self):
+        video_id = self.kwargs['video_id']
+        if not Video.objects.filter(id=video_id).exists():
+            raise NotFound("Video not found.")
+        job = ProcessingJob.objects.filter(
+            video_id=video_id).order_by('-created_at').first()
+        if job is None:
+            raise NotFound("No processing job for this video.")
+        return job
+
+
+class VideoReprocessView(APIView):
+    """
+    API endpoint to extract the subtitles of a video again. Fresh cues are
+    diffed against the stored ones, so only what changed is written.
+    """
+
+    def post(self, request, video_id):
+        try:
+            video = Video.objects.get(id=video_id)
+        except Video.DoesNotExist:
+            raise NotFound("Video not found.")
+        if video.duplicate_of_id is not None:
+            return Response(
+                {'error': "Duplicate videos share the subtitles of their original; reprocess the original instead.",
+                 'original': video.duplicate_of_id},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Lock the video so two requests cannot both queue a job
+            Video.objects.select_for_update().get(id=video.id)
+            fail_stale_jobs(video.jobs.all())
+            if video.jobs.exclude(state__in=ProcessingJob.FINISHED_STATES).exists():
+                return Response(
+                    {'error': "The video is already being processed."},
+                    status=status.HTTP_409_CONFLICT)
+            job = queue_extraction(video, reprocess=True)
+        serializer = ProcessingJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class SubtitleUploadView(APIView):
+    """
+    API endpoint to attach a subtitle file (SubRip, ASS/SSA or WebVTT) to a
+    video as the subtitles of one language, given as `language` or in the
+    file name (e.g. movie.en.srt). The file is imported in the background;
+    subtitles already stored in that language are replaced.
+    """
+
+    def post(self, request, video_id):
+        try:
+            video = Video.objects.get(id=video_id)
+        except Video.DoesNotExist:
+            raise NotFound("Video not found.")
+        if video.duplicate_of_id is not None:
+            return Response(
+                {'error': "Duplicate videos share the subtitles of their original; upload to the original instead.",
+                 'original': video.duplicate_of_id},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        uploaded_file = request.FILES.get('file')
+        if uploaded_file is None:
+            raise ValidationError("Upload the subtitle file as 'file'.")
+        if sidecar_extension(uploaded_file.name) is None:
+            raise ValidationError(
+                f"Unsupported subtitle file. Allowed: {', '.join(SIDECAR_PARSERS)}.")
+        if uploaded_file.size > settings.SIDECAR_MAX_SIZE:
+            raise ValidationError(
+                f"Subtitle files are limited to {settings.SIDECAR_MAX_SIZE} bytes.")
+        language_code = (canonical_language_code(request.data['language'])
+                         if request.data.get('language')
+                         else guess_sidecar_language(uploaded_file.name))
+        if language_code is None:
+            raise ValidationError(
+                "Give the 'language' of the subtitles, or name the file like movie.en.srt.")
+        if not language_name(language_code):
+            # Unknown codes would otherwise become languages of their own
+            raise ValidationError(f"Unknown language code: {request.data['language']}.")
+
+        with transaction.atomic():
+            # Lock the video so the import cannot race an extraction
+            Video.objects.select_for_update().get(id=video.id)
+            fail_stale_jobs(video.jobs.all())
+            if video.jobs.exclude(state__in=ProcessingJob.FINISHED_STATES).exists():
+                return Response(
+                    {'error': "The video is already being processed."},
+                    status=status.HTTP_409_CONFLICT)
+            job = queue_sidecar_import(
+                video, save_sidecar(video, uploaded_file), language_code)
+        serializer = ProcessingJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+async def video_status_stream(request, video_id):
+    """
+    Stream the processing status of a video as Server-Sent Events until its
+    latest job finishes. Served without holding a worker under ASGI; under
+    WSGI, each open stream holds a worker thread.
+    """
+    if not await Video.objects.filter(id=video_id).aexists():
+        raise Http404("Video not found.")
+    # Duplicates reuse the subtitles of their original and are never processed
+    if not await ProcessingJob.objects.filter(video_id=video_id).aexists():
+        raise Http404("No processing job for this video.")
+    # WSGI servers consume async iterators whole before sending anything
+    events = (ajob_events(video_id) if isinstance(request, ASGIRequest)
+              else job_events(video_id))
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def get_search_params(request):
+    """Return the validated search term and mode of a search request."""
+    search_term = request.GET.get('query', '').strip()
+    mode = request.GET.get('mode') or settings.SUBTITLE_SEARCH_MODE
+
+    if not search_term:
+        raise ValidationError("Search term cannot be empty.")
+    if mode not in SEARCH_MODES:
+        raise ValidationError(
+            f"Invalid search mode. Choose one of: {', '.join(SEARCH_MODES)}.")
+    return search_term, mode
+
+
+def search_cache_params(request):
+    """Return the parameters a cached search result is keyed on."""
+    search_term, mode = get_search_params(request)
+    return {
+        'path': request.path,
+        'query': normalize_query(search_term),
+        'mode': mode,
+        'language': request.GET.get('language', ''),
+        'page': request.GET.get('page', ''),
+        'page_size': request.GET.get('page_size', ''),
+    }
+
+
+def search_video_subtitles(subtitles, search_term, mode, language_code=None):
+    """
+    Search the subtitles of a video, in one language when `language_code`
+    is given.
+    """
+    languages = None
+    if language_code:
+        languages = Language.objects.filter(
+            code=canonical_language_code(language_code))
+        subtitles = subtitles.filter(language__in=languages)
+    return search_subtitles(subtitles, search_term, mode, languages)
 
 
 class SearchSubtitleView(generics.ListAPIView):
     """
     API endpoint to search subtitles for a specific video by a query term.
-    This approach uses case-insensitive substring matching for flexible search.
+    The `mode` parameter selects the search backend: full-text search on the
+    indexed tsvector, trigram substring/fuzzy matching, both combined
+    ('auto', the default) or plain case-insensitive substring matching.
+    Results can be narrowed to a `language` code, and are paginated when a
+    `page_size` is given.
+
+    Results are cached per video and normalized query until its subtitles
+    change.
     """
-    serializer_class = SubtitleSerializer
+    serializer_class = SubtitleSearchSerializer
+    pagination_class = SubtitleSearchPagination
 
     def get_queryset(self):
         video_id = self.kwargs['video_id']
-        search_term = self.request.GET.get('query', '').strip()
-
-        if not search_term:
-            raise ValidationError("Search term cannot be empty.")
+        search_term, mode = get_search_params(self.request)
+        # Every mode is case-insensitive, so the normalized term finds the
+        # same subtitles and is what the cache is keyed on
+        search_term = normalize_query(search_term)
 
         try:
             # Retrieve the video
             video = Video.objects.get(id=video_id)
+        except Video.DoesNotExist:
+            raise NotFound("Video not found.")
 
-            # Perform a case-insensitive substring search using icontains
-            return video.subtitles.filter(content__icontains=search_term)
+        return search_video_subtitles(
+            video.subtitles.select_related('language'), search_term, mode,
+            self.request.GET.get('language'))
 
-        except Video.DoesNotExist:
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['previews'] = get_previews([self.kwargs['video_id']])
+        return context
+
+    def list(self, request, *args, **kwargs):
+        data = cached_video_query(
+            'search', self.kwargs['video_id'], search_cache_params(request),
+            lambda: super(SearchSubtitleView, self).list(
+                request, *args, **kwargs).data)
+        return Response(data)
+
+
+class VideoPreviewView(APIView):
+    """
+    API endpoint describing the thumbnail previews of a video: its WebVTT
+    thumbnail track, sprite sheets and keyframe index. With `t` (in
+    milliseconds), also the thumbnail shown at that time and the keyframe
+    at or before it, to snap seeking to.
+    """
+
+    def get(self, request, video_id):
+        if not Video.objects.filter(id=video_id).exists():
             raise NotFound("Video not found.")
+        preview = get_previews([video_id]).get(video_id)
+        if preview is None:
+            raise NotFound("No preview has been generated for this video.")
+
+        context = {'request': request}
+        if 't' in request.GET:
+            try:
+                context['tile'] = int(request.GET['t'])
+            except ValueError:
+                raise ValidationError("'t' must be an integer number of milliseconds.")
+            if context['tile'] < 0:
+                raise ValidationError("'t' must not be negative.")
+        serializer = VideoPreviewSerializer(preview, context=context)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class QueryCacheStatsView(APIView):
+    """
+    API endpoint reporting the hits, misses and hit rate of the cached
+    subtitle searches and language lookups, to size the cache. DELETE
+    resets the counters.
+    """
+
+    def get(self, request):
+        return Response(query_cache_stats(), status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        reset_query_cache_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LibrarySearchView(generics.GenericAPIView):
+    """
+    API endpoint to search the subtitles of every video at once.
+
+    Matches are grouped by video, most hits first, and each video comes
+    with its hit count and its `top` best matches. Results can be narrowed
+    to a `language` code and to videos uploaded between `uploaded_after`
+    and `uploaded_before` (ISO dates or datetimes).
+    """
+    serializer_class = LibrarySearchResultSerializer
+    pagination_class = LibrarySearchPagination
+    max_top = 20
+
+    def get(self, request):
+        search_term, mode = get_search_params(request)
+        try:
+            top = min(int(request.GET.get('top', 3)), self.max_top)
+        except ValueError:
+            raise ValidationError("'top' must be an integer.")
+        if top < 1:
+            raise ValidationError("'top' must be positive.")
+
+        subtitles = Subtitle.objects.all()
+        languages = None
+        language_code = request.GET.get('language')
+        if language_code:
+            languages = Language.objects.filter(
+                code=canonical_language_code(language_code))
+            subtitles = subtitles.filter(language__in=languages)
+        for param, lookup in (('uploaded_after', 'gte'), ('uploaded_before', 'lt')):
+            value = request.GET.get(param)
+            if value:
+                subtitles = subtitles.filter(
+                    **{f'video__uploaded_at__{lookup}': self.parse_moment(param, value)})
+
+        groups, capped = search_library(subtitles, search_term, mode, languages)
+        # The groups are already in memory, so pages cost no COUNT query
+        groups = self.paginate_queryset(groups)
+        video_ids = [group['video_id'] for group in groups]
+        videos = Video.objects.in_bulk(video_ids)
+        hits = top_hits(subtitles, video_ids, search_term, mode, languages, top)
+        results = [
+            {'video': videos[group['video_id']], 'hits': group['hits'],
+             'top': hits[group['video_id']]}
+            for group in groups
+        ]
+        context = self.get_serializer_context()
+        context['previews'] = get_previews(video_ids)
+        serializer = self.get_serializer(results, many=True, context=context)
+        response = self.get_paginated_response(serializer.data)
+        response.data['capped'] = capped
+        return response
+
+    def parse_moment(self, param, value):
+        moment = parse_datetime(value)
+        if moment is None:
+            date = parse_date(value)
+            if date is None:
+                raise ValidationError(f"'{param}' must be an ISO date or datetime.")
+            moment = datetime.datetime.combine(date, datetime.time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment